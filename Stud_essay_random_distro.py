@@ -1,27 +1,44 @@
 import random
 import uuid
 import os
-from openai import OpenAI
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-import pandas as pd
 from datetime import datetime
+from api_pool import bulk, pooled
+from tracing import annotate, openai_usage, traced
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from openai import OpenAI
 
 # --- Environment Setup ---
 script_dir = os.path.dirname(os.path.abspath(__file__))
 env_path = os.path.join(script_dir, ".env")
-load_dotenv(env_path)
 
-api_key = os.getenv("OPENAI_API_KEY")
+# Created by get_client() on first use; assign a client here to point generation elsewhere.
+client = None
+
+def get_client() -> "OpenAI":
+    """
+    The shared OpenAI client, created (and .env loaded) on the first call so importing this module does no I/O.
+    """
+    global client
+    if client is None:
+        from openai import OpenAI
 
-if api_key:
-    print("✅ OpenAI API key is loaded!")
-else:
-    print("❌ OpenAI API key NOT loaded.")
+        load_dotenv(env_path)
+        api_key = os.getenv("OPENAI_API_KEY")
 
-client = OpenAI(
-    api_key=api_key,
-    base_url="https://us.api.openai.com/v1"
-)
+        if api_key:
+            print("✅ OpenAI API key is loaded!")
+        else:
+            print("❌ OpenAI API key NOT loaded.")
+
+        client = OpenAI(
+            api_key=api_key,
+            base_url="https://us.api.openai.com/v1"
+        )
+    return client
 
 # --- Knowledge, Grammar, Flow Levels ---
 
@@ -78,6 +95,8 @@ def generate_level_triplets(n):
 
 # --- OpenAI Text Generation ---
 
+@traced(provider="openai")
+@pooled("openai")
 def text_generation(system_role: str, user_msg: str, prompt: str,
                     sections: dict | None = None,
                     model: str = "gpt-4o-mini",
@@ -95,7 +114,7 @@ def text_generation(system_role: str, user_msg: str, prompt: str,
             user_content += f"\n\n{label}:\n{content}"
 
     # Send to OpenAI
-    resp = client.responses.create(
+    resp = get_client().responses.create(
         model=model,
         input=[
             {"role": "system", "content": system_role},
@@ -104,6 +123,7 @@ def text_generation(system_role: str, user_msg: str, prompt: str,
         temperature=temperature,
     )
 
+    annotate(model=model, **openai_usage(getattr(resp, "usage", None)))
     text = (getattr(resp, "output_text", "") or "").strip()
     return text, getattr(resp, "usage", None)
 
@@ -126,7 +146,9 @@ def competency_level(knowledge_desc: str, grammar_desc: str, flow_desc: str) ->
 
 # --- Essay Generator ---
 
-def essay_gen(n, topic: str, grade_level: str, subject: str, assignment_type: str, prompt: str, model="gpt-4o-mini") -> pd.DataFrame:
+@traced(kind="stage", name="generate")
+@bulk("generate")
+def essay_gen(n, topic: str, grade_level: str, subject: str, assignment_type: str, prompt: str, model="gpt-4o-mini") -> "pd.DataFrame":
     topic_clean = topic.lower().replace(" ", "_")
     student_agent = build_student_agent(grade_level, subject, assignment_type, topic)
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -162,6 +184,8 @@ def essay_gen(n, topic: str, grade_level: str, subject: str, assignment_type: st
             "essay": essay_text
         })
     
+    import pandas as pd
+
     df = pd.DataFrame(data_rows)
     filename = f"essays_{topic_clean}.csv"
     df.to_csv(filename, index=False, encoding="utf-8")
@@ -0,0 +1,175 @@
+import math
+import random
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+from judge_scores import DIMENSIONS, validate_scores
+
+DEFAULT_CELL_COLUMNS = ['subject', 'grade', 'knowledge level']
+
+Judge = Callable[[str, str], Dict[str, Any] | None]
+
+
+def wilson_interval(agree: int, n: int, z: float = 1.96) -> tuple[float, float]:
+    """
+    Wilson score interval for an agreement proportion; stays sensible for the tiny cells we start with.
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = agree / n
+    denom = 1 + z ** 2 / n
+    centre = (p + z ** 2 / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def stratified_order(df: pd.DataFrame, cell_columns: List[str], seed: int = 0) -> List[tuple]:
+    """
+    Row order that shuffles each cell and then takes one row per cell in turn, so every cell's
+    estimate improves at the same pace. Returns (cell key, row index) tuples.
+    """
+    rng = random.Random(seed)
+    queues = []
+    for cell, group in df.groupby(cell_columns, observed=True, sort=True):
+        indices = list(group.index)
+        rng.shuffle(indices)
+        queues.append((cell if isinstance(cell, tuple) else (cell,), indices))
+    rng.shuffle(queues)
+
+    order = []
+    while queues:
+        remaining = []
+        for cell, indices in queues:
+            order.append((cell, indices.pop()))
+            if indices:
+                remaining.append((cell, indices))
+        queues = remaining
+    return order
+
+
+class CellEstimate:
+    """
+    Running per-dimension agreement counts for one cell.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.agree = {key: 0 for key in DIMENSIONS}
+
+    def add(self, gpt_scores: Dict[str, int], gemini_scores: Dict[str, int]) -> None:
+        self.n += 1
+        for key in DIMENSIONS:
+            self.agree[key] += int(gpt_scores[key] == gemini_scores[key])
+
+    def widest_interval(self) -> float:
+        return max(high - low for low, high in (wilson_interval(a, self.n) for a in self.agree.values()))
+
+
+def run_adaptive(df: pd.DataFrame,
+                 judge_gpt: Judge,
+                 judge_gemini: Judge,
+                 cell_columns: List[str] = DEFAULT_CELL_COLUMNS,
+                 target_width: float = 0.2,
+                 min_pairs: int = 10,
+                 seed: int = 0,
+                 id_column: str = 'essay_id') -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Judge pairs with both models in randomised, stratified order, and stop calling for a cell once
+    every dimension's 95% agreement interval is narrower than target_width (after at least min_pairs).
+    Returns (judged pairs with both judges' scores, per-cell summary).
+    """
+    estimates: Dict[tuple, CellEstimate] = {}
+    converged = set()
+    rows = []
+    calls = 0
+
+    for cell, index in stratified_order(df, cell_columns, seed):
+        if cell in converged:
+            continue
+        row = df.loc[index]
+        gpt_scores = validate_scores(judge_gpt(row['essay_text'], row['feedback_text']))
+        gemini_scores = validate_scores(judge_gemini(row['essay_text'], row['feedback_text']))
+        calls += 2
+        if gpt_scores is None or gemini_scores is None:
+            continue
+
+        estimate = estimates.setdefault(cell, CellEstimate())
+        estimate.add(gpt_scores, gemini_scores)
+
+        record = {id_column: row[id_column], **dict(zip(cell_columns, cell))}
+        record.update({f"{k}_gpt": v for k, v in gpt_scores.items()})
+        record.update({f"{k}_gemini": v for k, v in gemini_scores.items()})
+        rows.append(record)
+
+        if estimate.n >= min_pairs and estimate.widest_interval() < target_width:
+            converged.add(cell)
+            print(f"🎯 Cell {cell} converged after {estimate.n} pairs")
+
+    print(f"📉 Used {calls} judge calls instead of {2 * len(df)} for a full run.")
+    return pd.DataFrame(rows), cell_summary(df, estimates, converged, cell_columns)
+
+
+def cell_summary(df: pd.DataFrame, estimates: Dict[tuple, CellEstimate], converged: set,
+                 cell_columns: List[str]) -> pd.DataFrame:
+    """
+    One row per cell and dimension with the running agreement rate and its Wilson interval.
+    """
+    sizes = df.groupby(cell_columns, observed=True).size()
+    rows = []
+    for cell, estimate in estimates.items():
+        for key in DIMENSIONS:
+            low, high = wilson_interval(estimate.agree[key], estimate.n)
+            rows.append({
+                **dict(zip(cell_columns, cell)),
+                "dimension": key,
+                "pairs_judged": estimate.n,
+                "pairs_available": int(sizes.get(cell if len(cell) > 1 else cell[0], 0)),
+                "agreement": estimate.agree[key] / estimate.n,
+                "ci_low": low,
+                "ci_high": high,
+                "converged": cell in converged,
+            })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from judge_inputs import load_judge_pairs
+
+    parser = argparse.ArgumentParser(description="Adaptive GPT vs. Gemini agreement run.")
+    parser.add_argument("--samples", default='SAMPLES.pkl')
+    parser.add_argument("--feedback", default='feedback_results_df.pkl')
+    parser.add_argument("--cells", nargs="+", default=DEFAULT_CELL_COLUMNS)
+    parser.add_argument("--target-width", type=float, default=0.2)
+    parser.add_argument("--min-pairs", type=int, default=10)
+    parser.add_argument("--output", default='adaptive_judges_evaluation_results.pkl')
+    parser.add_argument("--store", default=None,
+                        help="Read the inputs from this artifact store and write the judgments to its "
+                             "adaptive_judgments stage instead of pickles.")
+    args = parser.parse_args()
+
+    import feedback_desk_gemini_judge as gemini_judge
+    import feedback_desk_gpt_judge as gpt_judge
+
+    if args.store:
+        from artifact_store import ArtifactStore
+        from judge_inputs import load_judge_pairs_from_store
+        store = ArtifactStore(args.store)
+        pairs_df = load_judge_pairs_from_store(store)
+    else:
+        pairs_df = load_judge_pairs(args.samples, args.feedback)
+    judged_df, summary_df = run_adaptive(
+        pairs_df,
+        lambda essay, feedback: gpt_judge.get_llm_evaluation(essay, feedback, gpt_judge.get_client()),
+        lambda essay, feedback: gemini_judge.get_llm_evaluation(essay, feedback, gemini_judge.get_gemini_model()),
+        cell_columns=args.cells,
+        target_width=args.target_width,
+        min_pairs=args.min_pairs,
+    )
+    if args.store:
+        store.write('adaptive_judgments', judged_df)
+    else:
+        judged_df.to_pickle(args.output)
+    print(summary_df.to_string(index=False))
@@ -0,0 +1,216 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from judge_scores import DIMENSIONS, ingest_judgments, ingest_samples
+
+SCORES = [1, 2, 3, 4, 5]
+
+# Every grouping the notebook reports; [] is the overall table.
+DEFAULT_GROUPINGS = [
+    [],
+    ['subject'],
+    ['grade'],
+    ['subject', 'grade'],
+    ['grammar level'],
+]
+
+METRICS = ['exact_agreement', 'cohen_kappa', 'weighted_kappa', 'krippendorff_alpha']
+
+SAMPLE_COLUMNS = ['essay_id', 'subject', 'grade', 'knowledge level', 'grammar level', 'flow level']
+
+
+def build_merged_all(gpt_judges_df: pd.DataFrame, gemini_judges_df: pd.DataFrame,
+                     samples_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The notebook's merged_all_df: both judges side by side (_gpt / _gemini) with typed int8 scores under
+    canonical names, lower-cased categorical subject/grade and the competency levels from the samples.
+    """
+    gpt_judges_df = ingest_judgments(gpt_judges_df)[['essay_id'] + DIMENSIONS]
+    gemini_judges_df = ingest_judgments(gemini_judges_df)[['essay_id'] + DIMENSIONS]
+    merged = pd.merge(gpt_judges_df, gemini_judges_df, on='essay_id', suffixes=('_gpt', '_gemini'))
+
+    samples_subset = ingest_samples(samples_df[SAMPLE_COLUMNS])
+    return pd.merge(samples_subset, merged, on='essay_id')
+
+
+def long_scores(merged_all_df: pd.DataFrame, group_columns: list[str],
+                dimensions: list[str] = DIMENSIONS) -> pd.DataFrame:
+    """
+    One row per essay and dimension with the two judges' scores as 'gpt' and 'gemini'.
+    Rows where either judge has no valid score are dropped.
+    """
+    frames = []
+    for dim in dimensions:
+        frame = merged_all_df[group_columns].copy()
+        frame['dimension'] = dim
+        frame['gpt'] = merged_all_df[f'{dim}_gpt'].to_numpy()
+        frame['gemini'] = merged_all_df[f'{dim}_gemini'].to_numpy()
+        frames.append(frame)
+    long = pd.concat(frames, ignore_index=True)
+    long = long[long['gpt'].isin(SCORES) & long['gemini'].isin(SCORES)]
+    long['gpt'] = long['gpt'].astype('int8')
+    long['gemini'] = long['gemini'].astype('int8')
+    return long
+
+
+def confusion_counts(long: pd.DataFrame, keys: list[str]) -> pd.Series:
+    """
+    Pair counts indexed by keys + [gemini, gpt]; a single groupby over the long frame.
+    """
+    return long.groupby(keys + ['gemini', 'gpt'], observed=True, dropna=False).size()
+
+
+def to_dense(counts: pd.Series) -> tuple[pd.MultiIndex | pd.Index, np.ndarray]:
+    """
+    Turn counts indexed by [..cell keys.., gemini, gpt] into a (cells, 5, 5) array, rows = Gemini score.
+    """
+    full = pd.MultiIndex.from_product([SCORES, SCORES], names=['gemini', 'gpt'])
+    wide = counts.unstack(['gemini', 'gpt']).reindex(columns=full, fill_value=0).fillna(0)
+    return wide.index, wide.to_numpy(dtype=np.float64).reshape(-1, len(SCORES), len(SCORES))
+
+
+def agreement_metrics(matrices: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Exact agreement, Cohen's kappa, quadratic-weighted kappa and Krippendorff's alpha (interval metric)
+    for a stack of confusion matrices, all computed at once.
+    """
+    k = matrices.shape[-1]
+    n = matrices.sum(axis=(1, 2))
+    safe_n = np.where(n > 0, n, 1)
+
+    rows = matrices.sum(axis=2)
+    cols = matrices.sum(axis=1)
+    observed = np.trace(matrices, axis1=1, axis2=2) / safe_n
+    expected = (rows * cols).sum(axis=1) / safe_n ** 2
+
+    i, j = np.meshgrid(np.arange(k), np.arange(k), indexing='ij')
+    weights = (i - j) ** 2 / (k - 1) ** 2
+    expected_matrix = rows[:, :, None] * cols[:, None, :] / safe_n[:, None, None]
+    weighted_observed = (weights * matrices).sum(axis=(1, 2))
+    weighted_expected = (weights * expected_matrix).sum(axis=(1, 2))
+
+    # Krippendorff: with two coders and no missing pairs the coincidence matrix is O + O^T.
+    coincidence = matrices + matrices.transpose(0, 2, 1)
+    marginals = coincidence.sum(axis=2)
+    total = 2 * n
+    delta = (i - j) ** 2
+    disagreement_observed = (coincidence * delta).sum(axis=(1, 2))
+    disagreement_expected = (marginals[:, :, None] * marginals[:, None, :] * delta).sum(axis=(1, 2))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'n': n.astype(int),
+            'exact_agreement': np.where(n > 0, observed, np.nan),
+            'cohen_kappa': (observed - expected) / (1 - expected),
+            'weighted_kappa': 1 - weighted_observed / weighted_expected,
+            'krippendorff_alpha': 1 - (total - 1) * disagreement_observed / disagreement_expected,
+        }
+
+
+def bootstrap_cell(strata_counts: np.ndarray, resamples: int, confidence: float, seed) -> np.ndarray:
+    """
+    Stratified percentile bootstrap for one cell. strata_counts has one row of 25 (gemini, gpt) pair counts
+    per stratum. Resampling a stratum's essays with replacement is a multinomial draw over its counts, so
+    all replicates come from one vectorised draw per stratum instead of a (resamples, n) index matrix.
+    Returns an array of shape (len(METRICS), 2) with the lower and upper bounds.
+    """
+    rng = np.random.default_rng(seed)
+    k = len(SCORES)
+
+    matrices = np.zeros((resamples, k * k))
+    for counts in strata_counts.astype(np.int64):
+        size = counts.sum()
+        if size:
+            matrices += rng.multinomial(size, counts / size, size=resamples)
+
+    metrics = agreement_metrics(matrices.reshape(resamples, k, k))
+    tail = (1 - confidence) / 2 * 100
+    return np.array([np.nanpercentile(metrics[name], [tail, 100 - tail]) if np.isfinite(metrics[name]).any()
+                     else [np.nan, np.nan] for name in METRICS])
+
+
+def _bootstrap_batch(batch):
+    return [bootstrap_cell(*task) for task in batch]
+
+
+def bootstrap_intervals(tasks: list[tuple], workers: int | None = None) -> list[np.ndarray]:
+    """
+    Run bootstrap_cell over many cells, batched across a process pool (serially for small jobs).
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) < 2 * workers:
+        return _bootstrap_batch(tasks)
+
+    size = -(-len(tasks) // (workers * 4))
+    batches = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [result for batch in pool.map(_bootstrap_batch, batches) for result in batch]
+
+
+def agreement_table(merged_all_df: pd.DataFrame,
+                    groupings: list[list[str]] = DEFAULT_GROUPINGS,
+                    dimensions: list[str] = DIMENSIONS,
+                    bootstrap: int = 0,
+                    confidence: float = 0.95,
+                    workers: int | None = None,
+                    seed: int = 0) -> pd.DataFrame:
+    """
+    Tidy agreement table for every dimension × every grouping.
+    The rows are scanned once, at the finest grouping; every coarser grouping is a sum over those
+    cell counts, so adding a grouping costs O(cells) rather than another pass over the rows.
+    With bootstrap > 0, '<metric>_ci_low' / '<metric>_ci_high' columns are added from that many resamples,
+    stratified by the finest grouping cell.
+    """
+    group_columns = sorted({col for grouping in groupings for col in grouping})
+    long = long_scores(merged_all_df, group_columns, dimensions)
+    finest = confusion_counts(long, group_columns + ['dimension'])
+    return agreement_table_from_counts(finest, groupings, bootstrap, confidence, workers, seed)
+
+
+def agreement_table_from_counts(finest: pd.Series,
+                                groupings: list[list[str]] = DEFAULT_GROUPINGS,
+                                bootstrap: int = 0,
+                                confidence: float = 0.95,
+                                workers: int | None = None,
+                                seed: int = 0) -> pd.DataFrame:
+    """
+    agreement_table from pair counts already indexed by [..grouping columns.., dimension, gemini, gpt],
+    e.g. the persisted counters in agreement_counters. Costs O(cells), whatever the number of essays.
+    """
+    group_columns = sorted({col for grouping in groupings for col in grouping})
+    if bootstrap:
+        finest_index, finest_matrices = to_dense(finest)
+        finest_keys = finest_index.to_frame(index=False)
+        finest_matrices = finest_matrices.reshape(len(finest_keys), -1)
+
+    tables = []
+    for g, grouping in enumerate(groupings):
+        counts = finest.groupby(level=grouping + ['dimension', 'gemini', 'gpt'], observed=True).sum()
+        index, matrices = to_dense(counts)
+        table = index.to_frame(index=False)
+        for name, values in agreement_metrics(matrices).items():
+            table[name] = values
+
+        if bootstrap:
+            # The finest cells inside each grouping cell are its strata.
+            members = finest_keys.groupby(grouping + ['dimension'], observed=True, dropna=False).indices
+            keys = table[grouping + ['dimension']].itertuples(index=False, name=None)
+            tasks = []
+            for t, key in enumerate(keys):
+                rows = members[key if len(key) > 1 else key[0]]
+                tasks.append((finest_matrices[rows], bootstrap, confidence, [seed, g, t]))
+            intervals = np.array(bootstrap_intervals(tasks, workers))
+            for m, name in enumerate(METRICS):
+                table[f'{name}_ci_low'] = intervals[:, m, 0]
+                table[f'{name}_ci_high'] = intervals[:, m, 1]
+
+        table.insert(0, 'grouping', ' × '.join(grouping) if grouping else 'overall')
+        tables.append(table)
+
+    columns = ['grouping'] + group_columns + ['dimension', 'n'] + METRICS
+    if bootstrap:
+        columns += [f'{name}_ci_{side}' for name in METRICS for side in ('low', 'high')]
+    return pd.concat(tables, ignore_index=True).reindex(columns=columns)
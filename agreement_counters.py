@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+from typing import Any, Dict
+
+import pandas as pd
+
+from agreement import DEFAULT_GROUPINGS, SAMPLE_COLUMNS, agreement_table_from_counts
+from judge_inputs import SAMPLES_PKL_PATH
+from judge_scores import DIMENSIONS, canonical_key, coerce_score, ingest_samples
+
+# Kept in the judges' output database, next to the evaluations they summarise.
+COUNTERS_DB_PATH = 'judges_data.sql'
+
+# Every column DEFAULT_GROUPINGS groups by; counts are kept at this finest cell.
+CELL_COLUMNS = sorted({col for grouping in DEFAULT_GROUPINGS for col in grouping})
+
+
+def _valid_scores(evaluation: Dict[str, Any] | None) -> Dict[str, int]:
+    """
+    Canonical dimension -> score for every valid score in a judge reply or results row; missing or
+    invalid dimensions are simply left out.
+    """
+    scores = {}
+    for key, value in (evaluation or {}).items():
+        dimension = canonical_key(key)
+        score = coerce_score(value) if dimension else None
+        if score is not None and dimension not in scores:
+            scores[dimension] = score
+    return scores
+
+
+class AgreementCounters:
+    """
+    GPT vs. Gemini confusion counts per (finest cell, dimension), updated one judgment at a time and persisted
+    in SQLite. Each judge's latest scores per essay are kept too, so a re-judged essay moves its pair from the
+    old (gemini, gpt) count to the new one instead of being counted twice. Reading the agreement tables only
+    sums the counts (O(cells)), so it can be done at any point of a running judge job.
+    """
+
+    def __init__(self, db_path: str = COUNTERS_DB_PATH, cell_columns: list[str] = CELL_COLUMNS):
+        self.db_path = db_path
+        self.cell_columns = list(cell_columns)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS agreement_cells (
+                    essay_id TEXT PRIMARY KEY,
+                    cell TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS agreement_scores (
+                    essay_id TEXT NOT NULL,
+                    judge TEXT NOT NULL,
+                    dimension TEXT NOT NULL,
+                    score INTEGER NOT NULL,
+                    PRIMARY KEY (essay_id, judge, dimension)
+                );
+                CREATE TABLE IF NOT EXISTS agreement_counts (
+                    cell TEXT NOT NULL,
+                    dimension TEXT NOT NULL,
+                    gemini INTEGER NOT NULL,
+                    gpt INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (cell, dimension, gemini, gpt)
+                );
+            """)
+
+    def register_essays(self, samples_df: pd.DataFrame) -> None:
+        """
+        Record which cell (subject, grade, levels...) every essay belongs to. Essays judged before they are
+        registered are counted under an empty cell until then; registering (or re-registering under a
+        different cell) moves their existing pair counts to the new cell.
+        """
+        typed = ingest_samples(samples_df[[col for col in SAMPLE_COLUMNS if col in samples_df]])
+        rows = [
+            (str(essay_id), json.dumps([None if pd.isna(v) else str(v) for v in values]))
+            for essay_id, *values in typed[['essay_id'] + self.cell_columns].itertuples(index=False, name=None)
+        ]
+        with sqlite3.connect(self.db_path) as conn:
+            for essay_id, cell in rows:
+                old_cell = self._cell(conn, essay_id)
+                if old_cell != cell:
+                    self._move_pairs(conn, essay_id, old_cell, cell)
+            conn.executemany("INSERT OR REPLACE INTO agreement_cells (essay_id, cell) VALUES (?, ?)", rows)
+        print(f"🗂️ Registered {len(rows)} essays for agreement counters.")
+
+    def register_samples_file(self, samples_pkl_path: str = SAMPLES_PKL_PATH) -> None:
+        """
+        register_essays() from the generated samples pickle, if there is one (the judge scripts call this
+        before recording, so their per-group tables are not all in the empty cell).
+        """
+        if os.path.exists(samples_pkl_path):
+            self.register_essays(pd.read_pickle(samples_pkl_path))
+        else:
+            print(f"⚠️ {samples_pkl_path} not found; agreement counters only fill the overall table.")
+
+    def _cell(self, conn: sqlite3.Connection, essay_id: str) -> str:
+        row = conn.execute("SELECT cell FROM agreement_cells WHERE essay_id = ?", (essay_id,)).fetchone()
+        return row[0] if row else json.dumps([None] * len(self.cell_columns))
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, cell: str, dimension: str, gemini: int, gpt: int, delta: int) -> None:
+        conn.execute("""
+            INSERT INTO agreement_counts (cell, dimension, gemini, gpt, count) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (cell, dimension, gemini, gpt) DO UPDATE SET count = count + excluded.count
+        """, (cell, dimension, gemini, gpt, delta))
+
+    def _move_pairs(self, conn: sqlite3.Connection, essay_id: str, old_cell: str, new_cell: str) -> None:
+        scores = {(judge, dim): score for judge, dim, score in conn.execute(
+            "SELECT judge, dimension, score FROM agreement_scores WHERE essay_id = ?", (essay_id,)).fetchall()}
+        for dim in DIMENSIONS:
+            gemini, gpt = scores.get(('gemini', dim)), scores.get(('gpt', dim))
+            if gemini is not None and gpt is not None:
+                self._bump(conn, old_cell, dim, gemini, gpt, -1)
+                self._bump(conn, new_cell, dim, gemini, gpt, 1)
+
+    def _record(self, conn: sqlite3.Connection, essay_id: str, judge: str,
+                evaluation: Dict[str, Any] | None) -> None:
+        other = 'gemini' if judge == 'gpt' else 'gpt'
+        cell = self._cell(conn, essay_id)
+        scores = _valid_scores(evaluation)
+
+        rows = conn.execute(
+            "SELECT judge, dimension, score FROM agreement_scores WHERE essay_id = ?", (essay_id,)
+        ).fetchall()
+        current = {(j, d): s for j, d, s in rows}
+        for dim in DIMENSIONS:
+            old, new, partner = current.get((judge, dim)), scores.get(dim), current.get((other, dim))
+            if old == new:
+                continue
+            if partner is not None:
+                # Counts are keyed (gemini, gpt).
+                for mine, delta in ((old, -1), (new, 1)):
+                    if mine is not None:
+                        gemini, gpt = (partner, mine) if judge == 'gpt' else (mine, partner)
+                        self._bump(conn, cell, dim, gemini, gpt, delta)
+            if new is None:
+                conn.execute("DELETE FROM agreement_scores WHERE essay_id = ? AND judge = ? AND dimension = ?",
+                             (essay_id, judge, dim))
+            else:
+                conn.execute("INSERT OR REPLACE INTO agreement_scores (essay_id, judge, dimension, score) "
+                             "VALUES (?, ?, ?, ?)", (essay_id, judge, dim, new))
+
+    def record(self, essay_id: str, judge: str, evaluation: Dict[str, Any] | None) -> None:
+        """
+        Update the counters with one judge's (latest) scores for an essay. A failed evaluation (None)
+        withdraws that judge's earlier scores for the essay.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            self._record(conn, str(essay_id), judge, evaluation)
+
+    def record_frame(self, results_df: pd.DataFrame, judge: str, id_column: str = 'essay_id') -> None:
+        """
+        record() for every row of a results table, in one transaction (e.g. after a retry drain).
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            for row in results_df.to_dict('records'):
+                self._record(conn, str(row[id_column]), judge, row)
+
+    def merge(self, other: "AgreementCounters") -> None:
+        """
+        Fold another counter database (e.g. from a separate run) into this one by replaying its scores,
+        so essays judged in both are not double-counted.
+        """
+        with sqlite3.connect(other.db_path) as conn:
+            cells = conn.execute("SELECT essay_id, cell FROM agreement_cells").fetchall()
+            scores = pd.read_sql_query("SELECT * FROM agreement_scores", conn)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("INSERT OR IGNORE INTO agreement_cells (essay_id, cell) VALUES (?, ?)", cells)
+            for (essay_id, judge), group in scores.groupby(['essay_id', 'judge']):
+                current = dict(conn.execute(
+                    "SELECT dimension, score FROM agreement_scores WHERE essay_id = ? AND judge = ?",
+                    (essay_id, judge)).fetchall())
+                current.update(zip(group['dimension'], group['score']))
+                self._record(conn, essay_id, judge, current)
+
+    def counts(self) -> pd.Series:
+        """
+        Pair counts indexed by cell columns + [dimension, gemini, gpt], the input agreement_table_from_counts takes.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            counts = pd.read_sql_query("SELECT * FROM agreement_counts WHERE count > 0", conn)
+        cells = pd.DataFrame([json.loads(cell) for cell in counts['cell']], columns=self.cell_columns,
+                             index=counts.index)
+        counts = pd.concat([cells, counts.drop(columns='cell')], axis=1)
+        return counts.set_index(self.cell_columns + ['dimension', 'gemini', 'gpt'])['count']
+
+    def table(self, groupings: list[list[str]] = DEFAULT_GROUPINGS, **kwargs) -> pd.DataFrame:
+        """
+        Current agreement table, identical to agreement.agreement_table over the same judged essays.
+        """
+        return agreement_table_from_counts(self.counts(), groupings, **kwargs)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Persisted GPT vs. Gemini agreement counters.")
+    parser.add_argument("command", choices=['show', 'register', 'rebuild'])
+    parser.add_argument("--db", default=COUNTERS_DB_PATH)
+    parser.add_argument("--samples", default='SAMPLES.pkl')
+    parser.add_argument("--gpt", default='GPT_judges_evaluation_results.pkl')
+    parser.add_argument("--gemini", default='Gemini_judges_evaluation_results.pkl')
+    args = parser.parse_args()
+
+    counters = AgreementCounters(args.db)
+    if args.command == 'register':
+        counters.register_essays(pd.read_pickle(args.samples))
+    elif args.command == 'rebuild':
+        counters.register_essays(pd.read_pickle(args.samples))
+        counters.record_frame(pd.read_pickle(args.gpt), 'gpt')
+        counters.record_frame(pd.read_pickle(args.gemini), 'gemini')
+    print(counters.table(groupings=[[]]).to_string(index=False))
@@ -0,0 +1,185 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List
+
+from tracing import annotate
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+# Per provider (one API key's quota): worker threads, and how many of them bulk work may never occupy.
+POOL_WORKERS = int(os.getenv('API_POOL_WORKERS', '8'))
+POOL_RESERVED = int(os.getenv('API_POOL_RESERVED', '2'))
+
+_priority: contextvars.ContextVar[tuple[str, str | None]] = contextvars.ContextVar('api_priority',
+                                                                                   default=(INTERACTIVE, None))
+_queue_wait_ms: contextvars.ContextVar[float | None] = contextvars.ContextVar('api_queue_wait_ms', default=None)
+# The PriorityPool whose worker thread this is, if any.
+_in_worker = threading.local()
+
+
+@contextmanager
+def priority(level: str, job: str | None = None):
+    """
+    Run the pooled API calls made inside the block at this priority, e.g. `with priority(BULK, job="corpus-7"):`.
+    Calls made outside any block are interactive.
+    """
+    token = _priority.set((level, job))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def bulk(job: str) -> Callable:
+    """
+    Decorator: the pooled calls made while the function runs are bulk calls of `job`.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with priority(BULK, job):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class PriorityPool:
+    """
+    Worker threads shared by every caller of one provider. Interactive calls always go first and may use every
+    worker; bulk calls never hold more than workers - reserved of them, so an interactive call finds a free
+    worker straight away. Bulk calls are taken round-robin across jobs, one call per job in turn, so a job
+    that queued ten thousand calls does not starve one that queued ten.
+    """
+
+    def __init__(self, workers: int = POOL_WORKERS, reserved: int = POOL_RESERVED, name: str = 'api'):
+        self.workers = max(1, workers)
+        self.reserved = min(max(0, reserved), self.workers - 1)
+        self.name = name
+        self._condition = threading.Condition()
+        self._interactive: deque = deque()
+        self._bulk: OrderedDict[str, deque] = OrderedDict()
+        self._bulk_running = 0
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, fn: Callable, *args, level: str = INTERACTIVE, job: str | None = None, **kwargs) -> Future:
+        future = Future()
+        item = (future, contextvars.copy_context(), fn, args, kwargs, time.perf_counter())
+        with self._condition:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._work, name=f"{self.name}-pool-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+            if level == BULK:
+                self._bulk.setdefault(job or 'bulk', deque()).append(item)
+            else:
+                self._interactive.append(item)
+            self._condition.notify()
+        return future
+
+    def _next(self) -> tuple[tuple, bool]:
+        with self._condition:
+            while True:
+                if self._interactive:
+                    return self._interactive.popleft(), False
+                if self._bulk and self._bulk_running < self.workers - self.reserved:
+                    job, queue = next(iter(self._bulk.items()))
+                    item = queue.popleft()
+                    if queue:
+                        self._bulk.move_to_end(job)
+                    else:
+                        del self._bulk[job]
+                    self._bulk_running += 1
+                    return item, True
+                self._condition.wait()
+
+    def _work(self) -> None:
+        _in_worker.pool = self
+        while True:
+            (future, context, fn, args, kwargs, queued_at), bulk = self._next()
+            try:
+                if future.set_running_or_notify_cancel():
+                    context.run(_queue_wait_ms.set, (time.perf_counter() - queued_at) * 1000)
+                    try:
+                        future.set_result(context.run(fn, *args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                if bulk:
+                    with self._condition:
+                        self._bulk_running -= 1
+                        self._condition.notify_all()
+
+    def queued(self) -> Dict[str, int]:
+        with self._condition:
+            return {INTERACTIVE: len(self._interactive), **{job: len(queue) for job, queue in self._bulk.items()}}
+
+
+_pools: Dict[str, PriorityPool] = {}
+_pools_lock = threading.Lock()
+
+
+def shared_pool(provider: str) -> PriorityPool:
+    with _pools_lock:
+        if provider not in _pools:
+            _pools[provider] = PriorityPool(name=provider)
+        return _pools[provider]
+
+
+def configure(provider: str, workers: int = POOL_WORKERS, reserved: int = POOL_RESERVED) -> PriorityPool:
+    """
+    Size a provider's pool before its first call (e.g. to match the key's concurrency limit).
+    """
+    with _pools_lock:
+        _pools[provider] = PriorityPool(workers, reserved, name=provider)
+        return _pools[provider]
+
+
+def pooled(provider: str) -> Callable:
+    """
+    Decorator: run every call through the provider's shared pool at the caller's current priority and wait
+    for the result. Used under @traced, so the caller's span covers the queue wait and records it as
+    queue_wait_ms. A call made from one of this provider's own workers (e.g. via bulk_map) runs directly; from
+    another provider's worker it still queues on this provider's pool.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            pool = shared_pool(provider)
+            if getattr(_in_worker, 'pool', None) is pool:
+                annotate(queue_wait_ms=_queue_wait_ms.get())
+                return fn(*args, **kwargs)
+            level, job = _priority.get()
+            future = pool.submit(_timed, fn, *args, level=level, job=job, **kwargs)
+            result, queue_wait_ms = future.result()
+            annotate(queue_wait_ms=queue_wait_ms)
+            return result
+        wrapper.pool_provider = provider
+        return wrapper
+    return decorator
+
+
+def _timed(fn: Callable, *args, **kwargs) -> tuple[Any, float | None]:
+    return fn(*args, **kwargs), _queue_wait_ms.get()
+
+
+def bulk_map(fn: Callable, items: Iterable[Dict[str, Any]], job: str | None = None) -> List[Any]:
+    """
+    fn(**item) for every item as bulk calls of one job (default: the current bulk job), run concurrently on
+    fn's pool; results in input order. fn must be @pooled, whose provider picks the pool. Inside one of that
+    pool's workers the items run one after another.
+    """
+    items = list(items)
+    pool = shared_pool(fn.pool_provider)
+    if getattr(_in_worker, 'pool', None) is pool:
+        return [fn(**item) for item in items]
+    job = job or _priority.get()[1] or BULK
+    futures = [pool.submit(fn, level=BULK, job=job, **item) for item in items]
+    return [future.result() for future in futures]
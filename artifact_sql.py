@@ -0,0 +1,127 @@
+import os
+
+import duckdb
+import pandas as pd
+
+from artifact_store import ARTIFACT_ROOT, ArtifactStore
+from judge_scores import DIMENSIONS, canonical_key
+
+# View name -> artifact store stage.
+STAGE_VIEWS = {
+    'essays': 'samples',
+    'feedback': 'feedback',
+    'gpt_judgments': 'gpt_judgments',
+    'gemini_judgments': 'gemini_judgments',
+}
+
+JUDGES = ['gpt', 'gemini']
+
+EXAMPLE_QUERY = """
+SELECT essay_id, subject, grade, "grammar level", "Grammar_gpt", "Grammar_gemini"
+FROM judged_essays
+WHERE "grammar level" LIKE '1%' AND "Grammar_gpt" = 1 AND "Grammar_gemini" = 1
+"""
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _parquet_source(store: ArtifactStore, stage: str) -> str:
+    entry = store.catalog()[stage][-1]
+    pattern = os.path.join(os.path.abspath(store.root), entry['path'], '**', '*.parquet').replace("'", "''")
+    return f"read_parquet('{pattern}', hive_partitioning = true, union_by_name = true)"
+
+
+def _judgment_select(con: duckdb.DuckDBPyConnection, view: str) -> str:
+    """
+    essay_id plus the five scores under canonical names as TINYINT, whichever spelling the stage was written with.
+    """
+    columns = [row[0] for row in con.execute(f"DESCRIBE {view}").fetchall()]
+    source = {}
+    for col in columns:
+        dimension = canonical_key(col)
+        if dimension is not None and dimension not in source:
+            source[dimension] = col
+    scores = [f"TRY_CAST({_quote(source[dim])} AS TINYINT) AS {_quote(dim)}" if dim in source
+              else f"CAST(NULL AS TINYINT) AS {_quote(dim)}" for dim in DIMENSIONS]
+    return f"SELECT CAST(essay_id AS VARCHAR) AS essay_id, {', '.join(scores)} FROM {view}"
+
+
+def connect(store: ArtifactStore, database: str = ':memory:') -> duckdb.DuckDBPyConnection:
+    """
+    DuckDB connection with views over the latest version of every stage in the store. Nothing is loaded up
+    front: each query scans only the Parquet columns and hive partitions it needs.
+
+    Views: essays, feedback, comments (one row per Feedback Desk comment), gpt_judgments, gemini_judgments,
+    judgments (both judges stacked, with a 'judge' column) and judged_essays (essays joined with both judges'
+    scores as '<dimension>_gpt' / '<dimension>_gemini').
+    """
+    con = duckdb.connect(database)
+    catalog = store.catalog()
+    available = {view for view, stage in STAGE_VIEWS.items() if catalog.get(stage)}
+    for view in available:
+        con.execute(f"CREATE OR REPLACE VIEW {view}_raw AS SELECT * FROM {_parquet_source(store, STAGE_VIEWS[view])}")
+        if view.endswith('_judgments'):
+            con.execute(f"CREATE OR REPLACE VIEW {view} AS {_judgment_select(con, view + '_raw')}")
+        else:
+            con.execute(f"CREATE OR REPLACE VIEW {view} AS SELECT * FROM {view}_raw")
+
+    if 'feedback' in available:
+        # Comments were stored as JSON text by the artifact store; anything else is skipped.
+        con.execute("""
+            CREATE OR REPLACE VIEW comments AS
+            SELECT CAST(essay_id AS VARCHAR) AS essay_id,
+                   comment_index,
+                   json_extract_string(comment, '$.label') AS label,
+                   json_extract_string(comment, '$.comment_text') AS comment_text,
+                   json_extract_string(comment, '$.original_text') AS original_text
+            FROM (
+                SELECT essay_id,
+                       UNNEST(CAST(comments AS JSON[])) AS comment,
+                       generate_subscripts(CAST(comments AS JSON[]), 1) AS comment_index
+                FROM feedback
+                WHERE json_valid(comments) AND json_type(comments) = 'ARRAY'
+            )
+        """)
+
+    judges = [judge for judge in JUDGES if f'{judge}_judgments' in available]
+    if judges:
+        con.execute("CREATE OR REPLACE VIEW judgments AS " + " UNION ALL ".join(
+            f"SELECT '{judge}' AS judge, * FROM {judge}_judgments" for judge in judges))
+
+    if 'essays' in available and judges:
+        columns = ["e.*"]
+        joins = []
+        for judge in judges:
+            columns += [f"{judge}.{_quote(dim)} AS {_quote(f'{dim}_{judge}')}" for dim in DIMENSIONS]
+            joins.append(f"JOIN {judge}_judgments {judge} ON {judge}.essay_id = CAST(e.essay_id AS VARCHAR)")
+        con.execute(f"CREATE OR REPLACE VIEW judged_essays AS SELECT {', '.join(columns)} FROM essays e "
+                    + " ".join(joins))
+    return con
+
+
+def query(store: ArtifactStore, sql: str, params: list | None = None) -> pd.DataFrame:
+    """
+    One-off query against the store's views, e.g. query(store, EXAMPLE_QUERY).
+    """
+    with connect(store) as con:
+        return con.execute(sql, params or []).df()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run SQL against the pipeline artifacts.",
+                                     epilog=f"Example:{EXAMPLE_QUERY}",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sql", nargs="?", default=EXAMPLE_QUERY)
+    parser.add_argument("--root", default=ARTIFACT_ROOT)
+    parser.add_argument("--output", default=None, help="Also write the result to this CSV file.")
+    args = parser.parse_args()
+
+    result = query(ArtifactStore(args.root), args.sql)
+    print(result.to_string(index=False))
+    if args.output:
+        result.to_csv(args.output, index=False)
+        print(f"💾 Saved {len(result)} rows to {args.output}")
@@ -0,0 +1,188 @@
+import json
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from agreement import SAMPLE_COLUMNS, build_merged_all
+from judge_scores import ingest_judgments
+
+ARTIFACT_ROOT = 'artifacts'
+CATALOG_NAME = 'catalog.json'
+
+PARTITION_COLUMNS = ['subject', 'grade']
+
+# Pipeline stages and the Drive pickles they replace.
+STAGE_PICKLES = {
+    'samples': 'SAMPLES.pkl',
+    'feedback': 'feedback_results_df.pkl',
+    'gpt_judgments': 'GPT_judges_evaluation_results.pkl',
+    'gemini_judgments': 'Gemini_judges_evaluation_results.pkl',
+}
+
+# Both spellings, so judgments written before and after typed ingestion can be read.
+JUDGE_COLUMNS = ['essay_id', 'Tone', 'Level of detail', 'Grammar', 'Structure', 'Stucture', 'Content']
+
+
+def _jsonify_nested(df: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
+    """
+    Parquet needs one type per column; lists/dicts (e.g. Feedback Desk comments) are stored as JSON text, and
+    other object columns that mix scalar types (e.g. raw judge scores '3', 4, None) are stored as strings.
+    Returns the converted frame and the columns that now hold JSON text.
+    """
+    df = df.copy()
+    json_columns = []
+    for col in df.columns[df.dtypes == object]:
+        if df[col].map(lambda v: isinstance(v, (list, dict))).any():
+            df[col] = df[col].map(lambda v: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v)
+            json_columns.append(col)
+        elif df[col].dropna().map(type).nunique() > 1:
+            df[col] = df[col].map(lambda v: v if v is None or (isinstance(v, float) and pd.isna(v)) else str(v))
+    return df, json_columns
+
+
+class ArtifactStore:
+    """
+    Local store of pipeline outputs as Parquet datasets, hive-partitioned by subject/grade, one directory per
+    stage version. catalog.json lists every version; reads project columns and push filters down to the files.
+    """
+
+    def __init__(self, root: str = ARTIFACT_ROOT):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self.catalog_path = os.path.join(self.root, CATALOG_NAME)
+
+    def catalog(self) -> dict:
+        if not os.path.exists(self.catalog_path):
+            return {}
+        with open(self.catalog_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_catalog(self, catalog: dict) -> None:
+        tmp_path = self.catalog_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f, indent=2)
+        os.replace(tmp_path, self.catalog_path)
+
+    def versions(self, stage: str) -> pd.DataFrame:
+        return pd.DataFrame(self.catalog().get(stage, []))
+
+    def write(self, stage: str, df: pd.DataFrame, partition_cols: list[str] = PARTITION_COLUMNS,
+              note: str = '') -> int:
+        """
+        Write df as a new version of stage and return the version number.
+        """
+        catalog = self.catalog()
+        entries = catalog.setdefault(stage, [])
+        version = entries[-1]['version'] + 1 if entries else 1
+        path = os.path.join(self.root, stage, f'v{version}')
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+        # An empty frame would leave no files at all; it is written as one unpartitioned file to keep its schema.
+        partition_cols = [col for col in partition_cols if col in df.columns] if len(df) else []
+        flat_df, json_columns = _jsonify_nested(df)
+        table = pa.Table.from_pandas(flat_df, preserve_index=False)
+        if not len(df):
+            os.makedirs(path)
+            pq.write_table(table, os.path.join(path, 'part-0.parquet'))
+        else:
+            partitioning = None
+            if partition_cols:
+                partitioning = ds.partitioning(pa.schema([table.schema.field(col) for col in partition_cols]),
+                                               flavor='hive')
+            ds.write_dataset(table, path, format='parquet', partitioning=partitioning)
+
+        entries.append({
+            'version': version,
+            'path': os.path.relpath(path, self.root),
+            'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'rows': len(df),
+            'columns': list(df.columns),
+            'partition_cols': partition_cols,
+            'json_columns': json_columns,
+            'note': note,
+        })
+        self._save_catalog(catalog)
+        print(f"💾 Saved {len(df)} rows to {stage} v{version}")
+        return version
+
+    def entry(self, stage: str, version: int | None = None) -> dict:
+        entries = self.catalog().get(stage)
+        if not entries:
+            raise KeyError(f"No artifacts for stage '{stage}' in {self.root}")
+        return entries[-1] if version is None else next(e for e in entries if e['version'] == version)
+
+    def dataset(self, stage: str, version: int | None = None) -> ds.Dataset:
+        entry = self.entry(stage, version)
+        return ds.dataset(os.path.join(self.root, entry['path']), format='parquet',
+                          partitioning='hive' if entry['partition_cols'] else None)
+
+    def read(self, stage: str, columns: list[str] | None = None, filters: list[tuple] | None = None,
+             version: int | None = None) -> pd.DataFrame:
+        """
+        Read a stage, loading only the requested columns and only the partitions/row groups that match filters,
+        e.g. filters=[('subject', '==', 'history'), ('grade', 'in', ['9th grade'])]. Columns come back in the
+        order they were written, with lists/dicts decoded from their JSON text.
+        """
+        entry = self.entry(stage, version)
+        dataset = self.dataset(stage, version)
+        if columns is not None:
+            columns = [col for col in columns if col in dataset.schema.names]
+        expression = pq.filters_to_expression(filters) if filters else None
+        df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+        for col in entry.get('json_columns', []):
+            if col in df.columns:
+                df[col] = df[col].map(lambda v: json.loads(v) if isinstance(v, str) else v)
+        return df[[col for col in entry['columns'] if col in df.columns]]
+
+    def import_pickle(self, stage: str, pickle_path: str, samples_df: pd.DataFrame | None = None) -> int:
+        """
+        One-off migration of a trusted Drive pickle into the store. Stages without subject/grade get them
+        from samples_df so they can be partitioned (and filtered) the same way.
+        """
+        df = pd.read_pickle(pickle_path)
+        if stage.endswith('_judgments') and 'essay_id' in df.columns:
+            # Typed int8 scores under canonical names instead of the raw replies' mixed '3' / 4 / None.
+            df = ingest_judgments(df)
+        if 'essay_id' in df.columns:
+            df['essay_id'] = df['essay_id'].astype(str)
+        if samples_df is not None and 'subject' not in df.columns and 'essay_id' in df.columns:
+            df = df.merge(samples_df[['essay_id'] + PARTITION_COLUMNS], on='essay_id', how='left')
+        return self.write(stage, df, note=f'imported from {os.path.basename(pickle_path)}')
+
+
+def load_merged_all(store: ArtifactStore, filters: list[tuple] | None = None) -> pd.DataFrame:
+    """
+    The analysis notebook's merged_all_df, read with only the columns it uses.
+    """
+    samples_df = store.read('samples', columns=SAMPLE_COLUMNS, filters=filters)
+    gpt_df = store.read('gpt_judgments', columns=JUDGE_COLUMNS, filters=filters)
+    gemini_df = store.read('gemini_judgments', columns=JUDGE_COLUMNS, filters=filters)
+    return build_merged_all(gpt_df, gemini_df, samples_df)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import the pipeline pickles into the Parquet artifact store.")
+    parser.add_argument("--root", default=ARTIFACT_ROOT)
+    parser.add_argument("--pickle-dir", default='.')
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.root)
+    samples_df = pd.read_pickle(os.path.join(args.pickle_dir, STAGE_PICKLES['samples']))
+    samples_df['essay_id'] = samples_df['essay_id'].astype(str)
+    for stage, name in STAGE_PICKLES.items():
+        path = os.path.join(args.pickle_dir, name)
+        if os.path.exists(path):
+            store.import_pickle(stage, path, samples_df=None if stage == 'samples' else samples_df)
+        else:
+            print(f"⚠️ {path} not found; skipping {stage}.")
+    for stage in STAGE_PICKLES:
+        print(stage)
+        print(store.versions(stage))
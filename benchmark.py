@@ -0,0 +1,419 @@
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict
+
+import pandas as pd
+
+RESULTS_PATH = 'benchmark_results.jsonl'
+
+SCENARIOS = ['essay_gen', 'feedback', 'judge_gpt_main', 'judge_gemini_main', 'judge_gpt_calls',
+             'judge_gemini_calls']
+
+# Scenarios that run a script's own sequential main(); concurrency does not apply to them.
+SEQUENTIAL_SCENARIOS = {'judge_gpt_main', 'judge_gemini_main'}
+
+DEFAULT_BACKEND = {
+    'latency_ms': 150.0,    # median latency per request
+    'latency_sigma': 0.5,   # lognormal spread; p99 is about median * e^(2.33 * sigma)
+    'error_rate': 0.02,     # share of judge/feedback requests answered with HTTP 429
+    'malformed_rate': 0.01,  # share of judge replies that are not valid JSON
+    'tokens_out': 400,      # generated tokens per essay reply
+    'seed': 0,
+}
+
+WORDS = ("the essay argues that policy and history shape how students read evidence while the "
+         "author claims cities need better access to food and clear thesis statements").split()
+
+JUDGE_KEYS = ["Tone", "Level of detail", "Grammar", "Stucture", "Content"]
+
+
+# --- Fake backends ---
+
+def _request_rng(config: Dict[str, Any], body: bytes) -> random.Random:
+    """
+    Per-request RNG seeded from the payload, so a given request always gets the same latency and outcome
+    however the requests are interleaved.
+    """
+    digest = hashlib.sha256(body + str(config['seed']).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big'))
+
+
+def _words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _judge_reply(rng: random.Random, config: Dict[str, Any]) -> str:
+    if rng.random() < config['malformed_rate']:
+        return "Here is my evaluation: Tone 3, Grammar 4"
+    scores = {key: rng.randint(1, 5) for key in JUDGE_KEYS}
+    scores["justification"] = _words(rng, 40)
+    return json.dumps(scores)
+
+
+def make_handler(config: Dict[str, Any]):
+    class FakeBackendHandler(BaseHTTPRequestHandler):
+        """
+        Answers the OpenAI Responses and Chat Completions, Gemini generateContent and Feedback Desk endpoints
+        with canned payloads after a lognormal delay.
+        """
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            rng = _request_rng(config, body)
+            time.sleep(config['latency_ms'] * math.exp(config['latency_sigma'] * rng.gauss(0, 1)) / 1000)
+            # essay_gen has no retry handling, so one 429 would abort the whole generate run.
+            if rng.random() < config['error_rate'] and not self.path.endswith('/responses'):
+                self._send(429, {"error": {"message": "Rate limit reached (fake backend)", "type": "rate_limit",
+                                           "code": 429}})
+                return
+
+            tokens_in = max(1, len(body) // 4)
+            if self.path.endswith('/responses'):
+                text = _words(rng, config['tokens_out'])
+                self._send(200, {
+                    "id": "resp_fake", "object": "response", "created_at": int(time.time()), "model": "fake",
+                    "status": "completed",
+                    "output": [{"id": "msg_fake", "type": "message", "role": "assistant", "status": "completed",
+                                "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+                    "usage": {"input_tokens": tokens_in, "output_tokens": config['tokens_out'],
+                              "total_tokens": tokens_in + config['tokens_out']},
+                })
+            elif self.path.endswith('/chat/completions'):
+                text = _judge_reply(rng, config)
+                self._send(200, {
+                    "id": "chatcmpl_fake", "object": "chat.completion", "created": int(time.time()), "model": "fake",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": tokens_in, "completion_tokens": len(text) // 4,
+                              "total_tokens": tokens_in + len(text) // 4},
+                })
+            elif ':generateContent' in self.path:
+                text = _judge_reply(rng, config)
+                self._send(200, {
+                    "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+                    "usageMetadata": {"promptTokenCount": tokens_in, "candidatesTokenCount": len(text) // 4},
+                })
+            else:
+                essay = json.loads(body or b'{}').get('assignment_text', '')
+                sentences = [s for s in re.split(r'(?<=[.!?])\s+', essay) if s][:3]
+                self._send(200, {
+                    "high_level_feedback": _words(rng, 120),
+                    "comments": [{"label": "Comment", "comment_text": _words(rng, 30), "original_text": s}
+                                 for s in sentences],
+                })
+
+    return FakeBackendHandler
+
+
+def start_fake_backend(config: Dict[str, Any]) -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class FakeGeminiModel:
+    """
+    Stand-in for genai.GenerativeModel that posts to the fake backend over HTTP, so a Gemini judge run pays
+    real request overhead without Google credentials.
+    """
+
+    def __init__(self, base_url: str, model_name: str = "gemini-fake"):
+        self.url = f"{base_url}/v1beta/models/{model_name}:generateContent"
+
+    def generate_content(self, prompt: str, generation_config: Any = None) -> SimpleNamespace:
+        import requests
+
+        response = requests.post(self.url, json={"contents": [{"parts": [{"text": prompt}]}]})
+        if response.status_code == 429:
+            raise RuntimeError("429 Resource has been exhausted (fake backend)")
+        payload = response.json()
+        usage = payload.get("usageMetadata", {})
+        return SimpleNamespace(
+            text=payload["candidates"][0]["content"]["parts"][0]["text"],
+            usage_metadata=SimpleNamespace(prompt_token_count=usage.get("promptTokenCount"),
+                                           candidates_token_count=usage.get("candidatesTokenCount")),
+            prompt_feedback=None,
+        )
+
+
+# --- Scenarios (run in a fresh subprocess each, inside a scratch directory) ---
+
+def synthetic_corpus(size: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    subjects = [("english literature", "9th grade"), ("us history", "12th grade"), ("social studies", "9th grade")]
+    rows = []
+    for i in range(size):
+        subject, grade = subjects[i % len(subjects)]
+        essay = ". ".join(_words(rng, 18).capitalize() for _ in range(25)) + "."
+        rows.append({"essay_id": f"{i:08x}", "subject": subject, "grade": grade,
+                     "knowledge level": f"{rng.randint(1, 5)} - level", "grammar level": f"{rng.randint(1, 5)} - level",
+                     "flow level": f"{rng.randint(1, 5)} - level", "essay": essay})
+    return pd.DataFrame(rows)
+
+
+def _write_judge_inputs(corpus: pd.DataFrame, feedback_text: str) -> None:
+    with sqlite3.connect('samples_data.db') as conn:
+        corpus.rename(columns={'essay_id': 'sample_id', 'essay': 'essay_text'})[['sample_id', 'essay_text']] \
+            .to_sql('essays', conn, if_exists='replace', index=False)
+    with sqlite3.connect('feedback_data.db') as conn:
+        pd.DataFrame({'sample_id': corpus['essay_id'], 'feedback_text': feedback_text}) \
+            .to_sql('feedback', conn, if_exists='replace', index=False)
+
+
+def _shards(df: pd.DataFrame, parts: int) -> list[pd.DataFrame]:
+    return [df.iloc[i::parts] for i in range(parts) if len(df.iloc[i::parts])]
+
+
+def run_scenario(scenario: str, size: int, concurrency: int, base_url: str) -> Dict[str, Any]:
+    """
+    Drive one scenario against the fake backend and return its throughput; latencies come from the trace.
+    """
+    from openai import OpenAI
+
+    client = OpenAI(api_key='bench', base_url=f"{base_url}/v1", max_retries=0)
+    corpus = synthetic_corpus(size)
+    feedback_text = "High Level Feedback:\n" + _words(random.Random(1), 120) + "\n\nSpecific Comments:\n[]"
+
+    started = time.perf_counter()
+    if scenario == 'essay_gen':
+        import Stud_essay_random_distro as generator
+        generator.client = client
+        counts = [size // concurrency + (i < size % concurrency) for i in range(concurrency)]
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(lambda job: generator.essay_gen(job[1], topic=f"Benchmark topic {job[0]}",
+                                                          grade_level="9th grade", subject="us history",
+                                                          assignment_type="essay", prompt="Write 5 paragraphs."),
+                          [(i, n) for i, n in enumerate(counts) if n]))
+    elif scenario == 'feedback':
+        import feedback_desk_api
+        feedback_desk_api.FEEDBACK_API_URL = f"{base_url}/api/generate-feedback-QMSS/"
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(feedback_desk_api.feedback_for_samples, _shards(corpus, concurrency)))
+    elif scenario in ('judge_gpt_main', 'judge_gpt_calls'):
+        import feedback_desk_gpt_judge as judge
+        judge.client = client
+        if scenario == 'judge_gpt_main':
+            _write_judge_inputs(corpus, feedback_text)
+            started = time.perf_counter()
+            judge.main()
+        else:
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(lambda essay: judge.get_llm_evaluation(essay, feedback_text, client, {}),
+                              corpus['essay']))
+    elif scenario in ('judge_gemini_main', 'judge_gemini_calls'):
+        import feedback_desk_gemini_judge as judge
+        judge.gemini_model_instance = FakeGeminiModel(base_url)
+        if scenario == 'judge_gemini_main':
+            _write_judge_inputs(corpus, feedback_text)
+            started = time.perf_counter()
+            judge.main()
+        else:
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(lambda essay: judge.get_llm_evaluation(essay, feedback_text,
+                                                                     judge.gemini_model_instance, {}),
+                              corpus['essay']))
+    else:
+        raise ValueError(f"Unknown scenario {scenario}")
+    wall = time.perf_counter() - started
+
+    return {'wall_s': wall, 'essays_per_s': size / wall,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def _call_latencies(trace_path: str) -> Dict[str, Any]:
+    from tracing import load_spans
+
+    if not os.path.exists(trace_path):
+        return {}
+    spans = load_spans(trace_path)
+    calls = spans[spans['kind'] == 'call']
+    if calls.empty:
+        return {}
+    latency = calls['duration_ms']
+    return {'calls': len(calls), 'call_errors': int((calls['outcome'] != 'ok').sum()),
+            'p50_ms': latency.quantile(0.5), 'p95_ms': latency.quantile(0.95), 'p99_ms': latency.quantile(0.99)}
+
+
+# --- Startup time ---
+
+# Scripts with a CLI, timed as `python <script> --help`.
+CLI_SCRIPTS = ['feedback_desk_gpt_judge.py', 'feedback_desk_gemini_judge.py', 'pipeline.py', 'tracing.py',
+               'agreement_counters.py', 'essay_index.py', 'artifact_store.py', 'artifact_sql.py',
+               'report_builder.py', 'ordinal_models.py', 'adaptive_judging.py']
+
+# Modules a test suite would import, timed as `python -c "import <module>"`.
+IMPORT_MODULES = ['Stud_essay_random_distro', 'student_essay', 'feedback_desk_api', 'feedback_desk_gpt_judge',
+                  'feedback_desk_gemini_judge', 'judge_scores', 'agreement', 'pipeline', 'tracing']
+
+
+def startup_times(repeats: int = 5) -> pd.DataFrame:
+    """
+    Median and best wall time of `--help` for every CLI script and of a bare import of every module, in a
+    scratch directory with no API keys set (so nothing can reach the network). 'python -c pass' is the floor.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {key: value for key, value in os.environ.items() if not key.endswith('_API_KEY')}
+    env['PYTHONPATH'] = here + os.pathsep + env.get('PYTHONPATH', '')
+    commands = {'python -c pass': [sys.executable, '-c', 'pass']}
+    commands.update({f'{script} --help': [sys.executable, os.path.join(here, script), '--help']
+                     for script in CLI_SCRIPTS})
+    commands.update({f'import {module}': [sys.executable, '-c', f'import {module}'] for module in IMPORT_MODULES})
+
+    rows = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for name, command in commands.items():
+            times, output = [], ''
+            for _ in range(repeats):
+                started = time.perf_counter()
+                run = subprocess.run(command, cwd=scratch, env=env, capture_output=True, text=True)
+                times.append(time.perf_counter() - started)
+                output = run.stdout + run.stderr
+            rows.append({'command': name, 'median_s': float(pd.Series(times).median()), 'min_s': min(times),
+                         'ok': run.returncode == 0,
+                         # Imports should be silent; anything printed is a side effect.
+                         'prints_on_import': name.startswith('import ') and bool(output.strip()),
+                         'side_effect_files': sorted(os.listdir(scratch))})
+    return pd.DataFrame(rows)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scenarios: list[str], sizes: list[int], concurrency: list[int],
+                   backend: Dict[str, Any] = DEFAULT_BACKEND, results_path: str = RESULTS_PATH) -> pd.DataFrame:
+    """
+    Every scenario × corpus size × concurrency, each in a fresh interpreter (clean memory high-water mark and
+    module state) against one shared fake backend. Results are appended to results_path with the git revision.
+    """
+    server, base_url = start_fake_backend(backend)
+    revision = git_revision()
+    here = os.path.dirname(os.path.abspath(__file__))
+    rows = []
+    try:
+        for scenario in scenarios:
+            for size in sizes:
+                for workers in ([1] if scenario in SEQUENTIAL_SCENARIOS else concurrency):
+                    with tempfile.TemporaryDirectory() as scratch:
+                        trace_path = os.path.join(scratch, 'traces.jsonl')
+                        result_path = os.path.join(scratch, 'result.json')
+                        env = {**os.environ, 'JUDGE_TRACE_PATH': trace_path,
+                               'PYTHONPATH': here + os.pathsep + os.environ.get('PYTHONPATH', '')}
+                        print(f"⏱️ {scenario} size={size} concurrency={workers}...")
+                        run = subprocess.run(
+                            [sys.executable, os.path.join(here, 'benchmark.py'), '_run', scenario, str(size),
+                             str(workers), base_url, result_path],
+                            cwd=scratch, env=env, capture_output=True, text=True)
+                        if run.returncode != 0 or not os.path.exists(result_path):
+                            print(f"❌ {scenario} failed:\n{run.stderr[-2000:]}")
+                            continue
+                        with open(result_path, encoding='utf-8') as f:
+                            measured = json.load(f)
+                        rows.append({
+                            'revision': revision,
+                            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                            'scenario': scenario, 'size': size, 'concurrency': workers,
+                            **measured, **_call_latencies(trace_path), 'backend': backend,
+                        })
+    finally:
+        server.shutdown()
+
+    with open(results_path, 'a', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, default=str) + '\n')
+    print(f"💾 Appended {len(rows)} results to {results_path}")
+    return pd.DataFrame(rows).drop(columns='backend', errors='ignore')
+
+
+def compare(results_path: str = RESULTS_PATH, base: str | None = None, head: str | None = None) -> pd.DataFrame:
+    """
+    Latest result per scenario/size/concurrency for two revisions side by side (default: the last two seen).
+    """
+    with open(results_path, encoding='utf-8') as f:
+        results = pd.DataFrame([json.loads(line) for line in f if line.strip()])
+    revisions = list(dict.fromkeys(results['revision']))
+    head = head or revisions[-1]
+    base = base or next((rev for rev in reversed(revisions) if rev != head), None)
+    if base is None or base == head:
+        raise ValueError(f"Need results from two different revisions in {results_path}, found {revisions}")
+    key = ['scenario', 'size', 'concurrency']
+    metrics = ['essays_per_s', 'wall_s', 'p95_ms', 'p99_ms', 'max_rss_mb']
+    latest = results.groupby(['revision'] + key).last().reset_index()
+    table = pd.merge(latest[latest['revision'] == base][key + metrics],
+                     latest[latest['revision'] == head][key + metrics], on=key, suffixes=(f'_{base}', f'_{head}'))
+    table['throughput_change'] = table[f'essays_per_s_{head}'] / table[f'essays_per_s_{base}'] - 1
+    return table
+
+
+if __name__ == "__main__":
+    import argparse
+
+    if len(sys.argv) > 1 and sys.argv[1] == '_run':
+        scenario, size, workers, base_url, result_path = sys.argv[2:7]
+        measured = run_scenario(scenario, int(size), int(workers), base_url)
+        with open(result_path, 'w', encoding='utf-8') as f:
+            json.dump(measured, f)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks against fake API backends.")
+    parser.add_argument("command", choices=['run', 'startup', 'compare'])
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_BACKEND['latency_ms'])
+    parser.add_argument("--latency-sigma", type=float, default=DEFAULT_BACKEND['latency_sigma'])
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_BACKEND['error_rate'])
+    parser.add_argument("--malformed-rate", type=float, default=DEFAULT_BACKEND['malformed_rate'])
+    parser.add_argument("--tokens-out", type=int, default=DEFAULT_BACKEND['tokens_out'])
+    parser.add_argument("--seed", type=int, default=DEFAULT_BACKEND['seed'])
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per command (startup).")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--base", default=None, help="Revision to compare against (compare).")
+    parser.add_argument("--head", default=None, help="Revision to compare (compare).")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        backend = {'latency_ms': args.latency_ms, 'latency_sigma': args.latency_sigma, 'error_rate': args.error_rate,
+                   'malformed_rate': args.malformed_rate, 'tokens_out': args.tokens_out, 'seed': args.seed}
+        print(run_benchmarks(args.scenarios, args.sizes, args.concurrency, backend, args.results).to_string(index=False))
+    elif args.command == 'startup':
+        startup = startup_times(args.repeats)
+        revision, timestamp = git_revision(), datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with open(args.results, 'a', encoding='utf-8') as f:
+            for row in startup.to_dict('records'):
+                f.write(json.dumps({'revision': revision, 'timestamp': timestamp, 'scenario': f"startup: {row['command']}",
+                                    'size': 0, 'concurrency': 1, 'wall_s': row['median_s'], **row}) + '\n')
+        print(startup.to_string(index=False))
+    else:
+        print(compare(args.results, args.base, args.head).to_string(index=False))
@@ -0,0 +1,109 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from agreement import DIMENSIONS, SCORES
+
+# Cube axes in storage order; the level axes hold the generated 1-5 competency levels.
+AXES = ['dimension', 'subject', 'grade', 'knowledge', 'grammar', 'flow', 'score_gpt', 'score_gemini']
+
+LEVEL_COLUMNS = {'knowledge': 'knowledge level', 'grammar': 'grammar level', 'flow': 'flow level'}
+
+CUBE_PATH = 'confusion_cube.npz'
+
+
+def level_number(series: pd.Series) -> pd.Series:
+    """
+    '3 - medium knowledge' -> 3, as written by essay_gen.
+    """
+    return pd.to_numeric(series.astype(str).str.extract(r'^\s*(\d)', expand=False), errors='coerce')
+
+
+class ConfusionCube:
+    """
+    Dense count array indexed [dimension, subject, grade, knowledge, grammar, flow, score_gpt, score_gemini].
+    Any confusion matrix or marginal is a slice and sum of it, not another groupby over the essays.
+    """
+
+    def __init__(self, counts: np.ndarray, labels: dict[str, list]):
+        self.counts = counts
+        self.labels = labels
+
+    @classmethod
+    def build(cls, merged_all_df: pd.DataFrame, dimensions: list[str] = DIMENSIONS) -> "ConfusionCube":
+        """
+        One pass over merged_all_df: encode every axis as integer codes and bincount the flat cell index.
+        """
+        subjects = pd.Categorical(merged_all_df['subject'])
+        grades = pd.Categorical(merged_all_df['grade'])
+        labels = {
+            'dimension': list(dimensions),
+            'subject': [str(c) for c in subjects.categories],
+            'grade': [str(c) for c in grades.categories],
+            'knowledge': SCORES,
+            'grammar': SCORES,
+            'flow': SCORES,
+            'score_gpt': SCORES,
+            'score_gemini': SCORES,
+        }
+        shape = tuple(len(labels[axis]) for axis in AXES)
+
+        level_codes = [level_number(merged_all_df[LEVEL_COLUMNS[axis]]).to_numpy() - 1
+                       for axis in ('knowledge', 'grammar', 'flow')]
+        base_codes = [subjects.codes, grades.codes] + level_codes
+
+        flat = []
+        for d, dim in enumerate(dimensions):
+            gpt = pd.to_numeric(merged_all_df[f'{dim}_gpt'], errors='coerce').astype(float).to_numpy() - 1
+            gemini = pd.to_numeric(merged_all_df[f'{dim}_gemini'], errors='coerce').astype(float).to_numpy() - 1
+            codes = [np.full(len(merged_all_df), d)] + base_codes + [gpt, gemini]
+
+            valid = np.ones(len(merged_all_df), dtype=bool)
+            for code, size in zip(codes, shape):
+                valid &= np.isfinite(code) & (code >= 0) & (code < size)
+            flat.append(np.ravel_multi_index([np.asarray(c)[valid].astype(np.int64) for c in codes], shape))
+
+        counts = np.bincount(np.concatenate(flat), minlength=int(np.prod(shape))).reshape(shape)
+        return cls(counts.astype(np.int32), labels)
+
+    def save(self, path: str = CUBE_PATH) -> None:
+        np.savez_compressed(path, counts=self.counts, labels=json.dumps(self.labels))
+
+    @classmethod
+    def load(cls, path: str = CUBE_PATH) -> "ConfusionCube":
+        with np.load(path) as data:
+            return cls(data['counts'], json.loads(str(data['labels'])))
+
+    def _index(self, **filters) -> tuple:
+        """
+        Index tuple selecting the given axis labels (e.g. subject='history', grammar=1); other axes stay whole.
+        """
+        index = []
+        for axis in AXES:
+            if axis in filters:
+                index.append(self.labels[axis].index(filters[axis]))
+            else:
+                index.append(slice(None))
+        unknown = set(filters) - set(AXES)
+        if unknown:
+            raise KeyError(f"Unknown cube axes: {sorted(unknown)}")
+        return tuple(index)
+
+    def marginal(self, keep: list[str], **filters) -> np.ndarray:
+        """
+        Counts summed over every axis not in keep, after applying filters.
+        """
+        sliced = self.counts[self._index(**filters)]
+        remaining = [axis for axis in AXES if axis not in filters]
+        drop = tuple(i for i, axis in enumerate(remaining) if axis not in keep)
+        return sliced.sum(axis=drop)
+
+    def confusion(self, dimension: str, **filters) -> pd.DataFrame:
+        """
+        The notebook's heatmap table: rows are Gemini scores, columns GPT scores.
+        """
+        matrix = self.marginal(['score_gpt', 'score_gemini'], dimension=dimension, **filters)
+        return pd.DataFrame(matrix.T,
+                            index=pd.Index(SCORES, name=f'{dimension}_gemini'),
+                            columns=pd.Index(SCORES, name=f'{dimension}_gpt'))
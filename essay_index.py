@@ -0,0 +1,158 @@
+import json
+import random
+import sqlite3
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from grammar_prescore import parse_comments
+from judge_scores import ingest_judgments
+
+INDEX_PATH = 'essay_index.db'
+
+ESSAY_FIELDS = ['subject', 'grade', 'knowledge level', 'grammar level', 'flow level', 'essay']
+FEEDBACK_FIELDS = ['high_level_feedback', 'comments']
+
+
+def _plain(value: Any) -> Any:
+    """
+    JSON-safe version of a cell value: numpy scalars become Python ones, NaN/<NA> become None.
+    """
+    if isinstance(value, (list, dict)):
+        return value
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _records(df: pd.DataFrame, fields: List[str]) -> Dict[str, Dict[str, Any]]:
+    df = df.drop_duplicates(subset=['essay_id']).copy()
+    df['essay_id'] = df['essay_id'].astype(str)
+    fields = [field for field in fields if field in df.columns]
+    return {row['essay_id']: {field: _plain(row[field]) for field in fields}
+            for row in df[['essay_id'] + fields].to_dict('records')}
+
+
+class EssayIndex:
+    """
+    On-disk essay_id -> case index: the essay and its competency triplet, the Feedback Desk feedback and
+    comments, and every judge's scores, stored as one JSON document per essay under a primary key.
+    A lookup is a single keyed read, whatever the number of essays.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS essays (essay_id TEXT PRIMARY KEY, record TEXT NOT NULL)")
+
+    def build(self, samples_df: pd.DataFrame, feedback_df: pd.DataFrame | None = None,
+              judgments: Dict[str, pd.DataFrame] | None = None) -> int:
+        """
+        (Re)write the index. judgments maps a judge name ('gpt', 'gemini', ...) to its results table.
+        Returns the number of essays indexed.
+        """
+        essays = _records(samples_df, ESSAY_FIELDS)
+        feedback = _records(feedback_df, FEEDBACK_FIELDS) if feedback_df is not None else {}
+        judged = {}
+        for judge, df in (judgments or {}).items():
+            typed = ingest_judgments(df)
+            judged[judge] = _records(typed, [col for col in typed.columns if col != 'essay_id'])
+
+        rows = []
+        for essay_id, essay in essays.items():
+            record = {'essay_id': essay_id, **essay}
+            entry = feedback.get(essay_id, {})
+            record['high_level_feedback'] = entry.get('high_level_feedback')
+            record['comments'] = parse_comments(entry.get('comments')) or entry.get('comments')
+            record['judges'] = {judge: scores[essay_id] for judge, scores in judged.items() if essay_id in scores}
+            rows.append((essay_id, json.dumps(record, ensure_ascii=False)))
+
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("DELETE FROM essays")
+            conn.executemany("INSERT INTO essays (essay_id, record) VALUES (?, ?)", rows)
+        print(f"🗂️ Indexed {len(rows)} essays in {self.path}")
+        return len(rows)
+
+    def get(self, essay_id: str) -> Dict[str, Any] | None:
+        with sqlite3.connect(self.path) as conn:
+            row = conn.execute("SELECT record FROM essays WHERE essay_id = ?", (str(essay_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, essay_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Records for several essays in one connection, in the order asked for (missing ids are skipped).
+        """
+        records = []
+        with sqlite3.connect(self.path) as conn:
+            for essay_id in essay_ids:
+                row = conn.execute("SELECT record FROM essays WHERE essay_id = ?", (str(essay_id),)).fetchone()
+                if row:
+                    records.append(json.loads(row[0]))
+        return records
+
+    def essay_ids(self) -> List[str]:
+        with sqlite3.connect(self.path) as conn:
+            return [row[0] for row in conn.execute("SELECT essay_id FROM essays")]
+
+    def sample(self, n: int, seed: int | None = None) -> List[Dict[str, Any]]:
+        """
+        n random cases for review.
+        """
+        ids = self.essay_ids()
+        return self.get_many(random.Random(seed).sample(ids, min(n, len(ids))))
+
+
+def format_case(record: Dict[str, Any]) -> str:
+    """
+    Plain-text view of one case, as printed by the CLI.
+    """
+    lines = [f"📄 {record['essay_id']} | {record.get('subject')} | {record.get('grade')}",
+             f"   knowledge: {record.get('knowledge level')} | grammar: {record.get('grammar level')} | "
+             f"flow: {record.get('flow level')}",
+             "", str(record.get('essay') or ''), "",
+             "High Level Feedback:", str(record.get('high_level_feedback') or ''), "",
+             "Specific Comments:"]
+    comments = record.get('comments')
+    if isinstance(comments, list):
+        for comment in comments:
+            if isinstance(comment, dict):
+                lines.append(f"  - [{comment.get('label', '')}] {comment.get('comment_text', '')}")
+                lines.append(f"      on: {comment.get('original_text', '')}")
+    elif comments:
+        lines.append(str(comments))
+    lines.append("")
+    for judge, scores in record.get('judges', {}).items():
+        lines.append(f"⚖️ {judge}: " + ", ".join(f"{k}={v}" for k, v in scores.items() if k != 'justification'))
+        if scores.get('justification'):
+            lines.append(f"   {scores['justification']}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or query the per-essay drill-down index.")
+    parser.add_argument("essay_ids", nargs="*", help="Essays to show.")
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--build", action="store_true", help="(Re)build the index from the pickles first.")
+    parser.add_argument("--samples", default='SAMPLES.pkl')
+    parser.add_argument("--feedback", default='feedback_results_df.pkl')
+    parser.add_argument("--gpt", default='GPT_judges_evaluation_results.pkl')
+    parser.add_argument("--gemini", default='Gemini_judges_evaluation_results.pkl')
+    parser.add_argument("--random", type=int, default=0, metavar="N", help="Show N random cases.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print raw JSON records.")
+    args = parser.parse_args()
+
+    index = EssayIndex(args.index)
+    if args.build:
+        index.build(pd.read_pickle(args.samples), pd.read_pickle(args.feedback),
+                    {'gpt': pd.read_pickle(args.gpt), 'gemini': pd.read_pickle(args.gemini)})
+
+    records = index.get_many(args.essay_ids) + (index.sample(args.random, args.seed) if args.random else [])
+    missing = set(args.essay_ids) - {record['essay_id'] for record in records}
+    for essay_id in sorted(missing):
+        print(f"⚠️ {essay_id} is not in {args.index}")
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False, indent=2) if args.json else format_case(record))
+        print("\n" + "-" * 80 + "\n")
@@ -0,0 +1,239 @@
+import functools
+import os
+from typing import TYPE_CHECKING
+
+import requests
+from dotenv import load_dotenv
+
+from api_pool import bulk, bulk_map, pooled
+from tracing import annotate, traced
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+FEEDBACK_API_URL = "https://laurauguc.pythonanywhere.com/api/generate-feedback-QMSS/"
+
+# Seconds to wait for the connection and for the reply; a stuck request must not hold a pool worker forever.
+FEEDBACK_TIMEOUT = (10, 180)
+
+# Set on results whose request failed or whose reply has no feedback; those essays are retried.
+FEEDBACK_ERROR = 'feedback_error'
+
+
+def build_assignment_info(subject, grade_level):
+    subject = subject.lower().strip()
+    grade_level = str(grade_level).lower().strip()
+
+
+    # ENGLISH LITERATURE
+
+    if subject == "english literature" and grade_level == "9th grade":
+        return """
+9th Grade English Literature Expectations:
+
+Content:
+Students identify central themes, summarize plot elements, describe character traits,
+and recognize basic literary techniques such as tone, mood, symbolism, and figurative language.
+
+Skills:
+Students should interpret meaning at a foundational level, explain character development,
+and describe how specific events contribute to the story.
+
+Evidence & Reasoning:
+Students use simple textual evidence—short quotes or paraphrases—to support their ideas.
+Reasoning should be clear and connected directly to the evidence.
+
+Writing:
+Writing should be organized and easy to follow, with basic paragraph structure,
+topic sentences, and emerging analytical thinking.
+"""
+
+    if subject == "english literature" and grade_level == "12th grade":
+        return """
+12th Grade English Literature Expectations:
+
+Content:
+Students analyze complex themes, evaluate the author’s craft, interpret symbolism and motifs,
+and connect texts to historical, cultural, or philosophical contexts.
+
+Skills:
+Students engage in advanced literary analysis, compare interpretations, explore ambiguity,
+and show mature critical thinking in interpreting text.
+
+Evidence & Reasoning:
+Students integrate sophisticated, well-chosen textual evidence. Quotations should be integrated smoothly
+and interpreted in depth.
+
+Writing:
+Writing should be fluent, academic, and well-structured. Essays should include strong thesis statements,
+coherent argumentation, and polished analytical prose.
+"""
+
+
+    # U.S. HISTORY
+
+    if subject == "us history" and grade_level == "9th grade":
+        return """
+9th Grade U.S. History Expectations:
+
+Content:
+Students describe major events, key figures, and foundational themes in U.S. history.
+They explain basic cause-and-effect relationships and understand general historical context.
+
+Skills:
+Students identify primary vs. secondary sources, recognize different perspectives,
+and understand simple historical patterns.
+
+Evidence & Reasoning:
+Students support explanations with factual evidence or simple references to historical events.
+Reasoning should be developing but accurate.
+
+Writing:
+Writing should be chronological, clear, and organized, showing basic understanding of
+historical relationships and significance.
+"""
+
+    if subject == "us history" and grade_level == "12th grade":
+        return """
+12th Grade U.S. History Expectations:
+
+Content:
+Students evaluate major social, political, and economic developments in U.S. history.
+They analyze how events are shaped by broader historical forces and long-term patterns.
+
+Skills:
+Students interpret and critique primary and secondary sources, analyze bias, compare perspectives,
+and synthesize information across multiple documents.
+
+Evidence & Reasoning:
+Students use strong historical evidence, integrate sources into arguments, and articulate complex
+cause-and-effect relationships with advanced reasoning.
+
+Writing:
+Writing should be analytical and well-organized, with clear thesis-driven arguments,
+nuanced interpretation, and formal academic style.
+"""
+
+
+    # SOCIAL STUDIES
+
+    if subject == "social studies" and grade_level == "9th grade":
+        return """
+9th Grade Social Studies Expectations:
+
+Content:
+Students understand basic civic, geographic, cultural, and economic concepts.
+They summarize key ideas and describe simple relationships between events or systems.
+
+Skills:
+Students identify causes and effects, explain foundational civic processes,
+and show emerging understanding of social structures and institutions.
+
+Evidence & Reasoning:
+Students use basic factual evidence such as definitions, examples, or simple data
+to support their explanations.
+
+Writing:
+Writing should be clear, organized, and show early analytical thinking.
+Students should focus on demonstrating understanding rather than complex argumentation.
+"""
+
+    if subject == "social studies" and grade_level == "12th grade":
+        return """
+12th Grade Social Studies Expectations:
+
+Content:
+Students evaluate complex social, political, economic, or cultural issues.
+They examine systems, institutions, power dynamics, and multiple viewpoints.
+
+Skills:
+Students analyze claims, critique arguments, compare evidence, evaluate sources,
+and demonstrate advanced civic and social reasoning.
+
+Evidence & Reasoning:
+Students use credible, relevant evidence such as data, scholarly sources,
+case studies, and historical examples to construct well-reasoned arguments.
+
+Writing:
+Writing should be structured and analytical, with clear argumentation,
+precise language, and strong organization demonstrating higher-level critical thinking.
+"""
+
+    # FALLBACK
+
+    return f"General {grade_level} {subject} assignment expectations."
+
+
+@functools.cache
+def default_api_key() -> str | None:
+    """
+    QMSS_API_KEY from the environment or .env, read on the first request rather than at import.
+    """
+    load_dotenv()
+    return os.getenv('QMSS_API_KEY')
+
+
+@traced(provider="feedback_desk")
+@pooled("feedback_desk")
+def call_feedback_api(essay_text: str, assignment_info: str, api_key: str | None = None) -> dict:
+    """
+    One Feedback Desk request, as in the Connecting_to_Feedback_Desk_API notebook. A failed request
+    (timeout, network error, HTTP error status, non-JSON reply) returns {FEEDBACK_ERROR: reason} instead of
+    raising.
+    """
+    headers = {
+        "Authorization": f"Api-Key {api_key or default_api_key()}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "assignment_text": essay_text,
+        "assignment_info": assignment_info
+    }
+    try:
+        response = requests.post(FEEDBACK_API_URL, json=data, headers=headers, timeout=FEEDBACK_TIMEOUT)
+    except requests.Timeout as e:
+        print(f"❌ Feedback Desk request timed out: {e}")
+        return {FEEDBACK_ERROR: f"timeout: {e}"}
+    except requests.RequestException as e:
+        print(f"❌ Feedback Desk request failed: {e}")
+        return {FEEDBACK_ERROR: str(e)}
+    annotate(status_code=response.status_code, response_chars=len(response.content))
+    if not response.ok:
+        print(f"❌ Feedback Desk returned HTTP {response.status_code}")
+        return {FEEDBACK_ERROR: f"HTTP {response.status_code}: {response.text[:200]}"}
+    try:
+        return response.json()
+    except ValueError as e:
+        print(f"❌ Feedback Desk reply is not JSON: {e}")
+        return {FEEDBACK_ERROR: f"reply is not JSON: {e}"}
+
+
+@traced(kind="stage", name="feedback")
+@bulk("feedback")
+def feedback_for_samples(samples_df: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Feedback Desk results for every essay in samples_df: essay_id, high_level_feedback, comments and
+    feedback_error (None, or why the essay got no feedback). The requests run concurrently as bulk calls on
+    the shared Feedback Desk pool.
+    """
+    import pandas as pd
+
+    requests_args = [
+        {'essay_text': row['essay'], 'assignment_info': build_assignment_info(row['subject'], row['grade'])}
+        for _, row in samples_df.iterrows()
+    ]
+    feedback_results = []
+    for (_, row), feedback_response in zip(samples_df.iterrows(), bulk_map(call_feedback_api, requests_args)):
+        error = feedback_response.get(FEEDBACK_ERROR)
+        if error is None and 'high_level_feedback' not in feedback_response:
+            error = f"reply has no feedback: {str(feedback_response)[:200]}"
+        feedback_results.append({
+            'essay_id': row['essay_id'],
+            'high_level_feedback': None if error else feedback_response['high_level_feedback'],
+            'comments': [] if error else feedback_response.get('comments', []),
+            FEEDBACK_ERROR: error,
+        })
+
+    failed = sum(result[FEEDBACK_ERROR] is not None for result in feedback_results)
+    print(f"Processed {len(feedback_results)} essays and stored feedback ({failed} failed).")
+    return pd.DataFrame(feedback_results)
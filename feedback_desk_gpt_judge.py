@@ -11,17 +11,46 @@ import os
 import sqlite3
 import pandas as pd
 import json
-from openai import OpenAI
 from dotenv import load_dotenv
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any
+from judge_logprobs import tokens_from_openai, soft_scores
+from grammar_prescore import prescore_grammar, rubric_without_grammar
+from judge_inputs import load_feedback_comments
+from judge_packing import build_packed_prompt, evaluate_packed, calibration_report
+from judge_retry_queue import RetryQueue, classify_failure, drain_retries, MALFORMED_JSON
+from agreement_counters import AgreementCounters
+from judge_scores import DIMENSIONS, ingest_judgments, parse_judgment, rubric_dimensions
+from api_pool import bulk, pooled
+from tracing import annotate, openai_usage, traced
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+GPT_MODEL = "gpt-4o-mini"
+JUDGE_TEMPERATURE = 0.2
+
+# Created by get_client() on first use; assign a client here to point the judge elsewhere.
+client = None
+
+def get_client() -> "OpenAI":
+    """
+    The shared OpenAI client. The .env file and the openai package are only loaded on the first call,
+    so importing this module does no I/O.
+    """
+    global client
+    if client is None:
+        from openai import OpenAI
 
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
+        load_dotenv()
+        api_key = os.getenv("OPENAI_API_KEY")
+
+        if api_key:
+            print("✅ OpenAI API key is loaded!")
+        else:
+            print("❌ OpenAI API key NOT loaded.")
 
-if api_key:
-    print("✅ OpenAI API key is loaded!")
-else:
-    print("❌ OpenAI API key NOT loaded.")
+        client = OpenAI(api_key=api_key)
+    return client
 
 SYSTEM_ROLE_JUDGE = """
 You are a judge that evaluates feedback on written assignments.
@@ -99,6 +128,9 @@ def load_data(samples_db_path: str, feedback_db_path: str) -> pd.DataFrame:
         print("Please ensure the .db file exists and that the table names (essays, feedback) and column names (sample_id, ...) are correct.")
         return pd.DataFrame() # Return an empty DataFrame
 
+# Each judge keeps its own table in the shared output database, so neither run overwrites the other's results.
+EVALUATIONS_TABLE = 'gpt_evaluations'
+
 def save_results(results_df: pd.DataFrame, output_db_path: str):
     """
     Save the evaluation results to a new SQLite database file.
@@ -107,16 +139,27 @@ def save_results(results_df: pd.DataFrame, output_db_path: str):
     try:
         conn_output = sqlite3.connect(output_db_path)
         # ‘if_exists='replace’' will replace the old table. To append data, use ‘append’.
-        results_df.to_sql('evaluations', conn_output, if_exists='replace', index=False)
+        results_df.to_sql(EVALUATIONS_TABLE, conn_output, if_exists='replace', index=False)
         conn_output.close()
         print("✅ Results saved successfully.")
     except Exception as e:
         print(f"❌ Error saving results: {e}")
 
-def get_llm_evaluation(essay: str, feedback: str, client: OpenAI) -> Dict[str, Any] | None:
+@traced(provider="openai")
+@pooled("openai")
+def get_llm_evaluation(essay: str, feedback: str, client: "OpenAI",
+                       failure: Dict[str, Any] | None = None,
+                       rubric: str = EVALUATION_RUBRIC,
+                       model_name: str = GPT_MODEL,
+                       temperature: float = JUDGE_TEMPERATURE,
+                       logprobs: bool = False) -> Dict[str, Any] | None:
     """
     Construct the prompt and invoke the GPT-4.0 model to obtain the evaluation.
+    If a failure dict is passed, it is filled with the failure 'category' and 'error' when None is returned.
+    With logprobs=True the same call also requests token logprobs and adds, for every rubric key,
+    '<dimension>_expected' (expected score over 1-5) and '<dimension>_entropy' (confidence, in bits).
     """
+    evaluation_json = None
     # Build a structured user prompt
     user_prompt = f"""
     [Original student essay]
@@ -126,38 +169,85 @@ def get_llm_evaluation(essay: str, feedback: str, client: OpenAI) -> Dict[str, A
     {feedback}
 
     [Evaluation Criteria and Output Format]
-    {EVALUATION_RUBRIC}
+    {rubric}
     """
 
     try:
-        response = client.responses.create(
-            model="gpt-4o-mini",
+        response = client.chat.completions.create(
+            model=model_name,
             messages=[
                 {"role": "system", "content": SYSTEM_ROLE_JUDGE},
                 {"role": "user", "content": user_prompt}
             ],
             response_format={"type": "json_object"},
-            temperature=0.2
+            temperature=temperature,
+            **({"logprobs": True, "top_logprobs": 5} if logprobs else {})
         )
 
+        annotate(model=model_name, **openai_usage(response.usage))
         # Parsing the returned JSON string
-        evaluation_json = response.choices[0].message.content
-        evaluation_data = json.loads(evaluation_json)
+        choice = response.choices[0]
+        evaluation_json = choice.message.content
+        evaluation_data = parse_judgment(json.loads(evaluation_json), rubric_dimensions(rubric))
+        if evaluation_data is None:
+            print(f"❌ Error: reply does not match the rubric schema: {evaluation_json}")
+            if failure is not None:
+                failure.update(category=MALFORMED_JSON, error="reply does not match the rubric schema")
+            return None
+        if logprobs:
+            evaluation_data.update(soft_scores(tokens_from_openai(choice.logprobs.content)))
         return evaluation_data
 
     except json.JSONDecodeError as e:
         print(f"❌ Error: GPT-4.0 未返回有效的JSON。 错误: {e}")
         print(f"原始回复: {evaluation_json}")
+        if failure is not None:
+            failure.update(category=MALFORMED_JSON, error=str(e))
         return None
     except Exception as e:
         print(f"❌ Error calling OpenAI API: {e}")
+        if failure is not None:
+            failure.update(category=classify_failure(e), error=str(e))
         return None
 
-def main():
+@traced(provider="openai")
+@pooled("openai")
+def get_llm_packed_evaluation(pairs: list[Dict[str, str]], client: "OpenAI",
+                              temperature: float = JUDGE_TEMPERATURE) -> str | None:
+    """
+    Send several essay/feedback pairs in one request and return the raw JSON reply.
+    Parsing and per-id validation happen in judge_packing.parse_packed_response.
+    """
+    user_prompt = build_packed_prompt(pairs, EVALUATION_RUBRIC)
+
+    try:
+        response = client.chat.completions.create(
+            model=GPT_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_ROLE_JUDGE},
+                {"role": "user", "content": user_prompt}
+            ],
+            response_format={"type": "json_object"},
+            temperature=temperature
+        )
+        annotate(pairs=len(pairs), **openai_usage(response.usage))
+        return response.choices[0].message.content
+    except Exception as e:
+        print(f"❌ Error calling OpenAI API for packed evaluation: {e}")
+        return None
+
+@traced(kind="stage", name="judge_gpt")
+@bulk("judge_gpt")
+def main(pack_size: int = 1, logprobs: bool = False, grammar_prescore: bool = False):
+    if pack_size > 1 and logprobs or grammar_prescore:
+        raise ValueError("packed judging cannot be combined with logprobs or the grammar pre-score")
     # Define Database File Path
     SAMPLES_DB_PATH = 'samples_data.db'
     FEEDBACK_DB_PATH = 'feedback_data.db'
     OUTPUT_DB_PATH = 'judges_data.sql' #The output file can be named .sql, but it remains a SQLite database file.
+    retry_queue = RetryQueue(judge="gpt")
+    agreement_counters = AgreementCounters(OUTPUT_DB_PATH)
+    agreement_counters.register_samples_file()
 
     # load data
     merged_data = load_data(SAMPLES_DB_PATH, FEEDBACK_DB_PATH)
@@ -166,8 +256,25 @@ def main():
         print("No data to process; program exits.")
         return
 
+    # The grammar pre-score matches the raw comments' original_text against the essay, not the formatted text.
+    feedback_comments = load_feedback_comments() if grammar_prescore else {}
+
     results_list = [] # Store all evaluation results
 
+    # Packed mode: judge pack_size pairs per request; ids missing from a packed reply fall back to single calls below.
+    packed_results = {}
+    if pack_size > 1:
+        pairs = [
+            {"id": str(row['sample_id']), "essay": row['essay_text'], "feedback": row['feedback_text']}
+            for _, row in merged_data.iterrows()
+        ]
+        packed_results = evaluate_packed(
+            pairs,
+            lambda chunk: get_llm_packed_evaluation(chunk, get_client()),
+            None,
+            pack_size,
+        )
+
     # Iterate through each row of data (each paper and its feedback)
     for index, row in merged_data.iterrows():
         sample_id = row['sample_id']
@@ -177,24 +284,37 @@ def main():
         print(f"\n--- Evaluation Sample ID: {sample_id} ---")
 
         # Invoke GPT-4.0 for evaluation
-        evaluation = get_llm_evaluation(essay_text, feedback_text, client)
+        failure = {}
+        evaluation = packed_results.get(str(sample_id))
+        if evaluation is None:
+            prescore = prescore_grammar(essay_text, feedback_comments.get(str(sample_id), feedback_text)) \
+                if grammar_prescore else None
+            if prescore and not prescore['grammar_ambiguous']:
+                # The local pre-score settles Grammar, so the LLM only judges the other dimensions.
+                evaluation = get_llm_evaluation(essay_text, feedback_text, get_client(), failure,
+                                                rubric=rubric_without_grammar(EVALUATION_RUBRIC), logprobs=logprobs)
+                if evaluation:
+                    evaluation['Grammar'] = prescore['Grammar_local']
+            else:
+                evaluation = get_llm_evaluation(essay_text, feedback_text, get_client(), failure, logprobs=logprobs)
+            if evaluation and prescore:
+                evaluation.update(prescore)
 
         if evaluation:
             # Add the sample_id to the evaluation results for tracking purposes.
             evaluation['sample_id'] = sample_id
             results_list.append(evaluation)
-            print(f"✅ Evaluation completed: {evaluation['justification']}")
+            agreement_counters.record(sample_id, "gpt", evaluation)
+            # A pair that failed in an earlier run must not be judged again by `--drain-retries`.
+            retry_queue.mark_succeeded(sample_id)
+            print(f"✅ Evaluation completed: {evaluation.get('justification', evaluation)}")
         else:
-            print(f"❌ Evaluation failed: Essay ID {sample_id}")
-            # Record failed evaluations for subsequent retries.
-            results_list.append({
-                "sample_id": sample_id,
-                "tone_score": None,
-                "detail_score": None,
-                "grammar_score": None,
-                "stucture_score": None,
-                "content_score": None
-            })
+            print(f"❌ Evaluation failed: Essay ID {sample_id} ({failure.get('category')})")
+            # Record failed evaluations and queue them for `--drain-retries`.
+            retry_queue.push(sample_id, essay_text, feedback_text,
+                             failure.get('category', 'api_error'), failure.get('error', ''))
+            results_list.append({"sample_id": sample_id, **{dimension: None for dimension in DIMENSIONS}})
+            agreement_counters.record(sample_id, "gpt", None)
 
     # Convert all result lists to DataFrames
     results_df = pd.DataFrame(results_list)
@@ -204,8 +324,83 @@ def main():
         cols = ['sample_id'] + [col for col in results_df.columns if col != 'sample_id']
         results_df = results_df[cols]
 
+    # Typed columns (canonical names, int8 scores) before saving
+    results_df = ingest_judgments(results_df, id_column='sample_id')
+
     # Save the final result
     save_results(results_df, OUTPUT_DB_PATH)
 
     print("\n--- All evaluations have been completed and saved. ---")
-    print(results_df.head())
\ No newline at end of file
+    print(results_df.head())
+    print(retry_queue.summary())
+
+@traced(kind="stage", name="judge_gpt_retries")
+@bulk("judge_gpt")
+def drain_retries_main():
+    """
+    Re-run only the pairs in the retry queue and patch their rows in this judge's saved evaluations table.
+    """
+    OUTPUT_DB_PATH = 'judges_data.sql'
+    retry_queue = RetryQueue(judge="gpt")
+
+    conn_output = sqlite3.connect(OUTPUT_DB_PATH)
+    results_df = pd.read_sql_query(f"SELECT * FROM {EVALUATIONS_TABLE}", conn_output)
+    conn_output.close()
+
+    results_df = drain_retries(
+        retry_queue,
+        lambda essay, feedback, failure: get_llm_evaluation(essay, feedback, get_client(), failure),
+        results_df,
+    )
+    results_df = ingest_judgments(results_df, id_column='sample_id')
+    save_results(results_df, OUTPUT_DB_PATH)
+    agreement_counters = AgreementCounters(OUTPUT_DB_PATH)
+    agreement_counters.register_samples_file()
+    agreement_counters.record_frame(results_df, "gpt", id_column='sample_id')
+
+@bulk("judge_gpt")
+def calibrate_main(pack_sizes: list[int], sample_size: int):
+    """
+    Compare packed against single-pair scores on a sample of the data to choose a safe pack size.
+    """
+    merged_data = load_data('samples_data.db', 'feedback_data.db')
+    pairs = [
+        {"id": str(row['sample_id']), "essay": row['essay_text'], "feedback": row['feedback_text']}
+        for _, row in merged_data.iterrows()
+    ]
+    report = calibration_report(
+        pairs,
+        lambda chunk: get_llm_packed_evaluation(chunk, get_client()),
+        lambda essay, feedback: get_llm_evaluation(essay, feedback, get_client()),
+        pack_sizes=pack_sizes,
+        sample_size=sample_size,
+    )
+    print(report.to_string(index=False))
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Judge Feedback Desk feedback with GPT.")
+    parser.add_argument("--drain-retries", action="store_true",
+                        help="Re-run only the queued failed pairs and patch their rows in place.")
+    parser.add_argument("--pack-size", type=int, default=1,
+                        help="Number of essay/feedback pairs to judge per request.")
+    parser.add_argument("--calibrate", type=int, nargs="*", metavar="K",
+                        help="Compare packed vs. single-pair scores for these pack sizes (default 2 4 8).")
+    parser.add_argument("--calibration-sample", type=int, default=40)
+    parser.add_argument("--grammar-prescore", action="store_true",
+                        help="Score Grammar locally and only ask the LLM when the local score is ambiguous.")
+    parser.add_argument("--logprobs", action="store_true",
+                        help="Store expected score and entropy per dimension from token logprobs.")
+    args = parser.parse_args()
+    if args.pack_size > 1 and (args.logprobs or args.grammar_prescore):
+        # Packed replies carry neither logprobs nor a pre-scored Grammar, so the table would mix two kinds of rows.
+        parser.error("--logprobs and --grammar-prescore only apply to single-pair calls; use them without --pack-size.")
+
+    if args.drain_retries:
+        drain_retries_main()
+    elif args.calibrate is not None:
+        calibrate_main(args.calibrate or [2, 4, 8], args.calibration_sample)
+    else:
+        main(pack_size=args.pack_size, logprobs=args.logprobs, grammar_prescore=args.grammar_prescore)
@@ -0,0 +1,155 @@
+import ast
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+# --- Mechanics Rules ---
+# Each rule is (name, compiled pattern); a match is one issue located at its character span, or at the span of
+# its 'issue' group when the pattern has one.
+
+COMMON_MISSPELLINGS = [
+    "alot", "recieve", "recieved", "definately", "seperate", "untill", "becuase", "beacuse", "thier",
+    "wich", "occured", "occuring", "truely", "tommorow", "goverment", "enviroment", "begining",
+    "beleive", "belive", "wierd", "arguement", "basicly", "finaly", "realy", "importent", "diffrent",
+    "probaly", "tho", "thru", "everytime", "noone", "teh", "becasue", "cuz", "gonna", "wanna",
+]
+
+MISSING_APOSTROPHES = [
+    "dont", "cant", "wont", "isnt", "doesnt", "didnt", "wasnt", "werent", "shouldnt", "wouldnt",
+    "couldnt", "im", "ive", "theyre", "youre", "thats", "whats", "hes", "shes",
+]
+
+# Words that are correctly doubled ("had had", "that that", "what it is is").
+REPEATABLE_WORDS = ["had", "that", "is"]
+
+GRAMMAR_RULES: List[Tuple[str, re.Pattern]] = [
+    ("misspelling", re.compile(r"\b(" + "|".join(COMMON_MISSPELLINGS) + r")\b", re.IGNORECASE)),
+    ("missing_apostrophe", re.compile(r"\b(" + "|".join(MISSING_APOSTROPHES) + r")\b", re.IGNORECASE)),
+    ("lowercase_i", re.compile(r"(?<![\w'])i(?![\w'])")),
+    ("repeated_word", re.compile(r"\b(?!(?:" + "|".join(REPEATABLE_WORDS) + r")\b)(\w+)\s+\1\b", re.IGNORECASE)),
+    ("could_of", re.compile(r"\b(could|should|would|must) of\b", re.IGNORECASE)),
+    # Only a/e/i/o: "a university", "a one-off" and "a European" are correct, since the article follows the sound.
+    ("article_before_vowel", re.compile(r"\ba (?=[aeio]\w)(?!one\b|once\b|eu)", re.IGNORECASE)),
+    ("sentence_starts_lowercase", re.compile(r"(?:^|[.!?]\s+)(?P<issue>[a-z])", re.MULTILINE)),
+    ("missing_space_after_punctuation", re.compile(r"[a-z][,;:!?](?=[A-Za-z])|[a-z]\.(?=[A-Z][a-z])")),
+    ("space_before_punctuation", re.compile(r"\w +[,.;:!?]")),
+    ("repeated_punctuation", re.compile(r"[!?]{2,}|,{2,}")),
+    ("missing_end_punctuation", re.compile(r"[A-Za-z]\s*$", re.MULTILINE)),
+]
+
+# Sentences longer than this are flagged as likely run-ons.
+RUN_ON_WORDS = 45
+
+# A detected coverage within this distance of a score boundary is treated as ambiguous.
+AMBIGUITY_MARGIN = 0.1
+
+# With fewer issues than this the coverage ratio is too coarse to trust.
+MIN_ISSUES = 3
+
+
+def find_grammar_issues(essay: str) -> List[Dict[str, Any]]:
+    """
+    Locate mechanics issues in an essay. Each issue has 'rule', 'start', 'end' and the matched 'text'.
+    A span two rules both match (e.g. a sentence-initial "i") is reported once, by the first rule.
+    """
+    issues = []
+    seen = set()
+    for name, pattern in GRAMMAR_RULES:
+        group = "issue" if "issue" in pattern.groupindex else 0
+        for match in pattern.finditer(essay):
+            span = match.span(group)
+            if span in seen:
+                continue
+            seen.add(span)
+            issues.append({"rule": name, "start": span[0], "end": span[1], "text": match.group(group)})
+
+    for match in re.finditer(r"[^.!?\n]+[.!?]?", essay):
+        if len(match.group(0).split()) > RUN_ON_WORDS:
+            issues.append({"rule": "run_on_sentence", "start": match.start(), "end": match.end(),
+                           "text": match.group(0)[:40]})
+
+    return sorted(issues, key=lambda issue: issue["start"])
+
+
+def parse_comments(comments: Any) -> List[Dict[str, Any]] | None:
+    if isinstance(comments, list):
+        return comments
+    if isinstance(comments, str):
+        for parse in (json.loads, ast.literal_eval):
+            try:
+                parsed = parse(comments)
+            except (ValueError, SyntaxError):
+                continue
+            if isinstance(parsed, list):
+                return parsed
+    return None
+
+
+def comment_spans(essay: str, comments: Any) -> List[Tuple[int, int]]:
+    """
+    Character spans of the essay that Feedback Desk comments point at.
+    Uses each comment's 'original_text'; for plain feedback text it falls back to quoted fragments.
+    """
+    parsed = parse_comments(comments)
+    if parsed is not None:
+        fragments = [str(c.get("original_text", "")) for c in parsed if isinstance(c, dict)]
+    else:
+        fragments = re.findall(r"['\"“]([^'\"”]{4,})['\"”]", str(comments or ""))
+
+    spans = []
+    for fragment in fragments:
+        fragment = fragment.strip()
+        if not fragment:
+            continue
+        start = essay.find(fragment)
+        while start != -1:
+            spans.append((start, start + len(fragment)))
+            start = essay.find(fragment, start + 1)
+    return spans
+
+
+def coverage_to_score(coverage: float) -> int:
+    """
+    Map issue coverage onto the rubric: 4 = all, 3 = most, 2 = some, 1 = none.
+    """
+    if coverage >= 0.9:
+        return 4
+    if coverage >= 0.5:
+        return 3
+    if coverage > 0:
+        return 2
+    return 1
+
+
+def prescore_grammar(essay: str, comments: Any) -> Dict[str, Any]:
+    """
+    Deterministic grammar-coverage score for one essay/feedback pair.
+    'grammar_ambiguous' is True when the LLM should still judge the Grammar dimension.
+    """
+    essay = str(essay or "")
+    issues = find_grammar_issues(essay)
+    spans = comment_spans(essay, comments)
+
+    covered = sum(
+        any(start < span_end and span_start < end for span_start, span_end in spans)
+        for start, end in ((issue["start"], issue["end"]) for issue in issues)
+    )
+    coverage = covered / len(issues) if issues else 1.0
+    near_boundary = any(abs(coverage - edge) < AMBIGUITY_MARGIN for edge in (0.9, 0.5)) or 0 < coverage < AMBIGUITY_MARGIN
+
+    return {
+        "grammar_issue_count": len(issues),
+        "grammar_issues_covered": covered,
+        "grammar_coverage": coverage,
+        "Grammar_local": coverage_to_score(coverage),
+        "grammar_ambiguous": len(issues) < MIN_ISSUES or near_boundary,
+    }
+
+
+def rubric_without_grammar(rubric: str) -> str:
+    """
+    The evaluation rubric with the Grammar criterion and its output field removed, for calls where
+    the local pre-score already settles that dimension.
+    """
+    rubric = re.sub(r"3\.\s+Grammar.*?(?=4\.\s+Stucture)", "", rubric, flags=re.DOTALL)
+    return re.sub(r'\s*"Grammar": <score \(int\)>,', "", rubric)
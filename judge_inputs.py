@@ -0,0 +1,101 @@
+import json
+import os
+
+import pandas as pd
+
+SAMPLES_PKL_PATH = 'SAMPLES.pkl'
+FEEDBACK_PKL_PATH = 'feedback_results_df.pkl'
+
+
+def first_present(row, names, default=''):
+    """
+    Value of the first column in names that exists on the row (merges can leave _x/_y suffixes).
+    """
+    for name in names:
+        if name in row and not (isinstance(row[name], float) and pd.isna(row[name])):
+            return row[name]
+    return default
+
+
+def decode_nested(value):
+    """
+    A list/dict stored as JSON text (e.g. by the artifact store) back as the list/dict; anything else as is.
+    """
+    if isinstance(value, str) and value[:1] in ('[', '{'):
+        try:
+            decoded = json.loads(value)
+        except ValueError:
+            return value
+        return decoded if isinstance(decoded, (list, dict)) else value
+    return value
+
+
+def format_feedback(high_level, comments) -> str:
+    """
+    Feedback text exactly as the judges receive it.
+    """
+    return f"High Level Feedback:\n{high_level}\n\nSpecific Comments:\n{comments}"
+
+
+def add_judge_text(merged: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the 'essay_text' and 'feedback_text' columns every judge needs and drop empty essays.
+    """
+    merged['essay_text'] = [
+        first_present(row, ['essay', 'essay_text', 'essay_x', 'essay_y']) for _, row in merged.iterrows()
+    ]
+    merged['feedback_text'] = [
+        format_feedback(
+            first_present(row, ['high_level_feedback', 'high_level_feedback_x', 'high_level_feedback_y']),
+            first_present(row, ['comments', 'comments_x', 'comments_y']),
+        )
+        for _, row in merged.iterrows()
+    ]
+
+    merged = merged[merged['essay_text'].astype(str).str.len() >= 10].reset_index(drop=True)
+    print(f"✅ Data merged! Total unique essays to process: {len(merged)}")
+    return merged
+
+
+def load_feedback_comments(feedback_pkl_path: str = FEEDBACK_PKL_PATH) -> dict:
+    """
+    Raw Feedback Desk comment lists by essay_id. The judge databases only keep the formatted feedback text,
+    so the grammar pre-score reads the comments' original_text spans from here.
+    """
+    if not os.path.exists(feedback_pkl_path):
+        print(f"⚠️ {feedback_pkl_path} not found; the grammar pre-score falls back to quotes in the feedback text.")
+        return {}
+    results_df = pd.read_pickle(feedback_pkl_path)
+    return {str(essay_id): decode_nested(comments)
+            for essay_id, comments in zip(results_df['essay_id'], results_df['comments'])}
+
+
+def load_judge_pairs(samples_pkl_path: str = SAMPLES_PKL_PATH,
+                     feedback_pkl_path: str = FEEDBACK_PKL_PATH) -> pd.DataFrame:
+    """
+    Merge the generated essays with their Feedback Desk results on essay_id and add the two
+    columns every judge needs: 'essay_text' and 'feedback_text'. Essays that are empty are dropped.
+    """
+    samples_df = pd.read_pickle(samples_pkl_path)
+    results_df = pd.read_pickle(feedback_pkl_path)
+
+    samples_df['essay_id'] = samples_df['essay_id'].astype(str)
+    results_df['essay_id'] = results_df['essay_id'].astype(str)
+
+    merged = pd.merge(samples_df, results_df, on='essay_id', how='inner')
+    merged = merged.drop_duplicates(subset=['essay_id']).reset_index(drop=True)
+    return add_judge_text(merged)
+
+
+def load_judge_pairs_from_store(store, filters: list[tuple] | None = None) -> pd.DataFrame:
+    """
+    Same pairs as load_judge_pairs, read from an ArtifactStore with only the columns the judges use.
+    """
+    samples_df = store.read('samples', columns=['essay_id', 'subject', 'grade', 'knowledge level',
+                                                'grammar level', 'flow level', 'essay'], filters=filters)
+    results_df = store.read('feedback', columns=['essay_id', 'high_level_feedback', 'comments'], filters=filters)
+    # Older store versions return comment lists as JSON text; decode them so the prompt matches load_judge_pairs.
+    results_df['comments'] = results_df['comments'].map(decode_nested)
+    merged = pd.merge(samples_df, results_df, on='essay_id', how='inner')
+    merged = merged.drop_duplicates(subset=['essay_id']).reset_index(drop=True)
+    return add_judge_text(merged)
@@ -0,0 +1,92 @@
+import math
+import re
+from typing import Dict, List, Tuple
+
+from judge_scores import CANONICAL_BY_KEY, SCORE_KEYS, SCORE_RANGE
+
+# One generated token: (token text, logprob, [(alternative token, logprob), ...]).
+TokenLogprob = Tuple[str, float, List[Tuple[str, float]]]
+
+SCORE_VALUES = list(range(SCORE_RANGE[0], SCORE_RANGE[1] + 1))
+
+
+def tokens_from_openai(logprobs_content) -> List[TokenLogprob]:
+    """
+    Convert `response.choices[0].logprobs.content` into plain tuples so the maths below needs no SDK types.
+    """
+    tokens = []
+    for item in logprobs_content or []:
+        alternatives = [(alt.token, alt.logprob) for alt in (item.top_logprobs or [])]
+        tokens.append((item.token, item.logprob, alternatives))
+    return tokens
+
+
+def _score_token_index(tokens: List[TokenLogprob], key: str) -> int | None:
+    """
+    Index of the token holding the score digit for key, found by matching on the rebuilt reply text.
+    """
+    text = ""
+    starts = []
+    for token, _, _ in tokens:
+        starts.append(len(text))
+        text += token
+
+    match = re.search(r'"' + re.escape(key) + r'"\s*:\s*"?\s*(\d)', text)
+    if not match:
+        return None
+    position = match.start(1)
+    for i in range(len(tokens) - 1, -1, -1):
+        if starts[i] <= position:
+            return i
+    return None
+
+
+def score_distribution(tokens: List[TokenLogprob], key: str) -> Dict[int, float] | None:
+    """
+    Probability of each score 1-5 for one rubric key, renormalised over the score tokens in top_logprobs.
+    """
+    index = _score_token_index(tokens, key)
+    if index is None:
+        return None
+
+    token, logprob, alternatives = tokens[index]
+    mass = {score: 0.0 for score in SCORE_VALUES}
+    seen = set()
+    for alt_token, alt_logprob in alternatives + [(token, logprob)]:
+        # The sampled token is normally repeated among the alternatives; count each token once.
+        # A digit may arrive fused with JSON punctuation, e.g. ' 4', '4,' or '"4"}'.
+        digit = re.fullmatch(r'\W*(\d)\W*', alt_token)
+        if alt_token in seen or not digit or int(digit.group(1)) not in mass:
+            continue
+        seen.add(alt_token)
+        mass[int(digit.group(1))] += math.exp(alt_logprob)
+
+    total = sum(mass.values())
+    if total == 0:
+        return None
+    return {score: p / total for score, p in mass.items()}
+
+
+def expected_score(distribution: Dict[int, float]) -> float:
+    return sum(score * p for score, p in distribution.items())
+
+
+def score_entropy(distribution: Dict[int, float]) -> float:
+    """
+    Shannon entropy in bits; 0 means the judge was certain, log2(5) ≈ 2.32 means uniform over 1-5.
+    """
+    return 0.0 - sum(p * math.log2(p) for p in distribution.values() if p > 0)
+
+
+def soft_scores(tokens: List[TokenLogprob]) -> Dict[str, float | None]:
+    """
+    Expected value and entropy for every rubric key, as '<dimension>_expected' and '<dimension>_entropy'
+    under the canonical dimension name.
+    """
+    result: Dict[str, float | None] = {}
+    for key in SCORE_KEYS:
+        dimension = CANONICAL_BY_KEY[key]
+        distribution = score_distribution(tokens, key)
+        result[f"{dimension}_expected"] = expected_score(distribution) if distribution else None
+        result[f"{dimension}_entropy"] = score_entropy(distribution) if distribution else None
+    return result
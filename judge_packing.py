@@ -0,0 +1,157 @@
+import json
+import random
+from typing import Any, Callable, Dict, Iterable, List
+
+import pandas as pd
+
+from judge_scores import CANONICAL_BY_KEY, DIMENSIONS, rubric_dimensions, validate_scores
+
+# Canonical dimension -> the key the rubric asks the judge to return.
+KEY_BY_DIMENSION = {dim: key for key, dim in CANONICAL_BY_KEY.items()}
+
+# The rubric's [Output Format] describes a single object; packed calls cut it off and ask for this instead.
+PACKED_OUTPUT_FORMAT = """
+[Packed Output Format]
+You will receive several essays, each with its own feedback and an id.
+Evaluate every pair independently, exactly as if it were the only one.
+Return one JSON object with a single key "evaluations" whose value is an array with one entry per id:
+{{
+  "evaluations": [
+    {{"id": "<id>", {entry}}},
+    ...
+  ]
+}}
+"""
+
+
+def build_packed_prompt(pairs: List[Dict[str, str]], rubric: str) -> str:
+    """
+    Build one user prompt holding K essay/feedback pairs, so the rubric is sent once instead of K times.
+    Each pair is a dict with 'id', 'essay' and 'feedback'. Each entry asks for the scores the rubric's
+    own output format asks for.
+    """
+    blocks = []
+    for pair in pairs:
+        blocks.append(
+            f"[Pair id: {pair['id']}]\n"
+            f"[Original student essay]\n{pair['essay']}\n\n"
+            f"[Feedback Desk's feedback]\n{pair['feedback']}\n"
+            f"[End of pair {pair['id']}]"
+        )
+    pairs_text = "\n\n".join(blocks)
+    entry = ", ".join(f'"{KEY_BY_DIMENSION[dim]}": <score (int)>' for dim in rubric_dimensions(rubric))
+    criteria = rubric.split("[Output Format]")[0].rstrip()
+    return f"""
+    {pairs_text}
+
+    [Evaluation Criteria]
+    {criteria}
+
+    {PACKED_OUTPUT_FORMAT.format(entry=entry)}
+    """
+
+
+def parse_packed_response(text: str | None, expected_ids: List[str],
+                          required: Iterable[str] = DIMENSIONS) -> Dict[str, Dict[str, int]]:
+    """
+    Parse a packed reply into {id: scores}, keeping only ids that were asked for and whose required scores validate.
+    An id that appears more than once is dropped, since we cannot tell which entry is right.
+    """
+    if not text:
+        return {}
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+
+    entries = data.get("evaluations") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return {}
+
+    expected = {str(i) for i in expected_ids}
+    parsed: Dict[str, Dict[str, int]] = {}
+    duplicates = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        entry_id = str(entry.get("id", ""))
+        if entry_id not in expected:
+            continue
+        if entry_id in parsed:
+            duplicates.add(entry_id)
+        scores = validate_scores(entry, required)
+        if scores is not None:
+            parsed[entry_id] = scores
+
+    for entry_id in duplicates:
+        parsed.pop(entry_id, None)
+    return parsed
+
+
+def evaluate_packed(pairs: List[Dict[str, str]],
+                    call_packed: Callable[[List[Dict[str, str]]], str | None],
+                    call_single: Callable[[str, str], Dict[str, Any] | None] | None,
+                    pack_size: int,
+                    required: Iterable[str] = DIMENSIONS) -> Dict[str, Dict[str, Any] | None]:
+    """
+    Judge pairs pack_size at a time with call_packed, then fall back to call_single for every id
+    missing or invalid in the packed reply. Returns {id: evaluation or None}.
+    With call_single=None the missing ids are left out, so the caller can run its own fallback.
+    required is rubric_dimensions() of the rubric the packed calls send.
+    """
+    results: Dict[str, Dict[str, Any] | None] = {}
+    for start in range(0, len(pairs), pack_size):
+        chunk = pairs[start:start + pack_size]
+        ids = [str(p['id']) for p in chunk]
+        parsed = parse_packed_response(call_packed(chunk), ids, required) if len(chunk) > 1 else {}
+
+        missing = [p for p in chunk if str(p['id']) not in parsed]
+        if len(chunk) > 1:
+            print(f"📦 Packed {len(chunk)} pairs: {len(parsed)} valid, {len(missing)} falling back to single calls")
+
+        results.update(parsed)
+        if call_single is None:
+            continue
+        for pair in missing:
+            results[str(pair['id'])] = call_single(pair['essay'], pair['feedback'])
+    return results
+
+
+def calibration_report(pairs: List[Dict[str, str]],
+                       call_packed: Callable[[List[Dict[str, str]]], str | None],
+                       call_single: Callable[[str, str], Dict[str, Any] | None],
+                       pack_sizes: List[int] = [2, 4, 8],
+                       sample_size: int = 40,
+                       seed: int = 0) -> pd.DataFrame:
+    """
+    Compare packed scores against single-pair scores on a random sample, one row per pack size and dimension.
+    Reports exact agreement, mean absolute difference and how often packed ids had to fall back.
+    """
+    rng = random.Random(seed)
+    sample = rng.sample(pairs, min(sample_size, len(pairs)))
+
+    single = {}
+    for pair in sample:
+        single[str(pair['id'])] = validate_scores(call_single(pair['essay'], pair['feedback']))
+
+    rows = []
+    for k in pack_sizes:
+        packed = {}
+        for start in range(0, len(sample), k):
+            chunk = sample[start:start + k]
+            packed.update(parse_packed_response(call_packed(chunk), [str(p['id']) for p in chunk]))
+
+        compared = [i for i, s in single.items() if s is not None and i in packed]
+        fallback_rate = 1 - len(packed) / len(sample) if sample else 0.0
+        for key in DIMENSIONS:
+            diffs = [abs(packed[i][key] - single[i][key]) for i in compared]
+            rows.append({
+                "pack_size": k,
+                "dimension": key,
+                "pairs_compared": len(compared),
+                "exact_agreement": sum(d == 0 for d in diffs) / len(diffs) if diffs else None,
+                "mean_abs_diff": sum(diffs) / len(diffs) if diffs else None,
+                "fallback_rate": fallback_rate,
+            })
+
+    return pd.DataFrame(rows)
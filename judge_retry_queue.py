@@ -0,0 +1,199 @@
+import json
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+from tracing import span
+
+# --- Failure Categories ---
+
+RATE_LIMIT = "rate_limit"
+MALFORMED_JSON = "malformed_json"
+SAFETY_BLOCK = "safety_block"
+API_ERROR = "api_error"
+
+# A safety block rarely clears on a plain retry, so it gets far fewer attempts.
+MAX_ATTEMPTS_BY_CATEGORY = {
+    RATE_LIMIT: 8,
+    MALFORMED_JSON: 4,
+    SAFETY_BLOCK: 2,
+    API_ERROR: 5,
+}
+
+RETRY_QUEUE_DB_PATH = 'judge_retry_queue.db'
+
+
+def classify_failure(error: Exception | None) -> str:
+    """
+    Map an exception raised while judging into one of the retry categories.
+    Works on class names and messages so neither the OpenAI nor the Gemini SDK has to be imported.
+    """
+    if error is None:
+        return API_ERROR
+    if isinstance(error, json.JSONDecodeError):
+        return MALFORMED_JSON
+
+    name = type(error).__name__
+    message = str(error).lower()
+
+    if name in ("RateLimitError", "ResourceExhausted", "TooManyRequests") or "429" in message or "rate limit" in message:
+        return RATE_LIMIT
+    if name in ("BlockedPromptException", "StopCandidateException") or "safety" in message or "blocked" in message or "content_filter" in message:
+        return SAFETY_BLOCK
+    return API_ERROR
+
+
+def backoff_delay(attempts: int, base_delay: float = 2.0, max_delay: float = 300.0) -> float:
+    """
+    Exponential backoff in seconds for the next attempt, capped at max_delay.
+    """
+    return min(max_delay, base_delay * (2 ** max(0, attempts - 1)))
+
+
+class RetryQueue:
+    """
+    Persistent SQLite queue of essay/feedback pairs whose judge evaluation failed.
+    Each judge keeps its own rows (keyed by judge name and sample id), so the GPT and Gemini runs can share one file.
+    """
+
+    def __init__(self, db_path: str = RETRY_QUEUE_DB_PATH, judge: str = "gpt",
+                 base_delay: float = 2.0, max_delay: float = 300.0):
+        self.db_path = db_path
+        self.judge = judge
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS retry_queue (
+                    judge TEXT NOT NULL,
+                    sample_id TEXT NOT NULL,
+                    essay TEXT,
+                    feedback TEXT,
+                    category TEXT,
+                    last_error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    PRIMARY KEY (judge, sample_id)
+                )
+            """)
+
+    def push(self, sample_id: str, essay: str, feedback: str, category: str, error: str = "") -> None:
+        """
+        Add a failed pair to the queue, or record another failure for a pair that is already queued.
+        A pair that succeeded since its last failure starts counting attempts again.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT attempts, status FROM retry_queue WHERE judge = ? AND sample_id = ?",
+                (self.judge, str(sample_id)),
+            ).fetchone()
+            attempts = (row[0] if row and row[1] != "done" else 0) + 1
+            status = "exhausted" if attempts >= MAX_ATTEMPTS_BY_CATEGORY.get(category, 5) else "pending"
+            next_attempt_at = time.time() + backoff_delay(attempts, self.base_delay, self.max_delay)
+            conn.execute("""
+                INSERT INTO retry_queue (judge, sample_id, essay, feedback, category, last_error, attempts, next_attempt_at, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (judge, sample_id) DO UPDATE SET
+                    category = excluded.category,
+                    last_error = excluded.last_error,
+                    attempts = excluded.attempts,
+                    next_attempt_at = excluded.next_attempt_at,
+                    status = excluded.status
+            """, (self.judge, str(sample_id), essay, feedback, category, error, attempts, next_attempt_at, status))
+
+        if status == "exhausted":
+            print(f"⛔ Giving up on {sample_id} after {attempts} attempts ({category}).")
+
+    def mark_succeeded(self, sample_id: str) -> None:
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE retry_queue SET status = 'done', attempts = 0 WHERE judge = ? AND sample_id = ?",
+                (self.judge, str(sample_id)),
+            )
+
+    def due(self, now: float | None = None) -> List[Dict[str, Any]]:
+        """
+        Return the pending pairs whose backoff has elapsed, oldest deadline first.
+        """
+        now = time.time() if now is None else now
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("""
+                SELECT * FROM retry_queue
+                WHERE judge = ? AND status = 'pending' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+            """, (self.judge, now)).fetchall()
+        return [dict(r) for r in rows]
+
+    def next_deadline(self) -> float | None:
+        """
+        Earliest next_attempt_at among pending pairs, or None when nothing is pending.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM retry_queue WHERE judge = ? AND status = 'pending'",
+                (self.judge,),
+            ).fetchone()
+        return row[0]
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Count queued pairs per failure category and status.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            return pd.read_sql_query("""
+                SELECT category, status, COUNT(*) AS pairs, SUM(attempts) AS attempts
+                FROM retry_queue WHERE judge = ?
+                GROUP BY category, status ORDER BY category, status
+            """, conn, params=(self.judge,))
+
+
+def drain_retries(queue: RetryQueue,
+                  evaluate: Callable[[str, str, Dict[str, Any]], Dict[str, Any] | None],
+                  results_df: pd.DataFrame,
+                  id_column: str = 'sample_id') -> pd.DataFrame:
+    """
+    Re-run only the queued pairs and patch their rows in results_df in place of the empty rows.
+    evaluate(essay, feedback, failure) returns the evaluation dict, or None after filling failure
+    with a 'category' and 'error'. Sleeps through backoff until every pair is done or exhausted.
+    """
+    results_df = results_df.copy()
+    if id_column in results_df.columns:
+        results_df[id_column] = results_df[id_column].astype(str)
+        results_df = results_df.set_index(id_column, drop=False)
+
+    while True:
+        items = queue.due()
+        if not items:
+            deadline = queue.next_deadline()
+            if deadline is None:
+                break
+            wait = max(0.0, deadline - time.time())
+            print(f"⏳ Waiting {wait:.1f}s for the next retry window...")
+            time.sleep(wait)
+            continue
+
+        for item in items:
+            sample_id = item['sample_id']
+            print(f"\n🔁 Retry {item['attempts'] + 1} for {sample_id} (last failure: {item['category']})")
+            failure: Dict[str, Any] = {}
+            queue_wait_ms = max(0.0, time.time() - item['next_attempt_at']) * 1000
+            with span('retry', kind='retry', retries=item['attempts'], queue_wait_ms=queue_wait_ms,
+                      category=item['category']):
+                evaluation = evaluate(item['essay'], item['feedback'], failure)
+
+            if evaluation:
+                queue.mark_succeeded(sample_id)
+                for key, value in evaluation.items():
+                    results_df.loc[sample_id, key] = value
+                results_df.loc[sample_id, id_column] = sample_id
+                print(f"✅ Patched row for {sample_id}")
+            else:
+                queue.push(sample_id, item['essay'], item['feedback'],
+                           failure.get('category', API_ERROR), failure.get('error', ''))
+
+    print(queue.summary())
+    return results_df.reset_index(drop=True)
@@ -0,0 +1,291 @@
+import json
+import sqlite3
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+from api_pool import BULK, priority
+from judge_retry_queue import MALFORMED_JSON
+from judge_scores import DIMENSIONS, ingest_judgments, validate_scores
+
+# Kept in the judges' output database, next to the evaluations it explains.
+ROUTER_DB_PATH = 'judges_data.sql'
+
+# Cheapest tier first. cost is the relative price of one call (roughly the list price per token relative to
+# gpt-4o-mini) and is only used to estimate savings.
+DEFAULT_TIERS = {
+    'gpt': [{'model': 'gpt-4o-mini', 'cost': 1.0}, {'model': 'gpt-4o', 'cost': 16.0}],
+    'gemini': [{'model': 'gemini-2.5-flash-latest', 'cost': 2.0}, {'model': 'gemini-2.5-pro', 'cost': 8.0}],
+}
+
+# Escalate when the least certain dimension's score entropy is above this many bits (GPT logprobs only).
+ENTROPY_THRESHOLD = 1.0
+# Escalate both judges when they are this far apart on any dimension.
+CONFLICT_GAP = 2
+
+# (model, essay, feedback, failure) -> evaluation or None, filling failure like the judge scripts do.
+Evaluate = Callable[[str, str, str, Dict[str, Any]], Dict[str, Any] | None]
+
+
+def gpt_evaluate(model: str, essay: str, feedback: str, failure: Dict[str, Any]) -> Dict[str, Any] | None:
+    import feedback_desk_gpt_judge as judge
+
+    return judge.get_llm_evaluation(essay, feedback, judge.get_client(), failure, model_name=model, logprobs=True)
+
+
+def gemini_evaluate(model: str, essay: str, feedback: str, failure: Dict[str, Any]) -> Dict[str, Any] | None:
+    import feedback_desk_gemini_judge as judge
+
+    return judge.get_llm_evaluation(essay, feedback, judge.get_gemini_model(model), failure)
+
+
+EVALUATORS = {'gpt': gpt_evaluate, 'gemini': gemini_evaluate}
+
+
+def max_entropy(evaluation: Dict[str, Any] | None) -> float | None:
+    """
+    Entropy (bits) of the least certain dimension, or None when the reply carries no soft scores.
+    """
+    entropies = [value for key, value in (evaluation or {}).items()
+                 if key.endswith('_entropy') and value is not None]
+    return max(entropies) if entropies else None
+
+
+def conflicting_dimensions(first: Dict[str, Any] | None, second: Dict[str, Any] | None,
+                           gap: int = CONFLICT_GAP) -> List[str]:
+    first_scores, second_scores = validate_scores(first), validate_scores(second)
+    if first_scores is None or second_scores is None:
+        return []
+    return [dim for dim in DIMENSIONS if abs(first_scores[dim] - second_scores[dim]) >= gap]
+
+
+class JudgeRouter:
+    """
+    Judges every pair with the cheapest tier of each judge first. A judge moves up a tier when its reply
+    fails validation or is low-confidence. Both judges move up when they conflict with each other.
+    Every call is logged to SQLite (routing_log) with the router's run_id, its tier, the reason for the call
+    and its scores, so routing_summary() can report per run the calls per tier, the savings, and how much
+    escalation changed the scores.
+    """
+
+    def __init__(self, tiers: Dict[str, List[Dict[str, Any]]] = DEFAULT_TIERS,
+                 evaluators: Dict[str, Evaluate] | None = None,
+                 entropy_threshold: float = ENTROPY_THRESHOLD,
+                 conflict_gap: int = CONFLICT_GAP,
+                 db_path: str = ROUTER_DB_PATH,
+                 run_id: str | None = None):
+        self.tiers = tiers
+        self.evaluators = evaluators or EVALUATORS
+        self.entropy_threshold = entropy_threshold
+        self.conflict_gap = conflict_gap
+        self.db_path = db_path
+        self.run_id = run_id or f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS routing_log (
+                    essay_id TEXT NOT NULL,
+                    judge TEXT NOT NULL,
+                    tier INTEGER NOT NULL,
+                    model TEXT NOT NULL,
+                    cost REAL NOT NULL,
+                    reason TEXT NOT NULL,
+                    outcome TEXT NOT NULL,
+                    max_entropy REAL,
+                    scores TEXT,
+                    logged_at TEXT NOT NULL
+                )
+            """)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(routing_log)")]
+            if 'run_id' not in columns:
+                # Logs written before runs were tracked keep a NULL run_id.
+                conn.execute("ALTER TABLE routing_log ADD COLUMN run_id TEXT")
+
+    def _call(self, essay_id: str, judge: str, tier: int, essay: str, feedback: str,
+              reason: str) -> tuple[Dict[str, Any] | None, Dict[str, Any]]:
+        config = self.tiers[judge][tier]
+        failure = {}
+        evaluation = self.evaluators[judge](config['model'], essay, feedback, failure)
+        scores = validate_scores(evaluation)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT INTO routing_log (essay_id, judge, tier, model, cost, reason, outcome, max_entropy, scores,
+                                         logged_at, run_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (essay_id, judge, tier, config['model'], config.get('cost', 1.0), reason,
+                  'ok' if evaluation else failure.get('category', 'failed'), max_entropy(evaluation),
+                  json.dumps(scores) if scores else None, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                  self.run_id))
+        return evaluation, failure
+
+    def _escalation_reason(self, evaluation: Dict[str, Any] | None, failure: Dict[str, Any]) -> str | None:
+        if evaluation is None:
+            # Rate limits and API errors go to the retry queue as usual; a bigger model does not fix them.
+            return 'invalid' if failure.get('category') == MALFORMED_JSON else None
+        entropy = max_entropy(evaluation)
+        if entropy is not None and entropy > self.entropy_threshold:
+            return 'low_confidence'
+        return None
+
+    def _climb(self, essay_id: str, judge: str, tier: int, essay: str, feedback: str, reason: str,
+               fallback: Dict[str, Any] | None = None,
+               fallback_tier: int | None = None) -> tuple[Dict[str, Any] | None, int | None, int, Dict[str, Any]]:
+        """
+        Call the judge at tier, and keep moving up while the reply asks for escalation. If a higher tier
+        fails outright, the last valid reply is kept. Returns (reply, tier that gave it or None, highest tier
+        called, failure).
+        """
+        while True:
+            evaluation, failure = self._call(essay_id, judge, tier, essay, feedback, reason)
+            if evaluation is not None:
+                evaluation['model'] = self.tiers[judge][tier]['model']
+                fallback, fallback_tier = evaluation, tier
+            reason = self._escalation_reason(evaluation, failure)
+            if reason is None or tier + 1 >= len(self.tiers[judge]):
+                return fallback, fallback_tier, tier, failure
+            tier += 1
+
+    def judge(self, essay_id: str, essay: str, feedback: str) -> Dict[str, Dict[str, Any] | None]:
+        """
+        Routed evaluation of one pair: judge name -> evaluation (with the answering 'model'), or None.
+        """
+        essay_id = str(essay_id)
+        # tiers: the tier that gave each reply; called: the highest tier tried, which bounds escalation.
+        results, tiers, called = {}, {}, {}
+        for judge in self.tiers:
+            results[judge], tiers[judge], called[judge], _ = self._climb(essay_id, judge, 0, essay, feedback,
+                                                                         'first')
+
+        while len(results) == 2:
+            first, second = results.values()
+            if not conflicting_dimensions(first, second, self.conflict_gap):
+                break
+            movable = [judge for judge in results
+                       if results[judge] is not None and called[judge] + 1 < len(self.tiers[judge])]
+            if not movable:
+                break
+            for judge in movable:
+                results[judge], tiers[judge], called[judge], _ = self._climb(
+                    essay_id, judge, called[judge] + 1, essay, feedback, 'conflict',
+                    fallback=results[judge], fallback_tier=tiers[judge])
+        return results
+
+    def judge_frame(self, pairs_df: pd.DataFrame, id_column: str = 'essay_id') -> Dict[str, pd.DataFrame]:
+        """
+        Route every pair of a judge-input table; returns one typed results table per judge.
+        """
+        rows = {judge: [] for judge in self.tiers}
+        with priority(BULK, job='judge_router'):
+            for _, row in pairs_df.iterrows():
+                results = self.judge(row[id_column], row['essay_text'], row['feedback_text'])
+                for judge, evaluation in results.items():
+                    rows[judge].append({id_column: row[id_column], **(evaluation or {})})
+        return {judge: ingest_judgments(pd.DataFrame(judge_rows), id_column=id_column)
+                for judge, judge_rows in rows.items()}
+
+    def log(self) -> pd.DataFrame:
+        with sqlite3.connect(self.db_path) as conn:
+            return pd.read_sql_query("SELECT rowid AS call_id, * FROM routing_log ORDER BY rowid", conn)
+
+
+def routing_summary(log: pd.DataFrame, tiers: Dict[str, List[Dict[str, Any]]] = DEFAULT_TIERS,
+                    run_id: str | None = None) -> Dict[str, pd.DataFrame]:
+    """
+    Summary of one router run (the latest unless run_id is given; calls logged before runs were tracked
+    are run 'legacy'):
+    'tiers': calls per judge and tier, split by why the call was made, with their relative cost.
+    'savings': routed cost against sending every pair to the strongest tier.
+    'deltas': per judge, tier step and dimension, how often and by how much an escalated reply changed the scores.
+    """
+    log = log.assign(run_id=log['run_id'].fillna('legacy'))
+    if run_id is None and len(log):
+        run_id = log.loc[log['call_id'].idxmax(), 'run_id']
+    log = log[log['run_id'] == run_id]
+
+    calls = log.pivot_table(index=['judge', 'tier', 'model'], columns='reason', values='call_id',
+                            aggfunc='count', fill_value=0)
+    calls['calls'] = calls.sum(axis=1)
+    calls['failed'] = log[log['outcome'] != 'ok'].groupby(['judge', 'tier', 'model']).size()
+    calls['cost'] = log.groupby(['judge', 'tier', 'model'])['cost'].sum()
+    calls['failed'] = calls['failed'].fillna(0).astype(int)
+    calls = calls.reset_index()
+
+    savings = []
+    for judge, group in log.groupby('judge'):
+        strongest = tiers.get(judge, [{}])[-1].get('cost', group['cost'].max())
+        baseline = group['essay_id'].nunique() * strongest
+        savings.append({'judge': judge, 'essays': group['essay_id'].nunique(), 'calls': len(group),
+                        'routed_cost': group['cost'].sum(), 'strongest_only_cost': baseline,
+                        'saving': 1 - group['cost'].sum() / baseline if baseline else None})
+
+    deltas = []
+    valid = log[log['scores'].notna()]
+    for (essay_id, judge), group in valid.groupby(['essay_id', 'judge'], sort=False):
+        replies = group.sort_values('call_id').to_dict('records')
+        for before, after in zip(replies, replies[1:]):
+            if after['reason'] == 'first':
+                continue
+            old, new = json.loads(before['scores']), json.loads(after['scores'])
+            for dim in DIMENSIONS:
+                deltas.append({'judge': judge, 'from_model': before['model'], 'to_model': after['model'],
+                               'reason': after['reason'], 'dimension': dim, 'delta': new[dim] - old[dim]})
+    deltas = pd.DataFrame(deltas, columns=['judge', 'from_model', 'to_model', 'reason', 'dimension', 'delta'])
+    deltas = deltas.groupby(['judge', 'from_model', 'to_model', 'dimension']).agg(
+        pairs=('delta', 'size'), mean_delta=('delta', 'mean'), mean_abs_delta=('delta', lambda d: d.abs().mean()),
+        changed=('delta', lambda d: (d != 0).mean())).reset_index()
+
+    return {'tiers': calls, 'savings': pd.DataFrame(savings), 'deltas': deltas}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from judge_inputs import load_judge_pairs
+
+    parser = argparse.ArgumentParser(description="Judge with the cheapest model first and escalate when needed.")
+    parser.add_argument("command", choices=['run', 'summary'])
+    parser.add_argument("--samples", default='SAMPLES.pkl')
+    parser.add_argument("--feedback", default='feedback_results_df.pkl')
+    parser.add_argument("--tiers", default=None, help="JSON file: judge -> list of {model, cost}, cheapest first.")
+    parser.add_argument("--entropy-threshold", type=float, default=ENTROPY_THRESHOLD)
+    parser.add_argument("--conflict-gap", type=int, default=CONFLICT_GAP)
+    parser.add_argument("--db", default=ROUTER_DB_PATH)
+    parser.add_argument("--run-id", default=None, help="summary: the run to report (default: the latest).")
+    parser.add_argument("--output-prefix", default='routed_',
+                        help="Results go to <prefix>GPT_judges_evaluation_results.pkl etc. "
+                             "(with --store, to the <prefix>gpt_judgments stage etc.).")
+    parser.add_argument("--store", default=None,
+                        help="Read the inputs from this artifact store and write the output to it instead of pickles.")
+    args = parser.parse_args()
+
+    tiers = DEFAULT_TIERS
+    if args.tiers:
+        with open(args.tiers, encoding='utf-8') as f:
+            tiers = json.load(f)
+    router = JudgeRouter(tiers, entropy_threshold=args.entropy_threshold, conflict_gap=args.conflict_gap,
+                         db_path=args.db)
+
+    if args.command == 'run':
+        if args.store:
+            from artifact_store import ArtifactStore
+            from judge_inputs import load_judge_pairs_from_store
+            store = ArtifactStore(args.store)
+            pairs_df = load_judge_pairs_from_store(store)
+        else:
+            pairs_df = load_judge_pairs(args.samples, args.feedback)
+        results = router.judge_frame(pairs_df)
+        for judge, results_df in results.items():
+            if args.store:
+                store.write(f"{args.output_prefix}{judge}_judgments", results_df, note=f"run {router.run_id}")
+                continue
+            path = f"{args.output_prefix}{'GPT' if judge == 'gpt' else judge.capitalize()}_judges_evaluation_results.pkl"
+            results_df.to_pickle(path)
+            print(f"💾 Saved {len(results_df)} {judge} evaluations to {path}")
+
+    run_id = router.run_id if args.command == 'run' else args.run_id
+    summary = routing_summary(router.log(), tiers, run_id)
+    print(f"🧾 Run {run_id or 'latest'}")
+    for name, table in summary.items():
+        print(f"\n📊 {name}")
+        print(table.to_string(index=False))
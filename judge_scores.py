@@ -0,0 +1,132 @@
+import numbers
+import re
+from typing import Any, Dict, Iterable
+
+import pandas as pd
+
+# Keys exactly as the judges return them (the rubric spells "Stucture" this way).
+SCORE_KEYS = ["Tone", "Level of detail", "Grammar", "Stucture", "Content"]
+
+# Canonical dimension names used everywhere after parsing.
+DIMENSIONS = ["Tone", "Level of detail", "Grammar", "Structure", "Content"]
+
+CANONICAL_BY_KEY = dict(zip(SCORE_KEYS, DIMENSIONS))
+
+# Normalised spellings seen in judge replies and older result tables -> canonical name.
+KEY_ALIASES = {
+    "tone": "Tone", "tone_score": "Tone",
+    "level of detail": "Level of detail", "level_of_detail": "Level of detail", "detail": "Level of detail",
+    "detail_score": "Level of detail",
+    "grammar": "Grammar", "grammar_score": "Grammar",
+    "structure": "Structure", "stucture": "Structure", "structure_score": "Structure", "stucture_score": "Structure",
+    "content": "Content", "content_score": "Content",
+}
+
+SCORE_RANGE = (1, 5)
+
+SCORE_DTYPE = "Int8"
+
+CATEGORICAL_COLUMNS = ["subject", "grade", "knowledge level", "grammar level", "flow level"]
+
+
+def canonical_key(key: str) -> str | None:
+    return KEY_ALIASES.get(re.sub(r"\s+", " ", str(key)).strip().lower())
+
+
+def coerce_score(value: Any) -> int | None:
+    """
+    Turn a judge score into an int in SCORE_RANGE, or None if it is not a valid score.
+    Accepts the quoted form ("3") that the rubric template asks for on Content.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, numbers.Real):
+        if not float(value).is_integer():
+            return None
+        score = int(value)
+    elif isinstance(value, str) and value.strip().isdigit():
+        score = int(value.strip())
+    else:
+        return None
+    low, high = SCORE_RANGE
+    return score if low <= score <= high else None
+
+
+def rubric_dimensions(rubric: str) -> list[str]:
+    """
+    Canonical dimensions a rubric's output format asks for (a trimmed rubric may leave some out).
+    """
+    return [CANONICAL_BY_KEY[key] for key in SCORE_KEYS if f'"{key}":' in rubric]
+
+
+def validate_scores(evaluation: Dict[str, Any] | None,
+                    required: Iterable[str] = DIMENSIONS) -> Dict[str, int] | None:
+    """
+    Map a judge reply onto canonical dimension names and return the required scores as ints,
+    or None if any of them is missing or out of range.
+    """
+    if not isinstance(evaluation, dict):
+        return None
+    found = {}
+    for key, value in evaluation.items():
+        dimension = canonical_key(key)
+        if dimension is not None and dimension not in found:
+            found[dimension] = coerce_score(value)
+
+    scores = {}
+    for dimension in required:
+        if found.get(dimension) is None:
+            return None
+        scores[dimension] = found[dimension]
+    return scores
+
+
+def parse_judgment(evaluation: Dict[str, Any] | None,
+                   required: Iterable[str] = DIMENSIONS) -> Dict[str, Any] | None:
+    """
+    Schema check applied as soon as a judge reply is decoded: canonical int scores for the required
+    dimensions, plus the free-text 'justification' if the judge gave one. None if the reply does not fit.
+    """
+    scores = validate_scores(evaluation, required)
+    if scores is None:
+        return None
+    if evaluation.get("justification"):
+        scores["justification"] = str(evaluation["justification"])
+    return scores
+
+
+def ingest_judgments(df: pd.DataFrame, id_column: str = "essay_id") -> pd.DataFrame:
+    """
+    Typed judge results: string ids, one nullable int8 column per canonical dimension (invalid scores
+    become <NA>), and any extra columns (justification, pre-scores, soft scores) kept as they are.
+    """
+    typed = pd.DataFrame({id_column: df[id_column].astype(str)}) if id_column in df else pd.DataFrame(index=df.index)
+    seen = set()
+    for col in df.columns:
+        dimension = canonical_key(col)
+        if dimension is None or dimension in seen:
+            continue
+        seen.add(dimension)
+        typed[dimension] = pd.array([coerce_score(v) for v in df[col]], dtype=SCORE_DTYPE)
+    for dimension in DIMENSIONS:
+        if dimension not in typed:
+            typed[dimension] = pd.array([None] * len(df), dtype=SCORE_DTYPE)
+
+    extras = [col for col in df.columns if col != id_column and canonical_key(col) is None]
+    typed = pd.concat([typed, df[extras].reset_index(drop=True).set_axis(typed.index)], axis=1)
+    return typed[[c for c in [id_column] + DIMENSIONS if c in typed] + extras]
+
+
+def ingest_samples(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Typed samples: string ids, lower-cased subject/grade, categorical subject/grade/level columns.
+    """
+    typed = df.copy()
+    typed["essay_id"] = typed["essay_id"].astype(str)
+    for col in ("subject", "grade"):
+        if col in typed:
+            typed[col] = typed[col].astype(str).str.lower()
+    for col in CATEGORICAL_COLUMNS:
+        if col in typed:
+            typed[col] = typed[col].astype("category")
+    return typed
@@ -0,0 +1,249 @@
+import hashlib
+import itertools
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from agreement import SCORES, agreement_metrics
+from api_pool import bulk_map
+from grammar_prescore import rubric_without_grammar
+from judge_scores import DIMENSIONS, rubric_dimensions, validate_scores
+
+# Every finished (config, essay) evaluation, so a sweep that is rerun or extended only calls what is new.
+SWEEP_DB_PATH = 'judge_sweep.sql'
+
+DEFAULT_MODELS = ['gpt-4o-mini', 'gemini-2.5-flash-latest']
+DEFAULT_TEMPERATURES = [0.2]
+
+# Rubric variant -> how it is made from the judge's own EVALUATION_RUBRIC.
+RUBRIC_VARIANTS: Dict[str, Callable[[str], str]] = {
+    'default': lambda rubric: rubric,
+    'no_grammar': rubric_without_grammar,
+}
+
+AGREEMENT_METRICS = ['exact_agreement', 'weighted_kappa', 'krippendorff_alpha']
+
+
+def judge_of(model: str) -> str:
+    return 'gemini' if model.startswith('gemini') else 'gpt'
+
+
+def build_grid(models: List[str] = DEFAULT_MODELS, temperatures: List[float] = DEFAULT_TEMPERATURES,
+               rubrics: Dict[str, Callable[[str], str]] = RUBRIC_VARIANTS) -> List[Dict[str, Any]]:
+    """
+    One config per model x temperature x rubric variant. Each carries the exact rubric text it sends, and
+    'key' hashes everything that changes the reply, so editing a rubric invalidates only its cached results.
+    """
+    import feedback_desk_gemini_judge as gemini_judge
+    import feedback_desk_gpt_judge as gpt_judge
+
+    base_rubrics = {'gpt': gpt_judge.EVALUATION_RUBRIC, 'gemini': gemini_judge.EVALUATION_RUBRIC}
+    configs = []
+    for model, temperature, (variant, make_rubric) in itertools.product(models, temperatures, rubrics.items()):
+        judge = judge_of(model)
+        rubric = make_rubric(base_rubrics[judge])
+        key = hashlib.sha256(json.dumps([judge, model, temperature, rubric]).encode('utf-8')).hexdigest()[:16]
+        configs.append({'name': f"{model}|t={temperature:g}|{variant}", 'judge': judge, 'model': model,
+                        'temperature': temperature, 'rubric': variant, 'rubric_text': rubric, 'key': key})
+    return configs
+
+
+def _calls(config: Dict[str, Any], pairs_df: pd.DataFrame) -> tuple[Callable, List[Dict[str, Any]]]:
+    """
+    The judge's get_llm_evaluation and one kwargs dict per pair for this config.
+    """
+    if config['judge'] == 'gpt':
+        import feedback_desk_gpt_judge as judge
+        fixed = {'client': judge.get_client(), 'model_name': config['model']}
+    else:
+        import feedback_desk_gemini_judge as judge
+        fixed = {'model': judge.get_gemini_model(config['model'])}
+    items = [{'essay': row['essay_text'], 'feedback': row['feedback_text'], 'rubric': config['rubric_text'],
+              'temperature': config['temperature'], **fixed} for _, row in pairs_df.iterrows()]
+    return judge.get_llm_evaluation, items
+
+
+class JudgeSweep:
+    """
+    Evaluates a grid of judge configs over the same essay/feedback pairs. The configs run concurrently as
+    bulk jobs on the providers' shared pools (one job per config, so they share the workers fairly), and
+    valid replies are cached in SQLite by config key and essay_id.
+    """
+
+    def __init__(self, db_path: str = SWEEP_DB_PATH):
+        self.db_path = db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sweep_results (
+                    config_key TEXT NOT NULL,
+                    config TEXT NOT NULL,
+                    essay_id TEXT NOT NULL,
+                    scores TEXT NOT NULL,
+                    judged_at TEXT NOT NULL,
+                    PRIMARY KEY (config_key, essay_id)
+                )
+            """)
+
+    def cached(self, config: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT essay_id, scores FROM sweep_results WHERE config_key = ?",
+                                (config['key'],)).fetchall()
+        return {essay_id: json.loads(scores) for essay_id, scores in rows}
+
+    def _save(self, config: Dict[str, Any], essay_ids: List[str], evaluations: List[Dict[str, Any] | None]) -> int:
+        required = rubric_dimensions(config['rubric_text'])
+        judged_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = []
+        for essay_id, evaluation in zip(essay_ids, evaluations):
+            scores = validate_scores(evaluation, required)
+            if scores is not None:
+                rows.append((config['key'], config['name'], essay_id, json.dumps(scores), judged_at))
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("INSERT OR REPLACE INTO sweep_results VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def run(self, pairs_df: pd.DataFrame, configs: List[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        Evaluate every config over pairs_df (essay_id, essay_text, feedback_text), calling the API only for
+        pairs without a cached result. Returns the long results: config, essay_id, dimension, score
+        (<NA> where the call failed or the rubric leaves the dimension out).
+        """
+        essay_ids = pairs_df['essay_id'].astype(str).tolist()
+        pending = {}
+        for config in configs:
+            cached = self.cached(config)
+            todo = [i for i, essay_id in enumerate(essay_ids) if essay_id not in cached]
+            if todo:
+                pending[config['name']] = (config, [essay_ids[i] for i in todo], _calls(config, pairs_df.iloc[todo]))
+            print(f"📋 {config['name']}: {len(essay_ids) - len(todo)} cached, {len(todo)} to judge")
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                futures = {executor.submit(bulk_map, fn, items, name): name
+                           for name, (_, _, (fn, items)) in pending.items()}
+                for future in as_completed(futures):
+                    config, todo_ids, _ = pending[futures[future]]
+                    saved = self._save(config, todo_ids, future.result())
+                    print(f"✅ {config['name']}: {saved}/{len(todo_ids)} valid replies")
+
+        rows = []
+        for config in configs:
+            cached = self.cached(config)
+            for essay_id in essay_ids:
+                scores = cached.get(essay_id, {})
+                for dim in DIMENSIONS:
+                    rows.append({'config': config['name'], 'essay_id': essay_id, 'dimension': dim,
+                                 'score': scores.get(dim)})
+        results = pd.DataFrame(rows, columns=['config', 'essay_id', 'dimension', 'score'])
+        results['score'] = results['score'].astype('Int8')
+        return results
+
+
+def score_distributions(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per config and dimension: pairs, valid scores, mean, standard deviation and the share of each score.
+    """
+    grouped = results.groupby(['config', 'dimension'], sort=False)['score']
+    table = grouped.agg(pairs='size', scored='count', mean='mean', std='std')
+    shares = results.dropna(subset=['score']).groupby(['config', 'dimension'], sort=False)['score'] \
+        .value_counts(normalize=True).unstack().reindex(columns=SCORES, fill_value=0)
+    shares.columns = [f'share_{score}' for score in SCORES]
+    return table.join(shares).fillna({f'share_{score}': 0.0 for score in SCORES}).reset_index()
+
+
+def pairwise_agreement(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Agreement between every two configs on the pairs both scored, per dimension and pooled over dimensions
+    ('All'), plus the mean score shift from config_a to config_b.
+    """
+    configs = list(dict.fromkeys(results['config']))
+    wide = results.pivot_table(index=['essay_id', 'dimension'], columns='config', values='score', aggfunc='first')
+    dimensions = wide.index.get_level_values('dimension')
+
+    cells, matrices = [], []
+    for first, second in itertools.combinations(configs, 2):
+        if first not in wide or second not in wide:
+            continue
+        both = wide[first].notna() & wide[second].notna()
+        for dim in DIMENSIONS + ['All']:
+            mask = both & ((dimensions == dim) if dim != 'All' else True)
+            a = wide.loc[mask, first].to_numpy(dtype=int)
+            b = wide.loc[mask, second].to_numpy(dtype=int)
+            matrix = np.zeros((len(SCORES), len(SCORES)))
+            np.add.at(matrix, (a - SCORES[0], b - SCORES[0]), 1)
+            matrices.append(matrix)
+            cells.append({'config_a': first, 'config_b': second, 'dimension': dim,
+                          'mean_shift': (b - a).mean() if len(a) else np.nan})
+
+    table = pd.DataFrame(cells, columns=['config_a', 'config_b', 'dimension', 'mean_shift'])
+    if matrices:
+        metrics = agreement_metrics(np.stack(matrices))
+        for name in ['n'] + AGREEMENT_METRICS:
+            table[name] = metrics[name]
+    return table
+
+
+def comparison_table(results: pd.DataFrame, reference: str | None = None) -> pd.DataFrame:
+    """
+    The sweep's summary: score distribution per config and dimension next to its agreement with the
+    reference config (the first one unless given).
+    """
+    reference = reference or results['config'].iloc[0]
+    distributions = score_distributions(results)
+    agreement = pairwise_agreement(results)
+    swapped = agreement.rename(columns={'config_a': 'config_b', 'config_b': 'config_a'})
+    swapped['mean_shift'] = -swapped['mean_shift']
+    versus = pd.concat([agreement, swapped], ignore_index=True)
+    versus = versus[versus['config_a'] == reference].drop(columns='config_a').rename(columns={'config_b': 'config'})
+    versus = versus.rename(columns={col: f'{col}_vs_ref' for col in ['n', 'mean_shift'] + AGREEMENT_METRICS})
+    return distributions.merge(versus, on=['config', 'dimension'], how='left')
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from judge_inputs import load_judge_pairs
+
+    parser = argparse.ArgumentParser(description="Evaluate a grid of judge configs over the same essay/feedback pairs.")
+    parser.add_argument("--samples", default='SAMPLES.pkl')
+    parser.add_argument("--feedback", default='feedback_results_df.pkl')
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS,
+                        help="gemini-* models go to the Gemini judge, everything else to the GPT judge.")
+    parser.add_argument("--temperatures", nargs="+", type=float, default=DEFAULT_TEMPERATURES)
+    parser.add_argument("--rubrics", nargs="+", default=list(RUBRIC_VARIANTS),
+                        help=f"Built-in variants ({', '.join(RUBRIC_VARIANTS)}) or name=path to a rubric text file.")
+    parser.add_argument("--limit", type=int, default=None, help="Sweep over a random sample of this many pairs.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reference", default=None, help="Config the others are compared with (default: the first).")
+    parser.add_argument("--db", default=SWEEP_DB_PATH)
+    parser.add_argument("--output", default=None, help="Also write the comparison table to this CSV.")
+    args = parser.parse_args()
+
+    rubrics = {}
+    for spec in args.rubrics:
+        if '=' in spec:
+            name, path = spec.split('=', 1)
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            rubrics[name] = lambda rubric, text=text: text
+        else:
+            rubrics[spec] = RUBRIC_VARIANTS[spec]
+
+    pairs_df = load_judge_pairs(args.samples, args.feedback)
+    if args.limit and args.limit < len(pairs_df):
+        pairs_df = pairs_df.sample(n=args.limit, random_state=args.seed).sort_index()
+
+    configs = build_grid(args.models, args.temperatures, rubrics)
+    results = JudgeSweep(args.db).run(pairs_df, configs)
+    table = comparison_table(results, args.reference)
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(table.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"💾 Saved the comparison table to {args.output}")
@@ -0,0 +1,198 @@
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# MinHash over word shingles, with LSH banding to find candidate pairs without comparing every pair.
+NUM_PERM = 128
+SHINGLE_WORDS = 5
+THRESHOLD = 0.8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD_BASE = np.uint64(1_000_003)
+
+# Hash values computed per batch (permutations x shingles) when signing, to bound memory.
+BATCH_CELLS = 8_000_000
+
+DEFAULT_BY = ['subject', 'grade']
+
+
+def shingle_hashes(text: str, k: int = SHINGLE_WORDS) -> np.ndarray:
+    """
+    32-bit hashes of the essay's lowercase word k-grams. Words are hashed once and each k-gram hash is a
+    polynomial over its word hashes, computed for all k-grams at once. An essay shorter than k words is
+    one shingle.
+    """
+    words = re.findall(r"\w+", str(text or '').lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    word_hashes = np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words), dtype=np.uint64,
+                              count=len(words))
+    k = min(k, len(words))
+    n = len(words) - k + 1
+    shingles = np.zeros(n, dtype=np.uint64)
+    for offset in range(k):
+        shingles = shingles * _WORD_BASE + word_hashes[offset:offset + n]
+    return shingles & _MAX_HASH
+
+
+def minhash_signatures(texts: list[str], num_perm: int = NUM_PERM, k: int = SHINGLE_WORDS,
+                       seed: int = 1) -> np.ndarray:
+    """
+    (essays x num_perm) uint32 MinHash matrix. Every permutation is applied to the shingles of a whole batch
+    of essays at once, and each essay's minimum is taken with one reduceat over the concatenated shingles.
+    Essays without words get an all-max signature and never match anything.
+    """
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64) % _MERSENNE_PRIME
+    b = rng.randint(0, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64) % _MERSENNE_PRIME
+
+    shingles = [shingle_hashes(text, k) for text in texts]
+    signatures = np.full((len(texts), num_perm), _MAX_HASH, dtype=np.uint64)
+    batch_size = max(1, BATCH_CELLS // num_perm)
+
+    start = 0
+    while start < len(shingles):
+        end, cells = start, 0
+        while end < len(shingles) and (end == start or cells + len(shingles[end]) <= batch_size):
+            cells += len(shingles[end])
+            end += 1
+        rows = [i for i in range(start, end) if len(shingles[i])]
+        if rows:
+            values = np.concatenate([shingles[i] for i in rows])
+            offsets = np.cumsum([0] + [len(shingles[i]) for i in rows[:-1]])
+            with np.errstate(over='ignore'):
+                permuted = ((a[:, None] * values[None, :] + b[:, None]) % _MERSENNE_PRIME) & _MAX_HASH
+            signatures[rows] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        start = end
+    return signatures.astype(np.uint32)
+
+
+def lsh_bands(num_perm: int, threshold: float) -> tuple[int, int]:
+    """
+    (bands, rows per band) whose LSH threshold (1/bands)^(1/rows) is closest to threshold without going above
+    it: a pair at the threshold is then likely to share a band, and the extra candidates are filtered out.
+    """
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1)]
+    below = [(bands, rows) for bands, rows in options if (1 / bands) ** (1 / rows) <= threshold]
+    return max(below or options[:1], key=lambda option: (1 / option[0]) ** (1 / option[1]))
+
+
+def candidate_pairs(signatures: np.ndarray, bands: int, rows: int) -> np.ndarray:
+    """
+    Unique (i, j) row pairs, i < j, that agree on every value of at least one band.
+    """
+    valid = ~(signatures == np.uint32(_MAX_HASH)).all(axis=1)
+    index = np.flatnonzero(valid)
+    pairs = []
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[index, band * rows:(band + 1) * rows])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+        _, bucket, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        for b in np.flatnonzero(sizes > 1):
+            members = index[bucket == b]
+            i, j = np.triu_indices(len(members), k=1)
+            pairs.append(np.stack([members[i], members[j]], axis=1))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def near_duplicate_pairs(texts: list[str], threshold: float = THRESHOLD, num_perm: int = NUM_PERM,
+                         k: int = SHINGLE_WORDS, seed: int = 1) -> pd.DataFrame:
+    """
+    Row pairs whose estimated Jaccard similarity of word shingles is at least threshold: left, right, similarity.
+    """
+    signatures = minhash_signatures(texts, num_perm, k, seed)
+    pairs = candidate_pairs(signatures, *lsh_bands(num_perm, threshold))
+    similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1) if len(pairs) else np.empty(0)
+    keep = similarity >= threshold
+    return pd.DataFrame({'left': pairs[keep, 0], 'right': pairs[keep, 1], 'similarity': similarity[keep]})
+
+
+def flag_near_duplicates(samples_df: pd.DataFrame, threshold: float = THRESHOLD, num_perm: int = NUM_PERM,
+                         k: int = SHINGLE_WORDS, seed: int = 1, text_column: str = 'essay') -> pd.DataFrame:
+    """
+    samples_df plus 'duplicate_of' (the essay_id each near-duplicate is kept in place of, None for essays
+    that are kept) and 'max_similarity' (its closest match). Matching pairs are grouped transitively; the
+    earliest essay of each group is kept.
+    """
+    pairs = near_duplicate_pairs(samples_df[text_column].tolist(), threshold, num_perm, k, seed)
+
+    parent = list(range(len(samples_df)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for left, right in zip(pairs['left'], pairs['right']):
+        root_left, root_right = find(left), find(right)
+        if root_left != root_right:
+            parent[max(root_left, root_right)] = min(root_left, root_right)
+
+    essay_ids = samples_df['essay_id'].astype(str).to_numpy()
+    roots = np.array([find(i) for i in range(len(samples_df))], dtype=np.int64)
+    duplicate_of = np.where(roots == np.arange(len(samples_df)), None, essay_ids[roots])
+
+    max_similarity = np.full(len(samples_df), np.nan)
+    for side in ('left', 'right'):
+        best = pairs.groupby(side)['similarity'].max()
+        max_similarity[best.index] = np.fmax(max_similarity[best.index], best.to_numpy())
+
+    return samples_df.assign(duplicate_of=duplicate_of, max_similarity=max_similarity)
+
+
+def drop_near_duplicates(samples_df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    flagged = flag_near_duplicates(samples_df, **kwargs)
+    return flagged[flagged['duplicate_of'].isna()].drop(columns=['duplicate_of', 'max_similarity'])
+
+
+def duplicate_rates(flagged_df: pd.DataFrame, by: list[str] = DEFAULT_BY) -> pd.DataFrame:
+    """
+    Essays, near-duplicates and duplicate rate per cell, plus an overall row.
+    """
+    flagged = flagged_df.assign(is_duplicate=flagged_df['duplicate_of'].notna())
+    by = [col for col in by if col in flagged]
+    per_cell = flagged.groupby(by, observed=True)['is_duplicate'].agg(essays='size', duplicates='sum').reset_index() \
+        if by else pd.DataFrame()
+    overall = pd.DataFrame([{**{col: 'All' for col in by}, 'essays': len(flagged),
+                             'duplicates': int(flagged['is_duplicate'].sum())}])
+    rates = pd.concat([per_cell, overall], ignore_index=True)
+    rates['duplicate_rate'] = rates['duplicates'] / rates['essays']
+    return rates
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Flag near-duplicate generated essays (MinHash + LSH).")
+    parser.add_argument("--samples", default='SAMPLES.pkl')
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--shingle-words", type=int, default=SHINGLE_WORDS)
+    parser.add_argument("--by", nargs="+", default=DEFAULT_BY, help="Columns to report duplicate rates by.")
+    parser.add_argument("--output", default=None, help="Write the flagged samples to this pickle.")
+    parser.add_argument("--drop", action="store_true", help="Leave the near-duplicates out of --output.")
+    parser.add_argument("--store", default=None,
+                        help="Read the samples from this artifact store; --output then names the stage to write.")
+    args = parser.parse_args()
+
+    if args.store:
+        from artifact_store import ArtifactStore
+        store = ArtifactStore(args.store)
+        samples_df = store.read('samples')
+    else:
+        samples_df = pd.read_pickle(args.samples)
+    flagged = flag_near_duplicates(samples_df, args.threshold, args.num_perm, args.shingle_words)
+    print(duplicate_rates(flagged, args.by).to_string(index=False))
+    if args.output:
+        output = flagged[flagged['duplicate_of'].isna()] if args.drop else flagged
+        if args.store:
+            store.write(args.output, output, note=f"near-duplicates flagged at {args.threshold}")
+        else:
+            output.to_pickle(args.output)
+            print(f"💾 Saved {len(output)} essays to {args.output}")
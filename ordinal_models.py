@@ -0,0 +1,172 @@
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from agreement import DIMENSIONS, SCORES, build_merged_all
+from confusion_cube import LEVEL_COLUMNS, level_number
+
+JUDGES = ['gpt', 'gemini']
+DISTRIBUTIONS = ['logit', 'probit']
+
+# Fitted parameters of the last run, used as start values the next time the grid is fitted.
+PARAMS_PATH = 'ordinal_fit_params.json'
+
+COEFFICIENT_COLUMNS = ['dimension', 'judge', 'distr', 'term', 'coef', 'std_err', 'z', 'p_value',
+                       'ci_low', 'ci_high', 'n', 'llf', 'converged']
+
+
+def design_matrix(merged_all_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Predictors shared by every model: the 1-5 knowledge/grammar/flow levels as numbers plus subject and
+    grade dummies (first category dropped; OrderedModel has its thresholds instead of an intercept).
+    """
+    levels = pd.DataFrame({f'{axis}_level': level_number(merged_all_df[column])
+                           for axis, column in LEVEL_COLUMNS.items()}, index=merged_all_df.index)
+    dummies = pd.get_dummies(merged_all_df[['subject', 'grade']].astype(str), drop_first=True, dtype=float)
+    exog = pd.concat([levels, dummies], axis=1).astype(float)
+    return exog.loc[:, exog.nunique() > 1]
+
+
+def _ordered_scores(values: pd.Series) -> pd.Series:
+    scores = pd.to_numeric(values, errors='coerce').astype(float)
+    observed = [score for score in SCORES if (scores == score).any()]
+    return pd.Series(pd.Categorical(scores, categories=observed, ordered=True), index=values.index)
+
+
+def fit_ordinal(endog: pd.Series, exog: pd.DataFrame, distr: str, start_params: dict | None = None) -> dict:
+    """
+    Fit one ordinal model. start_params (name -> value) is used only when it names exactly the parameters
+    of this model, e.g. the same cell from the previous run.
+    """
+    from statsmodels.miscmodels.ordinal_model import OrderedModel
+
+    model = OrderedModel(endog, exog, distr=distr)
+    start = None
+    if start_params and list(start_params) == list(model.exog_names):
+        start = np.array([start_params[name] for name in model.exog_names])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        result = model.fit(start_params=start, method='bfgs', maxiter=500, disp=False)
+        conf_int = np.asarray(result.conf_int())
+        return {
+            'names': list(model.exog_names),
+            'params': np.asarray(result.params),
+            'bse': np.asarray(result.bse),
+            'tvalues': np.asarray(result.tvalues),
+            'pvalues': np.asarray(result.pvalues),
+            'conf_int': conf_int,
+            'n': int(result.nobs),
+            'llf': float(result.llf),
+            'converged': bool(result.mle_retvals.get('converged', False)),
+            'warm_start': start is not None,
+        }
+
+
+def _fit_batch(batch):
+    return [fit_ordinal(*task) for task in batch]
+
+
+def load_start_params(path: str = PARAMS_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_start_params(fits: dict, path: str = PARAMS_PATH) -> None:
+    params = {key: dict(zip(fit['names'], map(float, fit['params']))) for key, fit in fits.items()}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(params, f, indent=2)
+
+
+def fit_model_grid(merged_all_df: pd.DataFrame,
+                   dimensions: list[str] = DIMENSIONS,
+                   judges: list[str] = JUDGES,
+                   distributions: list[str] = DISTRIBUTIONS,
+                   workers: int | None = None,
+                   params_path: str | None = PARAMS_PATH) -> pd.DataFrame:
+    """
+    Ordinal regression of every dimension's score, for every judge and link, on the competency levels plus
+    subject/grade. The design matrix is built once; the dimension × judge × link fits run across a process
+    pool, each warm-started from that cell's estimates in params_path when the previous run saved them.
+    Returns one tidy coefficient table: the slopes, then the thresholds as OrderedModel parameterises them
+    (term '1/2' is the first cut point, later terms are log increments). Cells whose scores take fewer than
+    two values cannot be fitted; they are left out of the table and listed in a warning.
+    """
+    exog = design_matrix(merged_all_df)
+    exog = exog[exog.notna().all(axis=1)]
+    previous = load_start_params(params_path) if params_path else {}
+
+    keys, tasks, skipped = [], [], []
+    for dim in dimensions:
+        for judge in judges:
+            endog = _ordered_scores(merged_all_df.loc[exog.index, f'{dim}_{judge}'])
+            rows = endog.notna().to_numpy()
+            for distr in distributions:
+                key = f'{dim}|{judge}|{distr}'
+                if endog[rows].nunique() < 2:
+                    skipped.append(key)
+                    continue
+                keys.append(key)
+                tasks.append((endog[rows], exog[rows], distr, previous.get(key)))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) < 2 * workers:
+        results = _fit_batch(tasks)
+    else:
+        size = -(-len(tasks) // workers)
+        batches = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = [result for batch in pool.map(_fit_batch, batches) for result in batch]
+    fits = dict(zip(keys, results))
+
+    warm = sum(fit['warm_start'] for fit in results)
+    print(f"📈 Fitted {len(fits)} ordinal models ({warm} warm-started) on {len(exog)} essays.")
+    if skipped:
+        print(f"⚠️ Not fitted, fewer than two observed scores: {', '.join(skipped)}")
+    if params_path:
+        save_start_params(fits, params_path)
+
+    rows = []
+    for key, fit in fits.items():
+        dim, judge, distr = key.split('|')
+        for i, name in enumerate(fit['names']):
+            rows.append({
+                'dimension': dim, 'judge': judge, 'distr': distr, 'term': name,
+                'coef': fit['params'][i], 'std_err': fit['bse'][i], 'z': fit['tvalues'][i],
+                'p_value': fit['pvalues'][i], 'ci_low': fit['conf_int'][i, 0], 'ci_high': fit['conf_int'][i, 1],
+                'n': fit['n'], 'llf': fit['llf'], 'converged': fit['converged'],
+            })
+    return pd.DataFrame(rows, columns=COEFFICIENT_COLUMNS)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fit ordinal models of judge scores on the essay competency levels.")
+    parser.add_argument("--store", default=None,
+                        help="Read the judgments and samples from this artifact store instead of pickles.")
+    parser.add_argument("--gpt", default='GPT_judges_evaluation_results.pkl')
+    parser.add_argument("--gemini", default='Gemini_judges_evaluation_results.pkl')
+    parser.add_argument("--samples", default='SAMPLES.pkl')
+    parser.add_argument("--distr", nargs="+", default=DISTRIBUTIONS, choices=['logit', 'probit'])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--params", default=PARAMS_PATH, help="Warm-start parameters file.")
+    parser.add_argument("--output", default='ordinal_coefficients.csv')
+    args = parser.parse_args()
+
+    if args.store:
+        from artifact_store import ArtifactStore, load_merged_all
+        merged_all_df = load_merged_all(ArtifactStore(args.store))
+    else:
+        merged_all_df = build_merged_all(pd.read_pickle(args.gpt), pd.read_pickle(args.gemini),
+                                         pd.read_pickle(args.samples))
+    coefficients = fit_model_grid(merged_all_df, distributions=args.distr, workers=args.workers,
+                                  params_path=args.params)
+    coefficients.to_csv(args.output, index=False)
+    print(coefficients[~coefficients['term'].str.contains('/')].to_string(index=False))
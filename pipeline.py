@@ -0,0 +1,364 @@
+import ast
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+from api_pool import bulk_map
+from artifact_store import ARTIFACT_ROOT, PARTITION_COLUMNS, ArtifactStore
+from feedback_desk_api import FEEDBACK_ERROR
+from judge_inputs import add_judge_text
+from judge_scores import DIMENSIONS, ingest_judgments
+from tracing import enable_tracing, span
+
+STATE_PATH = 'pipeline_state.json'
+CONFIG_PATH = 'pipeline_config.json'
+
+# Pipeline stage -> the artifact store stage its output is written to (the names import_pickle uses).
+STORE_STAGES = {
+    'generate': 'samples',
+    'feedback': 'feedback',
+    'judge_gpt': 'gpt_judgments',
+    'judge_gemini': 'gemini_judgments',
+}
+
+DEFAULT_PATHS = {
+    'agreement': 'agreement_table.csv',
+    'report': 'report',
+}
+
+# The essay_gen call in Stud_essay_random_distro.py's __main__, used when there is no pipeline_config.json.
+DEFAULT_CONFIG = {
+    'essays': [{
+        'n': 10,
+        'topic': "Food Deserts: Analyze the geographic and economic factors that create urban food deserts, "
+                 "and propose an effective, locally-driven policy solution.",
+        'grade_level': "12th grade",
+        'subject': "Social studies",
+        'assignment_type': "essay",
+        'prompt': "Write an essay of 5 to 7 paragraphs according to the specified competencies.",
+    }],
+}
+
+# Stage -> upstream stages.
+STAGES = {
+    'generate': [],
+    'feedback': ['generate'],
+    'judge_gpt': ['feedback'],
+    'judge_gemini': ['feedback'],
+    'analyze': ['judge_gpt', 'judge_gemini'],
+}
+
+# What each stage's output depends on besides its data: the prompt/rubric text and the functions that carry
+# the model parameters, read from source so fingerprinting never imports the judge modules or their SDKs.
+STAGE_SOURCES = {
+    'generate': ('Stud_essay_random_distro.py', ['knowledge_levels', 'grammar_levels', 'flow_levels',
+                                                 'text_generation', 'build_student_agent', 'competency_level',
+                                                 'essay_gen']),
+    'feedback': ('feedback_desk_api.py', ['FEEDBACK_API_URL', 'build_assignment_info', 'call_feedback_api']),
+    'judge_gpt': ('feedback_desk_gpt_judge.py', ['SYSTEM_ROLE_JUDGE', 'EVALUATION_RUBRIC', 'GPT_MODEL',
+                                                 'JUDGE_TEMPERATURE', 'get_llm_evaluation']),
+    'judge_gemini': ('feedback_desk_gemini_judge.py', ['SYSTEM_ROLE_JUDGE', 'EVALUATION_RUBRIC', 'GEMINI_MODEL',
+                                                       'JUDGE_TEMPERATURE', '_new_gemini_model',
+                                                       'get_llm_evaluation']),
+}
+
+
+def fingerprint(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """
+    Content hash of a stage output (column names and values, row order included).
+    """
+    hashed = pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+    return fingerprint(list(df.columns), hashlib.sha256(hashed.tobytes()).hexdigest())
+
+
+def source_parts(path: str, names: List[str]) -> Dict[str, str]:
+    """
+    Source text of the named top-level functions and assignments in a module, without importing it.
+    """
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    parts = {}
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            node_names = [node.name]
+        elif isinstance(node, ast.Assign):
+            node_names = [target.id for target in node.targets if isinstance(target, ast.Name)]
+        else:
+            continue
+        for name in node_names:
+            if name in names:
+                parts[name] = ast.get_source_segment(source, node)
+    return parts
+
+
+def judge_frame(stage: str, pairs_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Judge every essay/feedback pair with the judge_gpt or judge_gemini model, in input order; failed calls keep
+    their essay_id with empty scores.
+    """
+    if stage == 'judge_gpt':
+        import feedback_desk_gpt_judge as judge
+        model = {'client': judge.get_client()}
+    else:
+        import feedback_desk_gemini_judge as judge
+        model = {'model': judge.get_gemini_model()}
+    # Concurrent bulk calls on the provider's shared pool, so interactive requests still get through.
+    evaluations = bulk_map(judge.get_llm_evaluation,
+                           [{'essay': row['essay_text'], 'feedback': row['feedback_text'], **model}
+                            for _, row in pairs_df.iterrows()], job=stage)
+    results = [{'essay_id': essay_id, **(evaluation or {})}
+               for essay_id, evaluation in zip(pairs_df['essay_id'], evaluations)]
+    return ingest_judgments(pd.DataFrame(results))
+
+
+class Pipeline:
+    """
+    generate -> feedback -> judge_gpt / judge_gemini -> analyze, with each stage's output written to the
+    artifact store as a new Parquet version, partitioned by subject/grade. Every stage is fingerprinted from
+    its inputs' content, its config and its prompt/model source; an unchanged stage is skipped. Row-level
+    stages also keep one fingerprint per essay, so only essays whose inputs changed (or that failed last time)
+    are sent to the API again. With shards > 1 the API stages run as one process per shard (see
+    sharded_runner), each with its own key.
+    """
+
+    def __init__(self, config: Dict[str, Any] | None = None, paths: Dict[str, str] | None = None,
+                 state_path: str = STATE_PATH, shards: int = 1, store_root: str = ARTIFACT_ROOT):
+        self.config = config or DEFAULT_CONFIG
+        self.store = ArtifactStore(store_root)
+        self.shards = shards
+        self.paths = {**DEFAULT_PATHS, **(paths or {})}
+        self.state_path = state_path
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict[str, Any]:
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_state(self) -> None:
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _sources(self, stage: str) -> Dict[str, str]:
+        if stage not in STAGE_SOURCES:
+            return {}
+        path, names = STAGE_SOURCES[stage]
+        return source_parts(os.path.join(os.path.dirname(os.path.abspath(__file__)), path), names)
+
+    def _read(self, stage: str) -> pd.DataFrame:
+        df = self.store.read(STORE_STAGES[stage])
+        # Later stages carry subject/grade only so the store can partition them.
+        return df if stage == 'generate' else df.drop(columns=PARTITION_COLUMNS, errors='ignore')
+
+    def _write(self, stage: str, df: pd.DataFrame) -> str:
+        output_hash = frame_hash(df)
+        if stage != 'generate':
+            samples_df = self._read('generate').assign(essay_id=lambda samples: samples['essay_id'].astype(str))
+            df = df.merge(samples_df[['essay_id'] + PARTITION_COLUMNS].drop_duplicates('essay_id'),
+                          on='essay_id', how='left')
+        self.store.write(STORE_STAGES[stage], df, note=f'pipeline {stage} {output_hash}')
+        return output_hash
+
+    def _unique_samples(self) -> pd.DataFrame:
+        """
+        The generated essays minus any flagged as near-duplicates, which get no feedback or judge calls.
+        """
+        samples_df = self._read('generate')
+        if 'duplicate_of' in samples_df:
+            samples_df = samples_df[samples_df['duplicate_of'].isna()]
+        return samples_df
+
+    def _output_exists(self, stage: str) -> bool:
+        if stage == 'analyze':
+            return os.path.exists(self.paths['agreement'])
+        return bool(self.store.catalog().get(STORE_STAGES[stage]))
+
+    # --- Stages. Each returns (output hash, row fingerprints) ---
+
+    def _generate(self, previous_rows: Dict[str, List[str]]):
+        from Stud_essay_random_distro import essay_gen
+
+        sources = self._sources('generate')
+        old = self._read('generate') if previous_rows and self._output_exists('generate') else pd.DataFrame()
+        frames, rows = [], {}
+        for job in self.config['essays']:
+            job_fingerprint = fingerprint(job, sources)
+            kept_ids = previous_rows.get(job_fingerprint)
+            if kept_ids and not old.empty:
+                frames.append(old[old['essay_id'].isin(kept_ids)])
+            elif self.shards > 1:
+                from sharded_runner import run_sharded
+                frames.append(run_sharded('generate', [job], self.shards))
+            else:
+                frames.append(essay_gen(**job))
+            rows[job_fingerprint] = frames[-1]['essay_id'].astype(str).tolist()
+        samples_df = pd.concat(frames, ignore_index=True).drop(columns=['duplicate_of', 'max_similarity'],
+                                                               errors='ignore')
+        if self.config.get('near_duplicates') is not None:
+            from near_duplicates import duplicate_rates, flag_near_duplicates
+            samples_df = flag_near_duplicates(samples_df, **self.config['near_duplicates'])
+            print(duplicate_rates(samples_df).to_string(index=False))
+        return self._write('generate', samples_df), rows
+
+    def _incremental(self, stage: str, inputs: pd.DataFrame, row_parts: Callable[[pd.Series], Any],
+                     run: Callable[[pd.DataFrame], pd.DataFrame], previous_rows: Dict[str, str]):
+        """
+        Re-run `run` only for the input rows whose fingerprint changed, and merge with the kept output rows.
+        """
+        sources = self._sources(stage)
+        inputs = inputs.assign(essay_id=inputs['essay_id'].astype(str))
+        wanted = {row['essay_id']: fingerprint(row_parts(row), sources) for _, row in inputs.iterrows()}
+
+        old = self._read(stage) if previous_rows and self._output_exists(stage) else pd.DataFrame(columns=['essay_id'])
+        old = old.assign(essay_id=old['essay_id'].astype(str))
+        kept_ids = {essay_id for essay_id, fp in wanted.items() if previous_rows.get(essay_id) == fp}
+        todo = inputs[~inputs['essay_id'].isin(kept_ids)]
+        print(f"🔁 {stage}: {len(todo)} of {len(inputs)} essays changed; reusing {len(kept_ids)}.")
+
+        if not len(todo):
+            # Nothing to run (e.g. a first judge run after every feedback request failed): an empty frame with
+            # the stage's output columns.
+            scores = DIMENSIONS if stage.startswith('judge_') else []
+            fresh = pd.DataFrame(columns=list(dict.fromkeys(list(old.columns) + scores)))
+        elif self.shards > 1:
+            from sharded_runner import run_sharded
+            fresh = run_sharded(stage, todo, self.shards)
+        else:
+            fresh = run(todo)
+        fresh = fresh.assign(essay_id=fresh['essay_id'].astype(str))
+        output = pd.concat([old[old['essay_id'].isin(kept_ids)], fresh], ignore_index=True)
+        output = output.set_index('essay_id').reindex(list(wanted)).reset_index()
+
+        # Rows without a result (a failed feedback request or judge call) get no fingerprint, so the next run
+        # retries them.
+        if stage == 'feedback':
+            done = set(fresh.loc[fresh[FEEDBACK_ERROR].isna(), 'essay_id']) if FEEDBACK_ERROR in fresh \
+                else set(fresh['essay_id'])
+        elif set(DIMENSIONS) <= set(fresh.columns):
+            done = set(fresh.loc[fresh[DIMENSIONS].notna().all(axis=1), 'essay_id'])
+        else:
+            done = set()
+        rows = {essay_id: fp for essay_id, fp in wanted.items() if essay_id in kept_ids or essay_id in done}
+        return self._write(stage, output), rows
+
+    def _feedback(self, previous_rows: Dict[str, str]):
+        from feedback_desk_api import feedback_for_samples
+
+        samples_df = self._unique_samples()
+        return self._incremental('feedback', samples_df,
+                                 lambda row: [row['essay'], row['subject'], row['grade']],
+                                 feedback_for_samples, previous_rows)
+
+    def _judge(self, stage: str, previous_rows: Dict[str, str]):
+        samples_df = self._unique_samples().assign(essay_id=lambda df: df['essay_id'].astype(str))
+        feedback_df = self._read('feedback').assign(essay_id=lambda df: df['essay_id'].astype(str))
+        if FEEDBACK_ERROR in feedback_df:
+            # Essays whose feedback request failed have nothing to judge yet.
+            feedback_df = feedback_df[feedback_df[FEEDBACK_ERROR].isna()]
+        pairs = add_judge_text(pd.merge(samples_df, feedback_df, on='essay_id', how='inner')
+                               .drop_duplicates(subset=['essay_id']))
+
+        return self._incremental(stage, pairs[['essay_id', 'essay_text', 'feedback_text']],
+                                 lambda row: [row['essay_text'], row['feedback_text']],
+                                 lambda todo: judge_frame(stage, todo), previous_rows)
+
+    def _analyze(self, previous_rows):
+        from agreement import agreement_table, build_merged_all
+        from report_builder import build_report
+
+        merged_all_df = build_merged_all(self._read('judge_gpt'), self._read('judge_gemini'),
+                                         self._read('generate'))
+        table = agreement_table(merged_all_df)
+        table.to_csv(self.paths['agreement'], index=False)
+        build_report(merged_all_df, self.paths['report'])
+        return frame_hash(table), {}
+
+    # --- Orchestration ---
+
+    def plan(self, targets: List[str]) -> List[str]:
+        """
+        The targets and everything upstream of them, in dependency order.
+        """
+        order = []
+
+        def visit(stage: str) -> None:
+            for dep in STAGES[stage]:
+                visit(dep)
+            if stage not in order:
+                order.append(stage)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    def run(self, targets: List[str] = ('analyze',), force: List[str] = ()) -> None:
+        runners = {'generate': self._generate, 'feedback': self._feedback, 'analyze': self._analyze,
+                   'judge_gpt': lambda rows: self._judge('judge_gpt', rows),
+                   'judge_gemini': lambda rows: self._judge('judge_gemini', rows)}
+
+        for stage in self.plan(list(targets)):
+            upstream = {dep: self.state[dep]['output'] for dep in STAGES[stage]}
+            config = self.config['essays'] if stage == 'generate' else None
+            if stage == 'generate' and self.config.get('near_duplicates') is not None:
+                config = {'essays': config, 'near_duplicates': self.config['near_duplicates']}
+            stage_fingerprint = fingerprint(upstream, config, self._sources(stage))
+            entry = self.state.get(stage, {})
+
+            if stage not in force and entry.get('fingerprint') == stage_fingerprint and self._output_exists(stage) \
+                    and entry.get('complete', True):
+                print(f"⏭️ {stage}: unchanged, skipped.")
+                continue
+
+            print(f"▶️ {stage}: running...")
+            previous_rows = {} if stage in force else entry.get('rows', {})
+            with span(stage, kind='stage'):
+                output, rows = runners[stage](previous_rows)
+            complete = stage in ('generate', 'analyze') or len(rows) == len(self._read(stage))
+            self.state[stage] = {
+                'fingerprint': stage_fingerprint,
+                'output': output,
+                'rows': rows,
+                'complete': complete,
+                'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self._save_state()
+            print(f"✅ {stage}: done." if complete else f"⚠️ {stage}: done with failed rows; they rerun next time.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run generate -> feedback -> judge -> analyze, skipping unchanged work.")
+    parser.add_argument("targets", nargs="*", default=['analyze'], choices=list(STAGES),
+                        help="Stages to bring up to date (with everything upstream). Default: analyze.")
+    parser.add_argument("--force", nargs="+", default=[], choices=list(STAGES), help="Re-run these stages in full.")
+    parser.add_argument("--config", default=CONFIG_PATH,
+                        help="JSON with an 'essays' list of essay_gen arguments and, optionally, 'near_duplicates' "
+                             "(flag_near_duplicates arguments, e.g. {\"threshold\": 0.8}).")
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--store", default=ARTIFACT_ROOT, help="Artifact store the stage outputs are written to.")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Run the API stages as this many processes, one API key each (OPENAI_API_KEYS etc.).")
+    parser.add_argument("--trace", default=None, help="Append timing spans to this JSONL file (see tracing.py).")
+    args = parser.parse_args()
+
+    if args.trace:
+        enable_tracing(args.trace)
+
+    config = None
+    if os.path.exists(args.config):
+        with open(args.config, encoding='utf-8') as f:
+            config = json.load(f)
+    pipeline = Pipeline(config, state_path=args.state, shards=args.shards, store_root=args.store)
+    pipeline.run(args.targets, force=args.force)
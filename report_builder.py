@@ -0,0 +1,206 @@
+import hashlib
+import html
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from agreement import DIMENSIONS, SCORES, agreement_table, build_merged_all
+from confusion_cube import ConfusionCube
+
+REPORT_DIR = 'report'
+MANIFEST_NAME = 'manifest.json'
+
+# Bump when a renderer changes so every figure is redrawn once.
+RENDER_VERSION = 1
+
+AGREEMENT_COLORS = ['#2ca02c', '#d62728']
+
+
+# --- Figure Specs ---
+# A spec is a plain dict (name, kind, title, data) so it can be hashed and sent to a worker process.
+
+def slugify(text: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '_', str(text).lower()).strip('_')
+
+
+def agreement_bars(table: pd.DataFrame) -> pd.DataFrame:
+    data = table[['dimension', 'exact_agreement']].set_index('dimension') * 100
+    data.columns = ['Agreement']
+    data['Disagreement'] = 100 - data['Agreement']
+    return data
+
+
+def figure_specs(merged_all_df: pd.DataFrame) -> list[dict]:
+    """
+    Every chart in Feedback_results.ipynb: stacked agreement bars (overall, by subject/grade, by grammar level),
+    GPT vs. Gemini heatmaps per dimension and for grammar levels 1 and 3, and the score histograms.
+    """
+    specs = []
+    table = agreement_table(merged_all_df)
+
+    for grouping, frame in table.groupby('grouping', sort=False):
+        columns = [] if grouping == 'overall' else grouping.split(' × ')
+        cells = [((), frame)] if not columns else frame.groupby(columns, sort=True)
+        for key, cell in cells:
+            key = key if isinstance(key, tuple) else (key,)
+            label = ' - '.join(str(k).title() for k in key) or 'All Essays'
+            specs.append({
+                'name': slugify(f"agreement_{grouping}_{'_'.join(map(str, key))}"),
+                'kind': 'agreement_bars',
+                'title': f'Agreement vs. Disagreement by Metric for {label}',
+                'data': agreement_bars(cell),
+            })
+
+    cube = ConfusionCube.build(merged_all_df)
+    for dim in DIMENSIONS:
+        specs.append({'name': slugify(f'heatmap_{dim}'), 'kind': 'heatmap',
+                      'title': f'Heatmap of {dim}_gemini vs {dim}_gpt Ratings',
+                      'data': cube.confusion(dim)})
+    for level in (1, 3):
+        specs.append({'name': f'heatmap_grammar_level_{level}', 'kind': 'heatmap',
+                      'title': f'Grammar Ratings for Grammar Level {level}',
+                      'data': cube.confusion('Grammar', grammar=level)})
+
+    for judge in ('gpt', 'gemini'):
+        counts = pd.DataFrame({
+            dim: merged_all_df[f'{dim}_{judge}'].value_counts().reindex(SCORES, fill_value=0)
+            for dim in ['Grammar', 'Structure', 'Content']
+        })
+        specs.append({'name': f'histogram_{judge}', 'kind': 'histogram',
+                      'title': f'Distribution of {judge.upper()} scores', 'data': counts})
+    return specs
+
+
+def spec_hash(spec: dict) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{RENDER_VERSION}|{spec['kind']}|{spec['title']}".encode())
+    digest.update(spec['data'].to_csv().encode())
+    return digest.hexdigest()
+
+
+# --- Rendering (runs in worker processes) ---
+
+def render_figure(spec: dict, output_dir: str, formats: tuple[str, ...]) -> list[str]:
+    """
+    Draw one figure with the Agg backend and write it in every format; returns the written paths.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    data = spec['data']
+    if spec['kind'] == 'agreement_bars':
+        fig, ax = plt.subplots(figsize=(12, 7))
+        data.plot(kind='bar', stacked=True, color=AGREEMENT_COLORS, ax=ax)
+        ax.set_ylabel('Percentage (%)')
+        ax.set_ylim(0, 100)
+        ax.yaxis.set_major_formatter(plt.FormatStrFormatter('%.0f%%'))
+        ax.legend(title='Outcome', bbox_to_anchor=(1.05, 1), loc='upper left')
+        ax.tick_params(axis='x', rotation=45)
+    elif spec['kind'] == 'heatmap':
+        fig, ax = plt.subplots(figsize=(8, 6))
+        sns.heatmap(data, annot=True, fmt='d', cmap='YlGnBu', linewidths=.5, ax=ax)
+    else:
+        fig, axes = plt.subplots(1, len(data.columns), figsize=(18, 5))
+        for ax, col in zip(axes, data.columns):
+            ax.bar(data.index, data[col])
+            ax.set_title(f'Distribution of {col}')
+            ax.set_xticks(SCORES)
+            ax.set_ylabel('Frequency')
+
+    fig.suptitle(spec['title'], fontsize=14)
+    fig.tight_layout()
+    paths = []
+    for fmt in formats:
+        path = os.path.join(output_dir, f"{spec['name']}.{fmt}")
+        fig.savefig(path, format=fmt)
+        paths.append(path)
+    plt.close(fig)
+    return paths
+
+
+def _render_task(task):
+    return render_figure(*task)
+
+
+def write_index(specs: list[dict], output_dir: str) -> str:
+    items = "\n".join(
+        f'<figure><img src="{spec["name"]}.png" alt="{html.escape(spec["title"])}">'
+        f'<figcaption>{html.escape(spec["title"])}</figcaption></figure>'
+        for spec in specs
+    )
+    path = os.path.join(output_dir, 'index.html')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Feedback Desk Judge Agreement Report</title>
+<style>figure {{ display: inline-block; margin: 1em; }} img {{ max-width: 600px; }}</style></head>
+<body><h1>Feedback Desk Judge Agreement Report</h1>
+{items}
+</body></html>
+""")
+    return path
+
+
+def build_report(merged_all_df: pd.DataFrame, output_dir: str = REPORT_DIR,
+                 formats: tuple[str, ...] = ('png', 'svg'), workers: int | None = None,
+                 force: bool = False) -> dict:
+    """
+    Render every figure whose data hash changed since the last build, in parallel, and rewrite index.html.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    specs = figure_specs(merged_all_df)
+    hashes = {spec['name']: spec_hash(spec) for spec in specs}
+    stale = [
+        spec for spec in specs
+        if manifest.get(spec['name']) != hashes[spec['name']]
+        or not all(os.path.exists(os.path.join(output_dir, f"{spec['name']}.{fmt}")) for fmt in formats)
+    ]
+    print(f"🖼️ {len(stale)} of {len(specs)} figures changed; rendering...")
+
+    tasks = [(spec, output_dir, formats) for spec in stale]
+    if len(tasks) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_render_task, tasks))
+    else:
+        for task in tasks:
+            _render_task(task)
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(hashes, f, indent=2)
+    index_path = write_index(specs, output_dir)
+    print(f"✅ Report written to {index_path}")
+    return hashes
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render the judge agreement report without a notebook.")
+    parser.add_argument("--store", default=None,
+                        help="Read the judgments and samples from this artifact store instead of pickles.")
+    parser.add_argument("--gpt", default='GPT_judges_evaluation_results.pkl')
+    parser.add_argument("--gemini", default='Gemini_judges_evaluation_results.pkl')
+    parser.add_argument("--samples", default='SAMPLES.pkl')
+    parser.add_argument("--output", default=REPORT_DIR)
+    parser.add_argument("--formats", nargs="+", default=['png', 'svg'])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="Re-render every figure.")
+    args = parser.parse_args()
+
+    if args.store:
+        from artifact_store import ArtifactStore, load_merged_all
+        merged_all_df = load_merged_all(ArtifactStore(args.store))
+    else:
+        merged_all_df = build_merged_all(pd.read_pickle(args.gpt), pd.read_pickle(args.gemini),
+                                         pd.read_pickle(args.samples))
+    build_report(merged_all_df, args.output, tuple(args.formats), args.workers, args.force)
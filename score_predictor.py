@@ -0,0 +1,315 @@
+import re
+import time
+import zlib
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from agreement import DIMENSIONS, SCORES, agreement_metrics
+from judge_scores import ingest_judgments
+from sharded_runner import shard_of
+
+JUDGES = ['gpt', 'gemini']
+
+# Hashed word unigrams and bigrams of the essay and of the feedback, in separate namespaces.
+N_FEATURES = 2 ** 18
+ALPHA = 1.0
+MAX_ITER = 300
+
+# Share of essays (by a stable hash of essay_id) held out to measure agreement with the judges.
+TEST_PERCENT = 20
+
+# A pre-screen only trusts predictions whose most likely score has at least this probability.
+CONFIDENCE_THRESHOLD = 0.6
+
+MODEL_PATH = 'score_predictor.npz'
+
+_WORD_BASE = np.uint64(1_000_003)
+_MIX_PRIME = np.uint64((1 << 61) - 1)
+_NAMESPACES = {'essay_text': np.uint64(1), 'feedback_text': np.uint64(2)}
+
+
+def _text_hashes(text: str, namespace: np.uint64) -> np.ndarray:
+    """
+    Feature hashes of one text: its words, adjacent word pairs and a log2 length bucket.
+    """
+    words = re.findall(r"\w+", str(text or '').lower())
+    word_hashes = np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words), dtype=np.uint64,
+                              count=len(words))
+    length = np.array([zlib.crc32(f"<len:{int(np.log2(len(words) + 1))}>".encode('utf-8'))], dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        bigrams = word_hashes[:-1] * _WORD_BASE + word_hashes[1:]
+        return (np.concatenate([word_hashes, bigrams, length]) * _WORD_BASE + namespace) % _MIX_PRIME
+
+
+def featurize(pairs_df: pd.DataFrame, n_features: int = N_FEATURES):
+    """
+    Sparse (pairs x n_features) matrix of sublinear (log1p) hashed n-gram counts from essay_text and
+    feedback_text, each row scaled to unit length.
+    """
+    from scipy import sparse
+
+    columns = [pairs_df[column].tolist() for column in _NAMESPACES]
+    rows, cols = [], []
+    for i, texts in enumerate(zip(*columns)):
+        hashes = np.concatenate([_text_hashes(text, namespace)
+                                 for text, namespace in zip(texts, _NAMESPACES.values())])
+        cols.append((hashes % np.uint64(n_features)).astype(np.int64))
+        rows.append(np.full(len(hashes), i, dtype=np.int64))
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+    matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(pairs_df), n_features))
+    matrix.sum_duplicates()
+    np.log1p(matrix.data, out=matrix.data)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    return sparse.diags(1 / np.where(norms > 0, norms, 1)) @ matrix
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 0.5 * (1 + np.tanh(0.5 * x))
+
+
+def _thresholds(params: np.ndarray) -> np.ndarray:
+    # First cut point, then positive gaps, so the cut points stay ordered.
+    return params[0] + np.concatenate([[0.0], np.cumsum(np.exp(params[1:]))])
+
+
+def fit_ordinal_logit(features, scores: np.ndarray, alpha: float = ALPHA,
+                      max_iter: int = MAX_ITER) -> Dict[str, np.ndarray]:
+    """
+    Proportional-odds (cumulative logit) model P(score <= k) = sigmoid(cut_k - features @ weights), fitted
+    by L-BFGS with an L2 penalty on the weights. scores are 1-5 ints.
+    """
+    from scipy.optimize import minimize
+
+    k = len(SCORES)
+    classes = np.asarray(scores, dtype=int) - SCORES[0]
+    n_features = features.shape[1]
+    counts = np.bincount(classes, minlength=k)
+    # Start the cut points at the observed cumulative shares.
+    cumulative = np.clip(np.cumsum(counts)[:-1] / len(classes), 1e-3, 1 - 1e-3)
+    cuts = np.maximum.accumulate(np.log(cumulative / (1 - cumulative)) + np.arange(k - 1) * 1e-3)
+    start = np.concatenate([np.zeros(n_features), [cuts[0]], np.log(np.maximum(np.diff(cuts), 1e-3))])
+
+    def loss(params):
+        weights, cut_params = params[:n_features], params[n_features:]
+        cuts = _thresholds(cut_params)
+        eta = features @ weights
+        upper = np.append(cuts, np.inf)[classes] - eta
+        lower = np.insert(cuts, 0, -np.inf)[classes] - eta
+        cdf_upper, cdf_lower = _sigmoid(upper), _sigmoid(lower)
+        prob = np.maximum(cdf_upper - cdf_lower, 1e-12)
+        pdf_upper, pdf_lower = cdf_upper * (1 - cdf_upper), cdf_lower * (1 - cdf_lower)
+
+        value = -np.log(prob).sum() + 0.5 * alpha * weights @ weights
+        grad_eta = (pdf_upper - pdf_lower) / prob
+        grad_cuts = (np.bincount(classes, weights=-pdf_upper / prob, minlength=k)[:k - 1]
+                     + np.bincount(classes, weights=pdf_lower / prob, minlength=k)[1:])
+        grad_cut_params = np.concatenate([[grad_cuts.sum()],
+                                          np.exp(cut_params[1:]) * np.cumsum(grad_cuts[::-1])[::-1][1:]])
+        grad_weights = features.T @ grad_eta + alpha * weights
+        return value, np.concatenate([grad_weights, grad_cut_params])
+
+    result = minimize(loss, start, jac=True, method='L-BFGS-B', options={'maxiter': max_iter})
+    return {'weights': result.x[:n_features], 'cuts': _thresholds(result.x[n_features:])}
+
+
+def ordinal_proba(features, model: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    (pairs x 5) probability of each score.
+    """
+    eta = features @ model['weights']
+    cumulative = _sigmoid(model['cuts'][None, :] - eta[:, None])
+    return np.diff(np.hstack([np.zeros((len(eta), 1)), cumulative, np.ones((len(eta), 1))]), axis=1)
+
+
+def training_frame(pairs_df: pd.DataFrame, judgments: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Judge pairs (essay_id, essay_text, feedback_text) with each judge's typed scores as <dimension>_<judge>,
+    the naming used by merged_all_df.
+    """
+    frame = pairs_df[['essay_id', 'essay_text', 'feedback_text']].assign(essay_id=pairs_df['essay_id'].astype(str))
+    for judge, judge_df in judgments.items():
+        scores = ingest_judgments(judge_df)[['essay_id'] + DIMENSIONS].drop_duplicates('essay_id')
+        frame = frame.merge(scores.rename(columns={dim: f'{dim}_{judge}' for dim in DIMENSIONS}),
+                            on='essay_id', how='left')
+    return frame
+
+
+def split_held_out(frame: pd.DataFrame, test_percent: int = TEST_PERCENT) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    (train, test) by a stable hash of essay_id, so an essay stays on the same side across retrains.
+    """
+    is_test = frame['essay_id'].map(lambda essay_id: shard_of(essay_id, 100) < test_percent)
+    return frame[~is_test].reset_index(drop=True), frame[is_test].reset_index(drop=True)
+
+
+class ScorePredictor:
+    """
+    Local stand-in for the LLM judges: one ordinal logit per judge and dimension over hashed n-gram features
+    of the essay and the feedback. CPU only, no API calls; predict() also returns each prediction's
+    probability, so a pre-screen can send only the unsure pairs to the real judges.
+    """
+
+    def __init__(self, n_features: int = N_FEATURES, alpha: float = ALPHA):
+        self.n_features = n_features
+        self.alpha = alpha
+        self.models: Dict[tuple[str, str], Dict[str, np.ndarray]] = {}
+
+    def fit(self, frame: pd.DataFrame, judges: List[str] = JUDGES, max_iter: int = MAX_ITER) -> "ScorePredictor":
+        features = featurize(frame, self.n_features)
+        for judge in judges:
+            for dim in DIMENSIONS:
+                column = f'{dim}_{judge}'
+                if column not in frame:
+                    continue
+                labelled = frame[column].notna().to_numpy()
+                if labelled.sum() < 2:
+                    print(f"⚠️ {column}: too few scores to train on.")
+                    continue
+                scores = frame.loc[labelled, column].astype(int).to_numpy()
+                self.models[(judge, dim)] = fit_ordinal_logit(features[labelled], scores, self.alpha, max_iter)
+                print(f"✅ Trained {column} on {labelled.sum()} pairs.")
+        return self
+
+    def predict_proba(self, pairs_df: pd.DataFrame) -> Dict[tuple[str, str], np.ndarray]:
+        features = featurize(pairs_df, self.n_features)
+        return {key: ordinal_proba(features, model) for key, model in self.models.items()}
+
+    def predict(self, pairs_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        essay_id plus, per judge and dimension, the predicted score (<dimension>_<judge>) and its probability
+        (<dimension>_<judge>_confidence).
+        """
+        predictions = pd.DataFrame({'essay_id': pairs_df['essay_id'].astype(str).to_numpy()})
+        for (judge, dim), proba in self.predict_proba(pairs_df).items():
+            predictions[f'{dim}_{judge}'] = pd.array(proba.argmax(axis=1) + SCORES[0], dtype='Int8')
+            predictions[f'{dim}_{judge}_confidence'] = proba.max(axis=1)
+        return predictions
+
+    def save(self, path: str = MODEL_PATH) -> None:
+        arrays = {}
+        for (judge, dim), model in self.models.items():
+            arrays[f'{judge}|{dim}|weights'] = model['weights'].astype(np.float32)
+            arrays[f'{judge}|{dim}|cuts'] = model['cuts']
+        np.savez_compressed(path, n_features=self.n_features, alpha=self.alpha, **arrays)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "ScorePredictor":
+        with np.load(path) as data:
+            predictor = cls(int(data['n_features']), float(data['alpha']))
+            for name in data.files:
+                if name.endswith('|weights'):
+                    judge, dim, _ = name.split('|')
+                    predictor.models[(judge, dim)] = {'weights': data[name].astype(np.float64),
+                                                      'cuts': data[f'{judge}|{dim}|cuts']}
+        return predictor
+
+
+def held_out_report(predictor: ScorePredictor, test: pd.DataFrame,
+                    confidence_threshold: float = CONFIDENCE_THRESHOLD) -> pd.DataFrame:
+    """
+    Per judge and dimension on the held-out pairs: agreement of the predicted scores with the judge's
+    (exact, within one point, weighted kappa, Krippendorff's alpha), the majority-score baseline, the two
+    judges' agreement with each other as a ceiling, and how many pairs the pre-screen would settle at
+    confidence_threshold with what exact agreement.
+    """
+    predictions = predictor.predict(test)
+    rows, matrices = [], []
+    for judge, dim in predictor.models:
+        column = f'{dim}_{judge}'
+        if column not in test:
+            continue
+        labelled = test[column].notna().to_numpy()
+        actual = test.loc[labelled, column].astype(int).to_numpy()
+        predicted = predictions.loc[labelled, column].astype(int).to_numpy()
+        confident = predictions.loc[labelled, f'{column}_confidence'].to_numpy() >= confidence_threshold
+        matrix = np.zeros((len(SCORES), len(SCORES)))
+        np.add.at(matrix, (actual - SCORES[0], predicted - SCORES[0]), 1)
+        matrices.append(matrix)
+
+        other = [f'{dim}_{name}' for name in JUDGES if name != judge and f'{dim}_{name}' in test]
+        both = test[column].notna() & test[other[0]].notna() if other else pd.Series(False, index=test.index)
+        majority = np.bincount(actual).argmax() if len(actual) else None
+        rows.append({
+            'judge': judge, 'dimension': dim,
+            'within_one': np.mean(np.abs(actual - predicted) <= 1) if len(actual) else np.nan,
+            'majority_baseline': np.mean(actual == majority) if len(actual) else np.nan,
+            'judges_exact': (test.loc[both, column] == test.loc[both, other[0]]).mean() if both.any() else np.nan,
+            'prescreen_share': confident.mean() if len(actual) else np.nan,
+            'prescreen_exact': np.mean(actual[confident] == predicted[confident]) if confident.any() else np.nan,
+        })
+
+    report = pd.DataFrame(rows)
+    if matrices:
+        metrics = agreement_metrics(np.stack(matrices))
+        for name in ['n', 'exact_agreement', 'weighted_kappa', 'krippendorff_alpha']:
+            report[name] = metrics[name]
+        report = report[['judge', 'dimension', 'n', 'exact_agreement', 'within_one', 'weighted_kappa',
+                         'krippendorff_alpha', 'majority_baseline', 'judges_exact', 'prescreen_share',
+                         'prescreen_exact']]
+    return report
+
+
+def throughput(predictor: ScorePredictor, pairs_df: pd.DataFrame) -> float:
+    """
+    Pairs per second for featurizing and predicting every judge and dimension.
+    """
+    start = time.perf_counter()
+    predictor.predict(pairs_df)
+    return len(pairs_df) / max(time.perf_counter() - start, 1e-9)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from judge_inputs import load_judge_pairs
+
+    parser = argparse.ArgumentParser(description="Distil the LLM judges into a local hashed n-gram ordinal model.")
+    parser.add_argument("command", choices=['train', 'predict'])
+    parser.add_argument("--samples", default='SAMPLES.pkl')
+    parser.add_argument("--feedback", default='feedback_results_df.pkl')
+    parser.add_argument("--gpt", default='GPT_judges_evaluation_results.pkl')
+    parser.add_argument("--gemini", default='Gemini_judges_evaluation_results.pkl')
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--n-features", type=int, default=N_FEATURES)
+    parser.add_argument("--alpha", type=float, default=ALPHA, help="L2 penalty on the weights.")
+    parser.add_argument("--test-percent", type=int, default=TEST_PERCENT)
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE_THRESHOLD)
+    parser.add_argument("--output", default='predicted_scores.pkl', help="predict: where to write the scores.")
+    parser.add_argument("--store", default=None,
+                        help="Read the inputs from this artifact store and write the scores to its "
+                             "predicted_scores stage instead of pickles.")
+    args = parser.parse_args()
+
+    if args.store:
+        from artifact_store import ArtifactStore
+        from judge_inputs import load_judge_pairs_from_store
+        store = ArtifactStore(args.store)
+        pairs_df = load_judge_pairs_from_store(store)
+    else:
+        pairs_df = load_judge_pairs(args.samples, args.feedback)
+
+    if args.command == 'train':
+        if args.store:
+            judgments = {judge: store.read(f'{judge}_judgments') for judge in ['gpt', 'gemini']}
+        else:
+            judgments = {'gpt': pd.read_pickle(args.gpt), 'gemini': pd.read_pickle(args.gemini)}
+        frame = training_frame(pairs_df, judgments)
+        train, test = split_held_out(frame, args.test_percent)
+        print(f"📚 {len(train)} training pairs, {len(test)} held out.")
+        predictor = ScorePredictor(args.n_features, args.alpha).fit(train)
+        predictor.save(args.model)
+        print(f"💾 Saved the predictor to {args.model}")
+        if len(test):
+            report = held_out_report(predictor, test, args.confidence)
+            print(report.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+            print(f"⚡ {throughput(predictor, test):,.0f} pairs/s")
+    else:
+        predictions = ScorePredictor.load(args.model).predict(pairs_df)
+        if args.store:
+            store.write('predicted_scores', predictions, note=f"model {args.model}")
+        else:
+            predictions.to_pickle(args.output)
+            print(f"💾 Saved {len(predictions)} predicted score rows to {args.output}")
@@ -0,0 +1,149 @@
+import hashlib
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from artifact_store import ArtifactStore
+from judge_scores import DIMENSIONS
+
+SHARD_ROOT = 'shards'
+
+# Stage -> the environment variable its API client reads. A comma-separated pool in the plural variable
+# (OPENAI_API_KEYS, QMSS_API_KEYS, GOOGLE_API_KEYS) gives every shard its own key and quota.
+STAGE_KEYS = {
+    'generate': 'OPENAI_API_KEY',
+    'feedback': 'QMSS_API_KEY',
+    'judge_gpt': 'OPENAI_API_KEY',
+    'judge_gemini': 'GOOGLE_API_KEY',
+}
+
+
+def shard_of(essay_id: Any, shards: int) -> int:
+    """
+    Stable shard number for an essay (unlike hash(), the same in every process and every run).
+    """
+    digest = hashlib.sha256(str(essay_id).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shards
+
+
+def partition(df: pd.DataFrame, shards: int) -> List[pd.DataFrame]:
+    shard = df['essay_id'].astype(str).map(lambda essay_id: shard_of(essay_id, shards))
+    return [df[shard == i] for i in range(shards)]
+
+
+def split_jobs(jobs: List[Dict[str, Any]], shards: int) -> List[List[Dict[str, Any]]]:
+    """
+    essay_gen jobs split across shards by essay count (essay ids only exist once the essays do).
+    """
+    parts = [[] for _ in range(shards)]
+    for job in jobs:
+        for i in range(shards):
+            n = job['n'] // shards + (i < job['n'] % shards)
+            if n:
+                parts[i].append({**job, 'n': n})
+    return parts
+
+
+def key_pool(variable: str) -> List[str]:
+    load_dotenv()
+    pool = [key.strip() for key in os.getenv(variable + 'S', '').split(',') if key.strip()]
+    if not pool and os.getenv(variable):
+        pool = [os.getenv(variable)]
+    return pool
+
+
+def _run_shard(stage: str, work: Any, env: Dict[str, str], shard_dir: str) -> int:
+    """
+    Worker process: one stage over one shard, with the shard's own API key, writing its own partition
+    (a one-version Parquet artifact store in shard_dir).
+    """
+    # Import before leaving the launch directory; the API clients read the key on first use.
+    if stage == 'generate':
+        from Stud_essay_random_distro import essay_gen
+    elif stage == 'feedback':
+        from feedback_desk_api import feedback_for_samples
+    else:
+        from pipeline import judge_frame
+
+    os.environ.update(env)
+    os.chdir(shard_dir)
+    if stage == 'generate':
+        output = pd.concat([essay_gen(**job) for job in work], ignore_index=True)
+    elif stage == 'feedback':
+        output = feedback_for_samples(work)
+    else:
+        output = judge_frame(stage, work)
+    ArtifactStore('.').write(stage, output, partition_cols=[])
+    return len(output)
+
+
+def run_sharded(stage: str, work: pd.DataFrame | List[Dict[str, Any]], shards: int,
+                root: str = SHARD_ROOT) -> pd.DataFrame:
+    """
+    Run a stage (generate: a list of essay_gen jobs; feedback/judge_*: a frame keyed by essay_id) as one
+    process per shard. Essays are assigned to shards by a hash of essay_id, and shard i uses key i of the
+    stage's key pool. Each shard writes its output as Parquet under root/<stage>/shard=<i>. The partitions
+    are merged in shard order, and keyed stages are put back into input order, so the result does not depend on which
+    process finished first.
+    A failed shard is reported and left out. For keyed stages its essays come back without results and the
+    pipeline retries them next run; a failed generate shard raises.
+    """
+    parts = split_jobs(work, shards) if stage == 'generate' else partition(work, shards)
+    keys = key_pool(STAGE_KEYS[stage])
+    if len(keys) < shards:
+        print(f"⚠️ {stage}: {len(keys)} API key(s) for {shards} shards; some shards share a key.")
+
+    futures = {}
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=shards, mp_context=context, max_tasks_per_child=1) as pool:
+        for shard, part in enumerate(parts):
+            if not len(part):
+                continue
+            shard_dir = os.path.abspath(os.path.join(root, stage, f'shard={shard}'))
+            if os.path.exists(shard_dir):
+                shutil.rmtree(shard_dir)
+            os.makedirs(shard_dir)
+            env = {STAGE_KEYS[stage]: keys[shard % len(keys)]} if keys else {}
+            futures[shard] = (pool.submit(_run_shard, stage, part, env, shard_dir), shard_dir)
+        print(f"🚀 {stage}: {len(futures)} shards running.")
+
+    frames, failed = [], []
+    for shard, (future, shard_dir) in sorted(futures.items()):
+        try:
+            rows = future.result()
+            frames.append(ArtifactStore(shard_dir).read(stage))
+            print(f"✅ {stage} shard {shard}: {rows} rows.")
+        except Exception as e:
+            print(f"❌ {stage} shard {shard} failed: {e}")
+            failed.append(shard)
+
+    if stage == 'generate':
+        if failed:
+            raise RuntimeError(f"generate shards {failed} failed")
+        return pd.concat(frames, ignore_index=True)
+
+    empty = ['essay_id'] + (DIMENSIONS if stage.startswith('judge_') else [])
+    merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=empty)
+    merged = merged.assign(essay_id=merged['essay_id'].astype(str)).set_index('essay_id')
+    order = [essay_id for essay_id in work['essay_id'].astype(str) if essay_id in merged.index]
+    return merged.loc[order].reset_index()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show how essays and API keys are spread over shards.")
+    parser.add_argument("--samples", default='SAMPLES.pkl')
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+
+    samples_df = pd.read_pickle(args.samples)
+    for stage, variable in STAGE_KEYS.items():
+        print(f"🔑 {stage}: {len(key_pool(variable))} key(s) in {variable}S / {variable}")
+    for shard, part in enumerate(partition(samples_df, args.shards)):
+        print(f"📦 shard {shard}: {len(part)} essays")
@@ -1,18 +1,25 @@
-import openai
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
 
-load_dotenv()
+# Created by get_client() on first use, so importing this module makes no API calls.
+client = None
 
-api_key = os.getenv("OPENAI_API_KEY")
+def get_client():
+    global client
+    if client is None:
+        from openai import OpenAI
 
-if api_key:
-    print("✅ OpenAI API key is loaded!")
-else:
-    print("❌ OpenAI API key NOT loaded.")
+        load_dotenv()
+        api_key = os.getenv("OPENAI_API_KEY")
+
+        if api_key:
+            print("✅ OpenAI API key is loaded!")
+        else:
+            print("❌ OpenAI API key NOT loaded.")
+
+        client = OpenAI()
+    return client
 
-client = OpenAI()
 def text_generation(
     system_role: str,
     user_msg: str,
@@ -26,7 +33,7 @@ def text_generation(
         user_parts.append(f"{label}:\n{content}")
     user_msg = "\n\n".join(user_parts)
 
-    resp = client.responses.create(
+    resp = get_client().responses.create(
         model=model,
         input=[
             {"role": "system", "content": system_role},
@@ -101,13 +108,15 @@ def essay_gen(n, topic: str, grade_level: str, subject: str, assignment_type: st
             f.write(f'{var_name} = """{essay_text}"""\n\n')
 
     print(f"✅ Saved {n} essays to {filename}")
-essay_gen(
-    n=3,
-    topic="The American Revolution",
-    grade_level="10th grade",
-    subject="English",
-    assignment_type="essay",
-    knowledge_level="advanced",
-    grammar_level="excellent",
-    prompt="Write an essay. Make it 5 to 7 paragraphs, with an introduction, thesis, and conclusion."
-)
\ No newline at end of file
+
+if __name__ == "__main__":
+    essay_gen(
+        n=3,
+        topic="The American Revolution",
+        grade_level="10th grade",
+        subject="English",
+        assignment_type="essay",
+        knowledge_level="advanced",
+        grammar_level="excellent",
+        prompt="Write an essay. Make it 5 to 7 paragraphs, with an introduction, thesis, and conclusion."
+    )
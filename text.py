@@ -1,11 +1,12 @@
 from dotenv import load_dotenv
 import os
 
-load_dotenv()
+if __name__ == "__main__":
+    load_dotenv()
 
-api_key = os.getenv("OPENAI_API_KEY")
+    api_key = os.getenv("OPENAI_API_KEY")
 
-if api_key:
-    print("✅ OpenAI API key is loaded!")
-else:
-    print("❌ OpenAI API key NOT loaded.")
\ No newline at end of file
+    if api_key:
+        print("✅ OpenAI API key is loaded!")
+    else:
+        print("❌ OpenAI API key NOT loaded.")
@@ -0,0 +1,195 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Tracing is off unless JUDGE_TRACE_PATH names the JSONL file spans are appended to (or enable_tracing() is called).
+TRACE_PATH = os.getenv('JUDGE_TRACE_PATH', '')
+
+_current_span: contextvars.ContextVar[Dict[str, Any] | None] = contextvars.ContextVar('current_span', default=None)
+_write_lock = threading.Lock()
+
+
+def enable_tracing(path: str = 'traces.jsonl') -> None:
+    """
+    Append spans to path from now on, in this process and in the subprocesses it starts.
+    """
+    global TRACE_PATH
+    TRACE_PATH = path
+    os.environ['JUDGE_TRACE_PATH'] = path
+
+
+def _write(record: Dict[str, Any]) -> None:
+    if not TRACE_PATH:
+        return
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _write_lock, open(TRACE_PATH, 'a', encoding='utf-8') as f:
+        f.write(line + '\n')
+
+
+@contextmanager
+def span(name: str, kind: str = 'call', provider: str | None = None, stage: str | None = None, **attrs):
+    """
+    Time a block and append it to TRACE_PATH as one JSON line. Spans nest: a call inside a stage span
+    records the stage and its parent's id, and a call inside a 'retry' span takes over its retries and
+    queue wait. Use annotate() inside the block to add token counts, status codes, etc.
+    """
+    parent = _current_span.get()
+    if kind == 'stage' and parent and parent['stage'] == name:
+        # e.g. essay_gen called from the pipeline's generate stage: count the stage's time once.
+        kind = 'step'
+    inherited = {key: parent[key] for key in ('retries', 'queue_wait_ms') if parent and parent['kind'] == 'retry'}
+    record = {
+        'span_id': uuid.uuid4().hex[:16],
+        'parent_id': parent['span_id'] if parent else None,
+        'name': name,
+        'kind': kind,
+        'provider': provider or (parent or {}).get('provider'),
+        'stage': stage or (name if kind == 'stage' else (parent or {}).get('stage')),
+        'start': time.time(),
+        'queue_wait_ms': 0.0,
+        'retries': 0,
+        'outcome': 'ok',
+        **inherited,
+        **attrs,
+    }
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['outcome'] = f'error:{type(e).__name__}'
+        raise
+    finally:
+        record['duration_ms'] = (time.perf_counter() - started) * 1000
+        _current_span.reset(token)
+        _write(record)
+
+
+def annotate(**attrs) -> None:
+    """
+    Add attributes (tokens_in, tokens_out, retries, queue_wait_ms, outcome, ...) to the innermost open span.
+    """
+    record = _current_span.get()
+    if record is not None:
+        record.update({key: value for key, value in attrs.items() if value is not None})
+
+
+def traced(provider: str | None = None, kind: str = 'call', name: str | None = None) -> Callable:
+    """
+    Decorator that wraps every call in a span. String arguments are summed into payload_chars. A None return
+    counts as a failure, using the category the function left in its `failure` dict when it has one.
+    """
+    def decorator(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind_partial(*args, **kwargs)
+            payload_chars = sum(len(v) for v in bound.arguments.values() if isinstance(v, str))
+            with span(name or fn.__name__, kind=kind, provider=provider, payload_chars=payload_chars) as record:
+                result = fn(*args, **kwargs)
+                if result is None and kind == 'call':
+                    failure = bound.arguments.get('failure') or {}
+                    record['outcome'] = failure.get('category', 'failed')
+                return result
+        return wrapper
+    return decorator
+
+
+def openai_usage(usage: Any) -> Dict[str, int | None]:
+    """
+    Token counts from an OpenAI usage object (chat completions or responses API).
+    """
+    if usage is None:
+        return {}
+    return {
+        'tokens_in': getattr(usage, 'prompt_tokens', None) or getattr(usage, 'input_tokens', None),
+        'tokens_out': getattr(usage, 'completion_tokens', None) or getattr(usage, 'output_tokens', None),
+    }
+
+
+def gemini_usage(response: Any) -> Dict[str, int | None]:
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return {}
+    return {
+        'tokens_in': getattr(usage, 'prompt_token_count', None),
+        'tokens_out': getattr(usage, 'candidates_token_count', None),
+    }
+
+
+def load_spans(path: str | None = None) -> "pd.DataFrame":
+    import pandas as pd
+
+    path = path or TRACE_PATH or 'traces.jsonl'
+
+    with open(path, encoding='utf-8') as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def summarize(spans: "pd.DataFrame", by: list[str] = ['stage', 'provider', 'name']) -> "pd.DataFrame":
+    """
+    Per stage/provider/call: count, error rate, throughput, latency percentiles, and the share of the
+    stage's wall-clock time spent in that kind of call.
+    """
+    import numpy as np
+    import pandas as pd
+
+    spans = spans.copy()
+    for col in ('stage', 'provider', 'tokens_in', 'tokens_out', 'payload_chars'):
+        if col not in spans:
+            spans[col] = None
+    spans[['stage', 'provider']] = spans[['stage', 'provider']].fillna('-')
+    spans['end'] = spans['start'] + spans['duration_ms'] / 1000
+
+    stage_time = spans[spans['kind'] == 'stage'].groupby('name')['duration_ms'].sum()
+    rows = []
+    for key, group in spans.groupby(by, sort=True):
+        latency = group['duration_ms'].to_numpy()
+        wall = group['end'].max() - group['start'].min()
+        row = dict(zip(by, key))
+        row.update({
+            'kind': group['kind'].iloc[0],
+            'count': len(group),
+            'errors': int((group['outcome'] != 'ok').sum()),
+            'per_second': len(group) / wall if wall > 0 else np.nan,
+            'p50_ms': np.percentile(latency, 50),
+            'p95_ms': np.percentile(latency, 95),
+            'p99_ms': np.percentile(latency, 99),
+            'total_s': latency.sum() / 1000,
+            'queue_wait_s': group['queue_wait_ms'].sum() / 1000,
+            'retries': int(group['retries'].sum()),
+            'tokens_in': pd.to_numeric(group['tokens_in'], errors='coerce').sum(),
+            'tokens_out': pd.to_numeric(group['tokens_out'], errors='coerce').sum(),
+            'payload_chars': pd.to_numeric(group['payload_chars'], errors='coerce').sum(),
+        })
+        stage_ms = stage_time.get(row.get('stage'), np.nan)
+        row['share_of_stage'] = latency.sum() / stage_ms if row['kind'] != 'stage' and stage_ms else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarise the spans in a trace file.")
+    parser.add_argument("command", choices=['summary'])
+    parser.add_argument("--path", default=TRACE_PATH or 'traces.jsonl')
+    parser.add_argument("--by", nargs="+", default=['stage', 'provider', 'name'])
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    summary = summarize(load_spans(args.path), args.by)
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.2f}'.format):
+        print(summary.to_string(index=False))